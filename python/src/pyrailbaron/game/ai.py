@@ -1,12 +1,41 @@
-from pyrailbaron.game.constants import MIN_CASH_TO_WIN
+from pyrailbaron.game.constants import REGIONS
 from pyrailbaron.game.state import Engine, GameState
-from pyrailbaron.map.datamodel import Map, Waypoint, rail_segs_from_wps
-from pyrailbaron.map.bfs import breadth_first_search, DEFAULT_PATHS_FILE
-from pyrailbaron.game.fees import calculate_user_fees
-from typing import List, Callable, Dict, Tuple
-from random import randint, sample
-from pathlib import Path
-import csv
+from pyrailbaron.game.config import AIConfig, GameConfig, DEFAULT_CONFIG
+from pyrailbaron.map.datamodel import Map, Waypoint, RailSegment, rail_segs_from_wps, derived_data
+from pyrailbaron.map.routes import get_route_store
+from pyrailbaron.map.bfs import quick_network_distance
+from pyrailbaron.map.hierarchy import get_hop_index
+from pyrailbaron.game.fees import (calculate_user_fees, calculate_slice_fees,
+    compile_path, get_owners, get_rr_id, CompiledPath)
+from pyrailbaron.game.planner import (PlannedRoute, FeeModel, plan_pareto_routes,
+    plan_candidate_routes)
+from pyrailbaron.game.expectimax import (ExpectimaxPlanner, EXPECTIMAX_FLEX,
+    EXPECTIMAX_MAX_ROUTES, MAX_LOOKAHEAD_TURNS)
+from pyrailbaron.game.moves import TurnFrontier, is_legal_sequence
+from pyrailbaron.game.sampling import get_destination_sampler
+from pyrailbaron.game.incidence import get_rr_incidence
+from pyrailbaron.game.valuation import get_rr_valuation
+from pyrailbaron.game.policy_tables import get_policy_tables, region_preferences
+from pyrailbaron.game.surrogate import (get_trip_cost_surrogate,
+    trip_cost_features, logging_trip_costs, log_trip_cost)
+from pyrailbaron.game.rollout import get_rollout_model, compact_game
+from pyrailbaron.game.mcts import Action, MCTSResult, search as mcts_search
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+from random import randint, Random
+from math import sqrt
+from time import time
+import threading
+import numpy as np
+
+# AI messages are printed unless planning quietly in a background thread
+_log_state = threading.local()
+def ai_log(msg: str):
+    if not getattr(_log_state, 'quiet', False):
+        print(f'  AI >> {msg}')
+
+def set_quiet_logging(quiet: bool):
+    _log_state.quiet = quiet
 
 N_PATH_ROLL_SIM = 100
 def sim_roll(e: Engine) -> int:
@@ -16,32 +45,37 @@ def sim_roll(e: Engine) -> int:
         d += randint(1,6)
     return d
 
-MAX_PATHS = 100
-
 # Evaluate the cost of a given path with a known die roll d
 # player_rr = ownership information (i.e. p.rr_owned for each p)
 # init_rr, established_rate = "established" information
 # doubleFees = all RRs owned
 # previous_moves = moves already taken this turn (e.g. if this is a bonus roll)
+# cfg = game rules (fee amounts)
 def calculate_path_cost(m: Map, e: Engine, 
         player_i: int, path: List[Waypoint], d: int,
         player_rr: List[List[str]], init_rr: str | None, 
         established_rate: int | None, doubleFees: bool,
-        previous_moves: List[Waypoint] = [], N: int = N_PATH_ROLL_SIM) -> int:
-    fixed_fees, est_rate = calculate_user_fees(
-        m, player_i, previous_moves + path[:d], player_rr, 
-        init_rr, established_rate, doubleFees)
+        previous_moves: List[Waypoint] = [], N: int = N_PATH_ROLL_SIM,
+        cfg: GameConfig = DEFAULT_CONFIG) -> int:
+    cp = compile_path(m, previous_moves + path)
+    owners = get_owners(m, player_rr)
+    init_rr_id = get_rr_id(m, init_rr)
+    turn_end = len(previous_moves) + d
+    fixed_fees, est_rate = calculate_slice_fees(cp, 0, turn_end, player_i,
+        owners, len(player_rr), init_rr_id, established_rate, doubleFees, cfg)
     fixed_cost = fixed_fees[player_i]
     average_cost = 0
     if len(path) > d:
         if len(path) <= d + 2:
             # If the next "hop" is <= 2 spaces, we don't need to simulate rolls
-            fixed_cost += calculate_user_fees(m, player_i, path[d:],
-                player_rr, init_rr, est_rate, doubleFees)[0][player_i]
+            fixed_cost += calculate_slice_fees(cp, turn_end, len(cp), player_i,
+                owners, len(player_rr), init_rr_id, est_rate, doubleFees, cfg)[0][player_i]
         else:
             # Simulate N_SIM rolls to determine the average cost
-            sim_costs = simulate_rolls(m, e, player_i, path[d:], N, 
-                player_rr, doubleFees, path[d-1][0], est_rate)
+            sim_costs = simulate_compiled_rolls(e, player_i, cp, turn_end, N,
+                owners, len(player_rr), doubleFees,
+                cp.rr_at(turn_end - 1) if turn_end > 0 else init_rr_id, est_rate,
+                cfg=cfg)
             average_cost = sum(sim_costs) // N
         return fixed_cost + average_cost
     else:
@@ -52,57 +86,49 @@ def calculate_path_cost(m: Map, e: Engine,
 def simulate_rolls(m: Map, e: Engine, player_i: int, path: List[Waypoint], N: int,
         player_rr: List[List[str]], doubleFees: bool, 
         init_rr: str|None, established_rate: int|None,
-        include_last_leg: bool = True) -> List[int]:
+        include_last_leg: bool = True,
+        cfg: GameConfig = DEFAULT_CONFIG) -> List[int]:
+    return simulate_compiled_rolls(e, player_i, compile_path(m, path), 0, N,
+        get_owners(m, player_rr), len(player_rr), doubleFees,
+        get_rr_id(m, init_rr), established_rate, include_last_leg, cfg)
+
+# Same as simulate_rolls for the hops of a compiled path from offset start on
+def simulate_compiled_rolls(e: Engine, player_i: int, cp: CompiledPath,
+        start: int, N: int, owners: List[int], n_players: int,
+        doubleFees: bool, init_rr_id: int, established_rate: int|None,
+        include_last_leg: bool = True,
+        cfg: GameConfig = DEFAULT_CONFIG) -> List[int]:
     cost_by_path: List[int] = [0] * N
     for sim_n in range(N):
-        rem_path = path.copy()
-        while len(rem_path) > 0:
+        pos, turn_rr_id, rate = start, init_rr_id, established_rate
+        while pos < len(cp):
             new_d = sim_roll(e)
-            seg_path = rem_path[:new_d]
-            fees, established_rate = calculate_user_fees(
-                m, player_i, seg_path, 
-                player_rr, init_rr, established_rate, doubleFees)
-            rem_path = rem_path[new_d:]
-            init_rr = seg_path[-1][0]
-            if include_last_leg or len(rem_path) > 0:
+            fees, rate = calculate_slice_fees(cp, pos, pos + new_d, player_i,
+                owners, n_players, turn_rr_id, rate, doubleFees, cfg)
+            pos = min(pos + new_d, len(cp))
+            turn_rr_id = cp.rr_at(pos - 1)
+            if include_last_leg or pos < len(cp):
                 cost_by_path[sim_n] += fees[player_i]
     return cost_by_path
 
-# Reduce a collection of paths to below size N
-def reduce_paths(paths: List[List[Waypoint]], N: int,
-    history: List[Waypoint] = []) -> List[List[Waypoint]]:
-    if len(paths) <= N:
-        return paths # Nothing to do
-
-    def filter_by_metric(metric: Callable[[List[Waypoint]], int]):
-        nonlocal paths
-        met = list(map(metric, paths))
-        min_val = min(met)
-        paths = [p for p, v in zip(paths, met) if v == min_val]
-    
-    # First, try to reduce count by keeping only the paths which touch the
-    # smallest NUMBER of railroads
-    def count_rrs(path: List[Waypoint]):
-        rr_set = set([rr for rr,_ in history] + [rr for rr,_ in path])
-        return len(rr_set)
-    filter_by_metric(count_rrs)
-    if len(paths) <= N:
-        return paths
-
-    # If that isn't enough, keep paths with the minimum number of TRANSITIONS
-    def count_trans(path: List[Waypoint]):
-        curr_rr: str | None = None
-        t_count: int = 0
-        for rr, _ in history + path:
-            if rr != curr_rr:
-                curr_rr = rr; t_count += 1
-        return t_count
-    filter_by_metric(count_trans)
-
-    if len(paths) > N:
-        # If we still have too many, take a random sample
-        paths = sample(paths, N)
-    return paths
+# Anytime planning stages: the route search is repeated with increasing path
+# length flex, then the candidate routes are re-scored with increasing numbers
+# of simulated rolls. Each stage only replaces the plan once it finishes.
+PLAN_SIM_STEPS = [10, 30, N_PATH_ROLL_SIM]
+DEFAULT_MOVE_TIME_BUDGET = 0.5 # Keeps the touchscreen responsive on the Pi
+
+@dataclass
+class PlanReport:
+    path: List[Waypoint]
+    flex_searched: int      # Largest path length flex fully searched
+    n_sims: int             # Simulated rolls per route in the last full pass
+    stages_done: int
+    stages_total: int
+    elapsed: float
+
+    @property
+    def completeness(self) -> float:
+        return self.stages_done / self.stages_total
 
 # Plan the best move sequence given a known die roll d
 # init_rr = previously recorded RR player_i was on when turn began
@@ -110,11 +136,31 @@ def reduce_paths(paths: List[List[Waypoint]], N: int,
 # forced_moves = required fixed moves at the beginning (used when planning rovers)
 # dest_pt = override player_i destination (used when planning rovers)
 # path_length_flex = used to allow path lengths longer than minimum to be checked
+# time_budget = wall clock seconds to plan for (None = run every stage)
+# max_stages = most stages to run, for plans that must not depend on timing
+#   (None = no limit)
 def plan_best_moves(
         s: GameState, player_i: int, d: int,
         init_rr: str | None,
         moves_so_far: int, forced_moves: List[Waypoint] = [],
-        dest_pt: int = -1, path_length_flex: int = 0) -> List[Waypoint]:
+        dest_pt: int = -1, path_length_flex: int = 0,
+        time_budget: float | None = None,
+        max_stages: int | None = None) -> List[Waypoint]:
+    return plan_moves_anytime(s, player_i, d, init_rr, moves_so_far,
+        forced_moves, dest_pt, path_length_flex, time_budget, max_stages).path
+
+def plan_moves_anytime(
+        s: GameState, player_i: int, d: int,
+        init_rr: str | None,
+        moves_so_far: int, forced_moves: List[Waypoint] = [],
+        dest_pt: int = -1, path_length_flex: int = 0,
+        time_budget: float | None = None,
+        max_stages: int | None = None) -> PlanReport:
+    start_t = time()
+    def out_of_time() -> bool:
+        return ((time_budget is not None and time() - start_t > time_budget)
+            or (max_stages is not None and stages_done >= max_stages))
+
     ps = s.players[player_i]
     dest_pt = ps.destinationIndex if dest_pt < 0 else dest_pt
     previous_moves = ps.history[(-moves_so_far):] if moves_so_far > 0 else []
@@ -122,114 +168,338 @@ def plan_best_moves(
     assert ps.destination, "Must know destination"
     player_rr = [p.rr_owned for p in s.players]
     doubleFees = s.doubleFees
-    def path_cost(path: List[Waypoint]):
-        return calculate_path_cost(s.map, ps.engine, player_i, path, 
-            d, player_rr, init_rr, ps.established_rate, 
-            doubleFees, previous_moves)    
+    def plan_routes(used_rail_segs: List[RailSegment], flex: int) -> List[PlannedRoute]:
+        return plan_pareto_routes(s.map, player_i, start_pt, dest_pt,
+            used_rail_segs, d, ps.engine, player_rr, init_rr,
+            ps.established_rate, doubleFees, previous_moves + forced_moves,
+            flex, s.config)
 
     start_pt = ps.location if len(forced_moves) == 0 else forced_moves[-1][1]
     d -= len(forced_moves)
     used_rail_segs = rail_segs_from_wps(ps.startCityIndex, ps.history + forced_moves)
-    shortest_paths = breadth_first_search(
-        s.map, start_pt, dest_pt, used_rail_segs, path_length_flex)
     start_n = s.map.points[start_pt].display_name
     end_n = s.map.points[dest_pt].display_name
-    print(f'  AI >> Found {len(shortest_paths)} paths from {start_n} to {end_n}')
-
-    if len(shortest_paths) == 0 and ps.rover_play_index >= 0:
-        rover_pt = ps.history[ps.rover_play_index][1]
-        print(f'  AI >> Replanning from rover move at {s.map.points[rover_pt].display_name} on')
-        # We remove rail segs we used up to the rover from the excluded set
-        used_rail_segs = rail_segs_from_wps(rover_pt, ps.history[(ps.rover_play_index + 1):])
-        shortest_paths = breadth_first_search(
-            s.map, start_pt, dest_pt, used_rail_segs, path_length_flex)
-
-    assert len(shortest_paths) > 0, "Must have at least one path to goal"
-    if len(shortest_paths) > MAX_PATHS:
-        shortest_paths = reduce_paths(shortest_paths, MAX_PATHS, ps.history)
-        print(f'  AI >> Reduced to {len(shortest_paths)} paths')
-
-    costs = list(map(path_cost, shortest_paths))
-    best_path, cost = list(sorted(zip(shortest_paths, costs), key=lambda pair: -pair[1]))[0]
-    print(f'  AI >> Best path has length {len(best_path)} stops and cost {-cost}')
+    stages_total = path_length_flex + 1 + len(PLAN_SIM_STEPS)
+    stages_done = 0
+
+    # Stage 1: route search with increasing flex; the shortest routes are
+    # always searched so that we have some plan
+    routes: Dict[Tuple[Waypoint, ...], PlannedRoute] = {}
+    flex_searched = -1
+    for flex in range(path_length_flex + 1):
+        if flex > 0 and out_of_time():
+            break
+        front = plan_routes(used_rail_segs, flex)
+        if len(front) == 0 and len(routes) == 0 and ps.rover_play_index >= 0:
+            rover_pt = ps.history[ps.rover_play_index][1]
+            ai_log(f'Replanning from rover move at {s.map.points[rover_pt].display_name} on')
+            # We remove rail segs we used up to the rover from the excluded set
+            used_rail_segs = rail_segs_from_wps(
+                rover_pt, ps.history[(ps.rover_play_index + 1):])
+            front = plan_routes(used_rail_segs, flex)
+        for r in front:
+            routes.setdefault(tuple(r.path), r)
+        flex_searched = flex
+        stages_done += 1
+    ai_log(f'Found {len(routes)} Pareto routes from {start_n} to {end_n} (flex {flex_searched})')
+    assert len(routes) > 0, "Must have at least one path to goal"
+
+    # Start from the route with the lowest expected fees
+    candidates = list(routes.values())
+    best = min(candidates, key=lambda r: (r.fees, r.hops))
+    best_cost = best.fees
+    n_sims = 0
+
+    # Stage 2: re-score candidates with simulated rolls instead of the average
+    # roll; a pass which runs out of time is thrown away
+    if len(candidates) == 1:
+        stages_done = stages_total # Nothing to choose between
+    elif stages_done == path_length_flex + 1:
+        for N in PLAN_SIM_STEPS:
+            if out_of_time():
+                break
+            pass_best: PlannedRoute | None = None
+            pass_cost = 0
+            for r in candidates:
+                if out_of_time():
+                    pass_best = None
+                    break
+                if r.hops <= d:
+                    # Fees are exact if we arrive this turn
+                    cost = -calculate_user_fees(s.map, player_i,
+                        previous_moves + forced_moves + r.path, player_rr,
+                        init_rr, ps.established_rate, doubleFees, s.config)[0][player_i]
+                else:
+                    cost = -calculate_path_cost(s.map, ps.engine, player_i,
+                        r.path, d, player_rr, init_rr, ps.established_rate,
+                        doubleFees, previous_moves + forced_moves, N, s.config)
+                if pass_best is None or (cost, r.hops) < (pass_cost, pass_best.hops):
+                    pass_best, pass_cost = r, cost
+            if pass_best is None:
+                break
+            best, best_cost, n_sims = pass_best, pass_cost, N
+            stages_done += 1
+    elapsed = time() - start_t
+    ai_log(f'Best path has length {best.hops} stops and cost {best_cost}')
+    ai_log(f'Planned {100 * stages_done // stages_total}% of search '
+          f'(flex {flex_searched}, {n_sims} sims) in {elapsed:.2f}s')
 
     final_path: List[Waypoint] = []
-    for rr, p in forced_moves + best_path[:d]:
+    for rr, p in forced_moves + best.path[:d]:
         final_path.append((rr,p))
         if p == ps.destinationIndex:
             break
 
-    return final_path
-
-def get_paths_from_pt(start_pt: int,
-        rr_paths_path: Path = DEFAULT_PATHS_FILE) -> List[List[Waypoint]]:
-    paths: List[List[Waypoint]] = []
-    counts_by_city: Dict[int, int] = {}
-    with rr_paths_path.open('r') as rr_paths_file:
-        rdr = csv.reader(rr_paths_file)
-        for row in rdr:
-            row_N = len(row) - 2
-            if int(row[0]) != start_pt and int(row[1]) != start_pt:
-                continue
-            dest_pt = int(row[1]) if int(row[0]) == start_pt else int(row[0])
-            if dest_pt not in counts_by_city:
-                counts_by_city[dest_pt] = 1
-            else:
-                if counts_by_city[dest_pt] >= 20:
-                    continue
-                counts_by_city[dest_pt] += 1
-
-            if int(row[0]) == start_pt:
-                path = [(row[2*i + 2], int(row[2*i + 3])) for i in range(row_N // 2)]
-                paths.append(path)
-            elif int(row[1]) == start_pt:
-                path = [(row[-2*i-2], int(row[-2*i-3])) for i in range((row_N-1)//2)]
-                path.append((row[2], int(row[0])))
-                paths.append(path)
-    return paths
-
-def simulate_costs(s: GameState, player_i: int, start_pt: int, player_rr: List[List[str]],
-        init_rr: str|None, established_rate: int|None, doubleFees: bool,
-        n_dest: int, n_rolls_per_dest: int, override_engine: Engine|None = None,
-        paths: List[List[Waypoint]]|None = None,
-        rr_paths_path: Path = DEFAULT_PATHS_FILE, forced_dest_pt: int|None = None) -> List[int]:
-    paths = paths or get_paths_from_pt(start_pt, rr_paths_path)
-
-    best_paths: Dict[int, List[Waypoint]] = {}
-    engine = override_engine or s.players[player_i].engine
-
-    def get_best_path(end_pt: int) -> List[Waypoint]:
-        if end_pt not in best_paths:
+    # The planner only avoids used rail segments, so it can walk into a point
+    # we'd be trapped at; if so take the best endpoint we can legally reach
+    if not is_legal_sequence(s.map, ps.startCityIndex, ps.history, final_path,
+            ps.destinationIndex, ps.rover_play_index):
+        frontier = TurnFrontier(s.map, ps.startCityIndex, ps.history,
+            ps.destinationIndex, ps.rover_play_index, d + len(forced_moves),
+            moves_so_far, player_rr, player_i, init_rr, ps.established_rate,
+            doubleFees, s.config)
+        assert len(frontier.endpoints) > 0, "Must have a legal way to move"
+        best_end = frontier.endpoints[0]
+        ai_log(f'Planned path is not legal, choosing from {len(frontier.endpoints)} endpoints')
+        ai_log(f'Best endpoint {s.map.points[best_end.pt].display_name} is {best_end.dest_dist} stops from destination')
+        final_path = best_end.moves
+
+    return PlanReport(final_path, flex_searched, n_sims, stages_done,
+        stages_total, time() - start_t)
+
+# Plan the moves for a roll of d by expectimax over the next few turns
+# Returns None if there are no routes to plan over (e.g. after a rover play)
+# max_stages = most lookahead depths to search (None = up to MAX_LOOKAHEAD_TURNS)
+def plan_expectimax_moves(s: GameState, player_i: int, d: int,
+        init_rr: str | None, moves_so_far: int,
+        time_budget: float | None = None,
+        max_stages: int | None = None) -> List[Waypoint] | None:
+    start_t = time()
+    ps = s.players[player_i]
+    dest_pt = ps.destinationIndex
+    previous_moves = ps.history[(-moves_so_far):] if moves_so_far > 0 else []
+    player_rr = [p.rr_owned for p in s.players]
+    used_rail_segs = rail_segs_from_wps(ps.startCityIndex, ps.history)
+    routes = plan_candidate_routes(s.map, player_i, ps.location, dest_pt,
+        used_rail_segs, d, ps.engine, player_rr, init_rr, ps.established_rate,
+        s.doubleFees, previous_moves, EXPECTIMAX_FLEX, EXPECTIMAX_MAX_ROUTES,
+        s.config)
+    if len(routes) == 0:
+        return None
+
+    # Replay the moves already taken this turn to find the initial fee state
+    fees = FeeModel(player_i, player_rr, s.doubleFees, s.config)
+    turn = fees.start_turn(init_rr, ps.established_rate)
+    prev_rr = init_rr
+    for rr, _ in previous_moves:
+        turn, _ = fees.hop(turn, prev_rr, rr)
+        prev_rr = rr
+    planner = ExpectimaxPlanner(s, player_i, dest_pt, [r.path for r in routes],
+        used_rail_segs, prev_rr,
+        None if time_budget is None else time_budget - (time() - start_t))
+    max_turns = (MAX_LOOKAHEAD_TURNS if max_stages is None
+        else max(0, min(MAX_LOOKAHEAD_TURNS, max_stages - 1)))
+    moves, depth = planner.plan(d, turn, max_turns)
+    ai_log(f'Expectimax over {len(routes)} routes looked {depth} turns ahead '
+        f'({planner.n_evals} states) in {time() - start_t:.2f}s')
+
+    if not is_legal_sequence(s.map, ps.startCityIndex, ps.history, moves,
+            dest_pt, ps.rover_play_index):
+        frontier = TurnFrontier(s.map, ps.startCityIndex, ps.history, dest_pt,
+            ps.rover_play_index, d, moves_so_far, player_rr, player_i, init_rr,
+            ps.established_rate, s.doubleFees, s.config)
+        assert len(frontier.endpoints) > 0, "Must have a legal way to move"
+        ai_log(f'Planned path is not legal, choosing from {len(frontier.endpoints)} endpoints')
+        moves = frontier.endpoints[0].moves
+    return moves
+
+# Plan all moves for a roll of d, including trying a rover play on the closest
+# declared player if we aren't declared ourselves
+def plan_turn_moves(s: GameState, player_i: int, d: int, init_rr: str | None,
+        moves_so_far: int, time_budget: float | None = None,
+        max_stages: int | None = None) -> List[Waypoint]:
+    ps = s.players[player_i]
+    waypoints: List[Waypoint] = []
+    rover_dest = -1
+    min_dist = len(s.map.points)
+    rover_tgt: str | None = None
+    if not ps.declared:
+        # Undeclared players will check if other players are declared and
+        # attempt to rover them if possible
+        hops = get_hop_index(s.map).base
+        for oth_ps in s.players:
+            if oth_ps.declared:
+                assert ps.index != oth_ps.index, "Players cannot rover themselves"
+                dist_to_declared = hops.distance(ps.location, oth_ps.location)
+                if 0 <= dist_to_declared < min_dist:
+                    rover_dest = oth_ps.location
+                    rover_tgt = oth_ps.name
+                    min_dist = dist_to_declared
+
+    if rover_dest >= 0:
+        try:
+            ai_log(f'Attempting to plan rover for {rover_tgt} at {s.map.points[rover_dest].display_name}')
+            # Try to do a rover play
+            waypoints = plan_best_moves(s, player_i, d, init_rr, moves_so_far, 
+                dest_pt=rover_dest, path_length_flex=2, time_budget=time_budget,
+                max_stages=max_stages)
+            
+            ai_log(f'Verifying that rover still allows trip to {s.map.points[ps.destinationIndex].display_name}')
+            # Check if we can still reach our "real" destination after the rover
+            # If not we need to revert to normal planning
+            rover_end_pt = waypoints[-1][1]
+            if rover_end_pt != ps.destinationIndex:
+                if quick_network_distance(s.map, rover_end_pt, ps.destinationIndex,
+                    ps.history + waypoints) < 0:
+                    ai_log('SKIPPING ROVER')
+                    rover_dest = -1
+
+            # If we are still planning a rover, plan the remaining trip to the
+            # destination after pulling the rover where needed
+            if rover_dest > 0:
+                if (len(waypoints) <= d and rover_dest != ps.destinationIndex
+                        and waypoints[-1][1] == rover_dest):
+                    waypoints = plan_best_moves(s, player_i, d, init_rr,
+                        moves_so_far, forced_moves=waypoints, path_length_flex=2,
+                        time_budget=time_budget, max_stages=max_stages)
+        except:
+            ai_log('FAILED TO PLAN ROVER')
+            rover_dest = -1
+    if rover_dest < 0:
+        waypoints = (plan_expectimax_moves(s, player_i, d, init_rr,
+                moves_so_far, time_budget, max_stages)
+            or plan_best_moves(s, player_i, d, init_rr, moves_so_far,
+                path_length_flex=2, time_budget=time_budget,
+                max_stages=max_stages))
+    return waypoints
+
+# Random next-trip scenarios (destination + dice) shared by every option being
+# compared, i.e. common random numbers. Each option is then judged on the same
+# trips, so the differences between options aren't swamped by sampling noise.
+class ScenarioStream:
+    def __init__(self, s: GameState, start_pt: int,
+            forced_dest_pt: int | None = None, seed: int | None = None):
+        self.state = s
+        self.start_pt = start_pt
+        self.forced_dest_pt = forced_dest_pt
+        self.rng = Random(seed if seed is not None else randint(0, 1 << 30))
+        self._dest_rng = np.random.default_rng(self.rng.getrandbits(64))
+        self._dests: List[int] = []
+        self._dice: List[List[Tuple[int, int, int]]] = []
+
+    def _extend(self, n: int):
+        if len(self._dests) >= n:
+            return
+        # Destinations are drawn a batch at a time so callers extending the
+        # stream one scenario at a time still get vectorized draws
+        n_new = max(n - len(self._dests), SIM_BATCH)
+        if self.forced_dest_pt is None:
+            sampler = get_destination_sampler(self.state)
+            self._dests.extend(sampler.sample(
+                self.start_pt, n_new, self._dest_rng).tolist())
+        else:
+            self._dests.extend([self.forced_dest_pt] * n_new)
+        self._dice.extend([] for _ in range(n_new))
+
+    def dest(self, i: int) -> int:
+        self._extend(i + 1)
+        return self._dests[i]
+
+    # Distance rolled on turn k of scenario i with engine e
+    def roll(self, i: int, k: int, e: Engine) -> int:
+        self._extend(i + 1)
+        dice = self._dice[i]
+        while len(dice) <= k:
+            dice.append((self.rng.randint(1,6), self.rng.randint(1,6),
+                self.rng.randint(1,6)))
+        d1, d2, d3 = dice[k]
+        d = d1 + d2
+        if (d1 == d2 and e == Engine.Express) or e == Engine.Superchief:
+            d += d3
+        return d
+
+# Simulated cost of the next trip (excluding the final turn) for each scenario
+# of a stream, given one purchase option's ownership/engine
+class TripSimulator:
+    def __init__(self, s: GameState, player_i: int, stream: ScenarioStream,
+            player_rr: List[List[str]], init_rr: str|None,
+            established_rate: int|None, doubleFees: bool,
+            override_engine: Engine|None = None, max_paths: int | None = None):
+        self.map = s.map
+        self.player_i = player_i
+        self.stream = stream
+        self.player_rr = player_rr
+        self.init_rr = init_rr
+        self.init_rr_id = get_rr_id(s.map, init_rr)
+        self.established_rate = established_rate
+        self.doubleFees = doubleFees
+        self.rules = s.config
+        self.engine = override_engine or s.players[player_i].engine
+        self.owners = get_owners(s.map, player_rr)
+        self._store = get_route_store(s.map)
+        self.max_paths = max_paths
+        self._best_paths: Dict[int, CompiledPath] = {}
+
+    # Cheapest catalogued route to end_pt
+    def best_path(self, end_pt: int) -> CompiledPath:
+        if end_pt not in self._best_paths:
             best_path: List[Waypoint] = []
-            min_cost: int = -1
-            for path in paths:
-                if path[-1][1] != end_pt:
-                    continue
-                cost = calculate_path_cost(s.map, engine, 
-                    player_i, path, 0, player_rr, 
-                    init_rr, established_rate, doubleFees, N=10)
-                if min_cost < 0 or cost < min_cost:
+            best_cost: int | None = None
+            for path in self._store.paths_between(self.stream.start_pt, end_pt)[:self.max_paths]:
+                cost = calculate_path_cost(self.map, self.engine, 
+                    self.player_i, path, 0, self.player_rr, 
+                    self.init_rr, self.established_rate, self.doubleFees, N=10,
+                    cfg=self.rules)
+                if best_cost is None or cost > best_cost:
                     best_path = path
-                    min_cost = cost
-            best_paths[end_pt] = best_path
-        return best_paths[end_pt]
-
-    sim_costs: List[int] = []
-    for _ in range(n_dest):
-        if not forced_dest_pt:
-            dest_region = s.random_lookup('REGION')
-            while dest_region == s.map.points[start_pt].region:
-                dest_region = s.random_lookup('REGION')
-            _, dest_pt = s.map.lookup_city(s.random_lookup(dest_region))
-        else:
-            dest_pt = forced_dest_pt
-        sim_costs += simulate_rolls(s.map, engine, 
-            player_i, get_best_path(dest_pt), n_rolls_per_dest,
-            player_rr, doubleFees, init_rr, established_rate, 
-            include_last_leg=False)
-    return list(sorted(sim_costs))
-
-def select_purchase_options(s: GameState, player_i: int, user_fee: int) -> str|None:
+                    best_cost = cost
+            self._best_paths[end_pt] = compile_path(self.map, best_path)
+        return self._best_paths[end_pt]
+
+    def costs(self, start_i: int, end_i: int) -> List[int]:
+        costs: List[int] = []
+        for i in range(start_i, end_i):
+            cp = self.best_path(self.stream.dest(i))
+            pos, k, cost = 0, 0, 0
+            turn_rr_id, rate = self.init_rr_id, self.established_rate
+            while pos < len(cp):
+                new_d = self.stream.roll(i, k, self.engine)
+                fees, rate = calculate_slice_fees(cp, pos, pos + new_d,
+                    self.player_i, self.owners, len(self.player_rr),
+                    turn_rr_id, rate, self.doubleFees, self.rules)
+                pos, k = min(pos + new_d, len(cp)), k + 1
+                turn_rr_id = cp.rr_at(pos - 1)
+                if pos < len(cp):
+                    cost += fees[self.player_i]
+            costs.append(cost)
+        return costs
+
+# Estimate the crit_pct quantile of simulated costs, adding scenarios in
+# batches until its (~95%) confidence interval is narrower than tolerance, or
+# lies entirely on one side of decision_cost (if given). Returns the estimate
+# and the number of scenarios used.
+SIM_BATCH = 100
+def estimate_crit_cost(sim: TripSimulator, crit_pct: float, tolerance: int,
+        max_n: int, decision_cost: int | None = None,
+        batch_n: int = SIM_BATCH) -> Tuple[int, int]:
+    costs: List[int] = []
+    while len(costs) < max_n:
+        costs += sim.costs(len(costs), min(len(costs) + batch_n, max_n))
+        costs.sort()
+        n = len(costs)
+        crit_i = int(crit_pct * n)
+        spread = 1.96 * sqrt(n * crit_pct * (1 - crit_pct))
+        lo = costs[max(0, int(crit_i - spread))]
+        hi = costs[min(n - 1, int(crit_i + spread + 1))]
+        if hi - lo <= tolerance:
+            break
+        if decision_cost is not None and (lo > decision_cost or hi < decision_cost):
+            break
+    return costs[int(crit_pct * len(costs))], len(costs)
+
+def select_purchase_options(s: GameState, player_i: int, user_fee: int,
+        cfg: AIConfig | None = None) -> str|None:
+    cfg = cfg or s.config.ai
     ps = s.players[player_i]
     def opt_name(opt: str):
         return (opt if opt in [Engine.Express.name, Engine.Superchief.name] 
@@ -238,125 +508,262 @@ def select_purchase_options(s: GameState, player_i: int, user_fee: int) -> str|N
     # We only consider options which leave us with > 0 balance after paying user fees
     raw_opts = s.get_player_purchase_opts(player_i)
     if len(raw_opts) == 0:
-        print('  AI >> No options to choose from, buying nothing')
+        ai_log('No options to choose from, buying nothing')
         return None
 
     # First, we filter out the options we "can't" purchase because they put
     # us at too much risk of going negative. This may require simulating future
-    # trips from our current location assuming each purchase.
-    N_DEST = 200             # Number of random destinations
-    N_ROLL_PER_DEST = 10    # Number of rolls to simulate for each destination
-    # The total number of "scenarios" is N_DEST * N_ROLL_PER_DEST
-    CRIT_PCT = 0.05          # Critical percentile of costs (i.e. we must be able to pay them 1-CRIT_PCT of the time)
-    MIN_SIM_THRESHOLD = 50000 # Don't simulate trips if we can spare at least this much
-    MIN_BAL = 5000           # Don't let the expected ending balance go below this
+    # trips from our current location assuming each purchase. The maximum
+    # number of "scenarios" is n_dest * n_roll_per_dest; we stop early once
+    # the critical cost is known to within min_bal.
+    min_bal = cfg.min_bal
     filtered_opts: List[Tuple[str, int]] = []
     base_player_rr = [p.rr_owned for p in s.players]
 
-    paths: List[List[Waypoint]] | None = None
+    # Every option is simulated on the same scenarios
+    stream = ScenarioStream(s, ps.location)
+
+    # Options far from the cutoff are settled by the policy tables (engines
+    # only) or the trip cost surrogate; each only decides an option when its
+    # estimate is outside its error margin of min_bal, and the rest are
+    # simulated
+    tables = get_policy_tables(s)
+    n_owned = sum(len(rrs) for rrs in base_player_rr)
+    surrogate = get_trip_cost_surrogate(s)
+    if surrogate is not None and (surrogate.crit_pct != cfg.crit_pct or logging_trip_costs()):
+        surrogate = None
 
     has_engine: bool = False
     for opt, price in raw_opts:
-        # If we'll go below MIN_BAL after user fees, definitely omit
-        if ps.bank - price + user_fee <= MIN_BAL:
+        # If we'll go below min_bal after user fees, definitely omit
+        if ps.bank - price + user_fee <= min_bal:
             continue
 
         # If we have a lot in the bank, no need to simulate
-        if ps.bank - price + user_fee > MIN_SIM_THRESHOLD + MIN_BAL:
+        if ps.bank - price + user_fee > cfg.min_sim_threshold + min_bal:
             filtered_opts.append((opt, price))
             continue
 
-        if not paths:
-            paths = get_paths_from_pt(ps.location)
-
         # Generate the simulated distribution assuming this purchase
-        if opt in [Engine.Express.name, Engine.Superchief.name]:
-            sim_costs = simulate_costs(s, player_i, ps.location,
-                base_player_rr, ps.rr, ps.established_rate, s.doubleFees,
-                N_DEST, N_ROLL_PER_DEST, 
-                override_engine=(Engine.Express if opt == Engine.Express.name 
-                    else Engine.Superchief), paths=paths)
+        is_engine = opt in [Engine.Express.name, Engine.Superchief.name]
+        if is_engine:
+            engine = Engine.Express if opt == Engine.Express.name else Engine.Superchief
+            opt_player_rr = base_player_rr
         elif has_engine:
             continue
         else:
-            adj_player_rr = [rr_owned.copy() for rr_owned in base_player_rr]
-            adj_player_rr[player_i].append(opt)
-            sim_costs = simulate_costs(s, player_i, ps.location,
-                adj_player_rr, ps.rr, ps.established_rate, s.doubleFees, 
-                N_DEST, N_ROLL_PER_DEST, paths=paths)
-        next_trip_cost = sim_costs[int(CRIT_PCT * N_DEST * N_ROLL_PER_DEST)]
-        est_bal = ps.bank - price + user_fee + next_trip_cost
-        print(f'  AI >> Est balance after buying {opt_name(opt):10} = {ps.bank:6} - {price:5} - {-user_fee:5} - {-next_trip_cost:5} = {est_bal:6}')
-        if est_bal > MIN_BAL:
+            engine = ps.engine
+            opt_player_rr = [rr_owned.copy() for rr_owned in base_player_rr]
+            opt_player_rr[player_i].append(opt)
+        bal_after = ps.bank - price + user_fee
+        if is_engine and tables is not None and not logging_trip_costs():
+            keep = tables.engine_upgrade(engine, s.map.points[ps.location].region,
+                n_owned, len(s.map.railroads), bal_after, min_bal, cfg.crit_pct)
+            if keep is not None:
+                ai_log(f'Policy table {"keeps" if keep else "removes"} {opt_name(opt)}')
+                if keep:
+                    has_engine = True
+                    filtered_opts.append((opt, price))
+                continue
+        if surrogate is not None or logging_trip_costs():
+            features = trip_cost_features(s, player_i, engine, opt_player_rr)
+        if surrogate is not None:
+            keep = surrogate.screen(features, bal_after, min_bal)
+            if keep is not None:
+                ai_log(f'Surrogate {"keeps" if keep else "removes"} {opt_name(opt)} (est balance {bal_after + surrogate.predict(features):.0f})')
+                if keep:
+                    has_engine |= is_engine
+                    filtered_opts.append((opt, price))
+                continue
+        sim = TripSimulator(s, player_i, stream,
+            opt_player_rr, ps.rr, ps.established_rate, s.doubleFees,
+            override_engine=engine if is_engine else None, max_paths=cfg.max_paths)
+        next_trip_cost, n_sim = estimate_crit_cost(sim, cfg.crit_pct, min_bal,
+            cfg.n_dest * cfg.n_roll_per_dest, min_bal - bal_after)
+        if logging_trip_costs():
+            log_trip_cost(features, next_trip_cost)
+        est_bal = bal_after + next_trip_cost
+        ai_log(f'Est balance after buying {opt_name(opt):10} = {ps.bank:6} - {price:5} - {-user_fee:5} - {-next_trip_cost:5} = {est_bal:6} ({n_sim} trips)')
+        if est_bal > min_bal:
             if opt in [Engine.Express.name, Engine.Superchief.name]:
                 has_engine = True
             filtered_opts.append((opt, price))
         else:
-            print(f'  AI >> Removing option {opt_name(opt)}')
+            ai_log(f'Removing option {opt_name(opt)}')
 
     # If no options remain, do nothing
     if len(filtered_opts) == 0:
-        print(f'  AI >> No remaining options, buying nothing')
+        ai_log(f'No remaining options, buying nothing')
         return None
     # If only one option remains, do that without scoring
     if len(filtered_opts) == 1:
         opt = filtered_opts[0][0]
-        print(f'  AI >> Buying only remaining option, {opt_name(opt)}')
+        ai_log(f'Buying only remaining option, {opt_name(opt)}')
         return filtered_opts[0][0]
     # Always buy the largest engine possible if it's an option
     if any(o == Engine.Superchief.name for o,_ in filtered_opts):
-        print(f'  AI >> Automatically buying engine {Engine.Superchief.name}')
+        ai_log(f'Automatically buying engine {Engine.Superchief.name}')
         return Engine.Superchief.name
     elif any(o == Engine.Express.name for o,_ in filtered_opts):
-        print(f'  AI >> Automatically buying engine {Engine.Express.name}')
+        ai_log(f'Automatically buying engine {Engine.Express.name}')
         return Engine.Express.name
 
     best_rr: str|None = None
     best_score: int|None = None
-    SCORE_PER_FREE_PT = 250
-    SCORE_PER_LOCKED_PT = 250
+    incidence = get_rr_incidence(s)
+    n_free, n_locked = incidence.point_scores(player_i, base_player_rr)
+    trip_share = incidence.trip_shares(ps.location)
     for opt, price in filtered_opts:
-        n_free_pt = 0
-        n_locked_pt = 0
-        for p in s.map.points:
-            rrs = set(p.connections.keys())
-            if opt not in rrs:
-                continue
-            if not any(rr in base_player_rr[player_i] for rr in rrs):
-                n_free_pt += 1
-            rrs.remove(opt)
-            locked_out = [True] * len(s.players)
-            locked_out[player_i] = False
-            for player_j, oth_rr_owned in enumerate(base_player_rr):
-                if player_i == player_j:
-                    continue
-                for rr in oth_rr_owned:
-                    if rr in rrs:
-                        locked_out[player_j] = False
-                        rrs.remove(rr)
-            if len(rrs) == 0:
-                n_locked_pt += sum(1 if l else 0 for l in locked_out)
-        score = n_free_pt * SCORE_PER_FREE_PT + n_locked_pt * SCORE_PER_LOCKED_PT - price
-        print(f'  AI >> Score of {opt_name(opt)} = {score} ({n_free_pt} free, {n_locked_pt} locked, {price} price)')
+        rr_id = incidence.rr_ids[opt]
+        n_free_pt, n_locked_pt = int(n_free[rr_id]), int(n_locked[rr_id])
+        score = (n_free_pt * cfg.score_per_free_pt + n_locked_pt * cfg.score_per_locked_pt
+            + round(trip_share[rr_id] * cfg.score_per_trip_share) - price)
+        ai_log(f'Score of {opt_name(opt)} = {score} ({n_free_pt} free, {n_locked_pt} locked, {trip_share[rr_id]:.0%} of trips, {price} price)')
         if not best_score or score > best_score:
             best_score = score
             best_rr = opt
     assert best_rr, "Must have at least one RR to choose from"
-    print(f'  AI >> Selected {opt_name(best_rr)}')
+    ai_log(f'Selected {opt_name(best_rr)}')
     return best_rr
 
-MIN_DECLARE_SIM_THRESH = 100000
-def recommend_declare(s: GameState, player_i: int) -> bool:
+def recommend_declare(s: GameState, player_i: int, cfg: AIConfig | None = None) -> bool:
+    cfg = cfg or s.config.ai
     ps = s.players[player_i]
-    if ps.bank >= MIN_CASH_TO_WIN + MIN_DECLARE_SIM_THRESH:
-        print(f'  AI >> Balance above threshold, skipping simulation')
+    min_cash = s.config.min_cash_to_win
+    if ps.bank >= min_cash + cfg.declare_sim_threshold:
+        ai_log(f'Balance above threshold, skipping simulation')
         return True
+    tables = get_policy_tables(s)
+    if tables is not None:
+        go = tables.declare(ps.bank, min_cash, quick_network_distance(s.map,
+            ps.location, ps.homeCityIndex), ps.engine, cfg.declare_crit_pct)
+        if go is not None:
+            ai_log(f'Policy table says {"declare" if go else "wait"}')
+            return go
     player_rr = [p.rr_owned for p in s.players]
-    N_ROLL_SIM = 1000
-    CRIT_PCT = 0.10
-    sim_costs = simulate_costs(s, player_i, ps.location, player_rr,
-        ps.rr, ps.established_rate, s.doubleFees, 
-        1, N_ROLL_SIM, forced_dest_pt=ps.homeCityIndex)
-    crit_cost = sim_costs[int(CRIT_PCT * N_ROLL_SIM)]
-    print(f'  AI >> Estimated balance at end of trip = {ps.bank + crit_cost}')
-    return ps.bank + crit_cost >= MIN_CASH_TO_WIN
\ No newline at end of file
+    sim = TripSimulator(s, player_i,
+        ScenarioStream(s, ps.location, forced_dest_pt=ps.homeCityIndex),
+        player_rr, ps.rr, ps.established_rate, s.doubleFees,
+        max_paths=cfg.max_paths)
+    crit_cost, n_sim = estimate_crit_cost(sim, cfg.declare_crit_pct,
+        cfg.declare_tolerance, cfg.declare_n_roll, min_cash - ps.bank)
+    ai_log(f'Estimated balance at end of trip = {ps.bank + crit_cost} ({n_sim} trips)')
+    return ps.bank + crit_cost >= min_cash
+
+# Region to pick when we roll our own region, by expected payoff per turn
+def recommend_region(s: GameState, player_i: int) -> str:
+    city_id = get_rollout_model(s).city_pts.index(s.players[player_i].location)
+    tables = get_policy_tables(s)
+    if tables is not None:
+        return tables.region(city_id)
+    prefs = derived_data(s.map, 'region_preferences', lambda: region_preferences(s))
+    return REGIONS[int(prefs[city_id])]
+
+# Fund raising: sell the railroad whose fee value is lowest for what it
+# raises, preferring ones that cover the whole shortfall by themselves
+def select_rr_to_sell(s: GameState, player_i: int, amt_required: int) -> str:
+    ps = s.players[player_i]
+    assert len(ps.rr_owned) > 0, "Must own a RR to sell one"
+    valuation = get_rr_valuation(s)
+    def net(rr: str) -> int:
+        return s.map.railroads[rr].cost // 2 - valuation.value(s, player_i, rr)
+    covering = [rr for rr in ps.rr_owned
+        if s.map.railroads[rr].cost // 2 >= amt_required]
+    best_rr = max(covering or ps.rr_owned, key=net)
+    ai_log(f'Selling {s.map.railroads[best_rr].shortName} (worth {valuation.value(s, player_i, best_rr)} in fees, sells for {s.map.railroads[best_rr].cost // 2})')
+    return best_rr
+
+def max_bid(s: GameState, player_i: int, rr: str, cfg: AIConfig | None = None) -> int:
+    cfg = cfg or s.config.ai
+    return min(s.players[player_i].bank - cfg.min_bid_reserve,
+        get_rr_valuation(s).max_price(s, player_i, rr))
+
+# Opponents bid up to their max_bid, so the auction should close around the
+# second highest of those. Returns (price, buyer), or None if nobody will bid.
+def expected_auction(s: GameState, player_i: int, rr: str) -> Tuple[int, int] | None:
+    min_price = s.map.railroads[rr].cost // 2
+    bids = sorted(((max_bid(s, ps.index, rr), ps.index) for ps in s.players
+        if ps.index != player_i), reverse=True)
+    bids = [b for b in bids if b[0] >= min_price]
+    if len(bids) == 0:
+        return None
+    price = min(bids[0][0], max(min_price, bids[1][0] + s.config.min_bid_incr)
+        if len(bids) > 1 else min_price)
+    return price, bids[0][1]
+
+# Auction if the expected price beats the bank by more than the extra fees
+# we'd pay the winner
+def recommend_auction(s: GameState, player_i: int, rr: str) -> bool:
+    min_price = s.map.railroads[rr].cost // 2
+    expected = expected_auction(s, player_i, rr)
+    if expected is None:
+        ai_log('No bidders expected, selling to bank')
+        return False
+    price, buyer = expected
+    harm = -get_rr_valuation(s).swing(s, player_i, rr, buyer)
+    ai_log(f'Expect auction price {price} vs bank {min_price}, {harm} more in fees to {s.players[buyer].name}')
+    return price - min_price > harm
+
+def recommend_bid(s: GameState, seller_i: int, bidder_i: int, rr: str, min_bid: int,
+        cfg: AIConfig | None = None) -> int:
+    limit = max_bid(s, bidder_i, rr, cfg)
+    if min_bid > limit:
+        ai_log(f'Passing (max {limit})')
+        return 0
+    ai_log(f'Bidding {min_bid} (max {limit})')
+    return min_bid
+
+# Monte Carlo versions of the purchase, declare and auction decisions: each
+# choice is scored by the share of simplified whole-game rollouts we win after
+# making it (see mcts.py). They fall back to the rules above if no rollouts
+# finish within the time budget.
+def _run_mcts(s: GameState, player_i: int, actions: List[Action],
+        labels: List[str], time_budget: float) -> MCTSResult | None:
+    model = get_rollout_model(s)
+    result = mcts_search(model, compact_game(s, model), player_i, actions,
+        time_budget)
+    for label, n, rate in zip(labels, result.visits, result.win_rates):
+        ai_log(f'MCTS {label:>10}: {rate:6.1%} wins ({n} rollouts)')
+    if result.total_visits == 0:
+        ai_log('No rollouts finished, falling back to heuristics')
+        return None
+    return result
+
+def mcts_select_purchase(s: GameState, player_i: int, user_fee: int,
+        time_budget: float) -> str | None:
+    ps = s.players[player_i]
+    opts: List[str | None] = [None]
+    opts += [opt for opt, price in s.get_player_purchase_opts(player_i)
+        if price < ps.bank + user_fee]
+    if len(opts) == 1:
+        return None
+    labels = [opt if opt is None or opt in [Engine.Express.name, Engine.Superchief.name]
+        else s.map.railroads[opt].shortName for opt in opts]
+    result = _run_mcts(s, player_i, [('buy', opt, -user_fee) for opt in opts],
+        [str(l) for l in labels], time_budget)
+    if result is None:
+        return select_purchase_options(s, player_i, user_fee)
+    return result.best[1]
+
+def mcts_recommend_declare(s: GameState, player_i: int, time_budget: float) -> bool:
+    result = _run_mcts(s, player_i, [('declare', False), ('declare', True)],
+        ['Wait', 'Declare'], time_budget)
+    if result is None:
+        return recommend_declare(s, player_i)
+    return result.best[1]
+
+def mcts_recommend_auction(s: GameState, player_i: int, rr: str,
+        time_budget: float) -> bool:
+    expected = expected_auction(s, player_i, rr)
+    if expected is None:
+        ai_log('No bidders expected, selling to bank')
+        return False
+    price, buyer = expected
+    rr_id = get_rr_id(s.map, rr)
+    result = _run_mcts(s, player_i,
+        [('sell', rr_id, -1, s.map.railroads[rr].cost // 2),
+         ('sell', rr_id, buyer, price)],
+        ['Bank', 'Auction'], time_budget)
+    if result is None:
+        return recommend_auction(s, player_i, rr)
+    return result.best[2] >= 0
@@ -0,0 +1,260 @@
+from pyrailbaron.game.constants import *
+from pyrailbaron.game.state import GameState, Engine
+from pyrailbaron.game.config import GameConfig, DEFAULT_CONFIG
+from pyrailbaron.game.rollout import (RolloutModel, get_rollout_model,
+    ROLLOUT_RESERVE, ROLLOUT_DECLARE_MARGIN, MAX_ROLLOUT_TURNS)
+from pyrailbaron.game.sampling import AliasTable
+from pyrailbaron.map.datamodel import derived_data
+from dataclasses import dataclass
+from typing import Sequence
+from time import time
+import numpy as np
+
+# Many games at once, in lockstep: every step is one turn of every unfinished
+# game, with all player state held in [game, player] arrays. The rules are the
+# simplified rollout rules (see rollout.py), with routing done up front as a
+# padded table of the shortest route between every pair of cities. Railroad
+# ownership is a bitmask per player, and the table holds each hop's railroad
+# as a bit, so the fees for a move are an OR over the hops and a few ANDs.
+# Policy parameters can differ by seat, which is what AI tuning and balance
+# runs compare.
+
+MAX_MOVE = 18   # Most hops in one turn (Superchief rolling 6+6+6)
+
+# Padded arrays built from the rollout model
+class BatchTables:
+    def __init__(self, model: RolloutModel):
+        n = model.n_city
+        self.n_city = n
+        self.n_rr = model.n_rr
+        self.payoffs = np.array(model.payoffs, dtype=np.int64)
+        self.rr_costs = np.array(model.rr_costs, dtype=np.int64)
+
+        self.all_rrs = (1 << self.n_rr) - 1
+
+        # route_bits[a, b, k] = RR bit of hop k from city a to city b (0 past the end)
+        max_len = max(len(r) for row in model.routes for r in row)
+        self.route_len = np.array([[len(r) for r in row] for row in model.routes],
+            dtype=np.int64)
+        self.route_bits = np.zeros((n, n, max_len + MAX_MOVE), dtype=np.int64)
+        for a, row in enumerate(model.routes):
+            for b, r in enumerate(row):
+                self.route_bits[a, b, :len(r)] = [1 << rr_id for rr_id in r]
+        self.rr_bits = np.left_shift(1, np.arange(self.n_rr, dtype=np.int64))
+
+        # Alias tables per start city, padded to the same width; the last row
+        # is the home city roll
+        tables = [AliasTable(np.arange(n, dtype=np.int32), model.dest_weights(a))
+            for a in range(n)] + [AliasTable(np.arange(n, dtype=np.int32),
+            model.dest_weights(None))]
+        self.dest_prob = np.stack([t.prob for t in tables])
+        self.dest_alias = np.stack([t.alias for t in tables]).astype(np.int64)
+
+    # One destination for each start city in starts (n_city = home roll)
+    def sample_dest(self, starts: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        slots = rng.integers(0, self.n_city, size=len(starts))
+        keep = rng.random(len(starts)) < self.dest_prob[starts, slots]
+        return np.where(keep, slots, self.dest_alias[starts, slots])
+
+def get_batch_tables(s: GameState) -> BatchTables:
+    return derived_data(s.map, 'batch_tables',
+        lambda: BatchTables(get_rollout_model(s)), s.route_payoffs, s.roll_tables)
+
+@dataclass
+class BatchResult:
+    winners: np.ndarray     # Winner of each game (-1 = hit the turn limit)
+    turns: np.ndarray       # Player-turns taken in each game
+    n_players: int
+    elapsed: float
+
+    @property
+    def seat_win_rates(self) -> np.ndarray:
+        return np.bincount(self.winners[self.winners >= 0],
+            minlength=self.n_players) / max(1, len(self.winners))
+
+class BatchSimulator:
+    def __init__(self, tables: BatchTables, n_games: int, n_players: int,
+            seed: int | None = None,
+            reserve: int | Sequence[int] = ROLLOUT_RESERVE,
+            declare_margin: int | Sequence[int] = ROLLOUT_DECLARE_MARGIN,
+            rules: GameConfig = DEFAULT_CONFIG):
+        self.t = tables
+        self.rules = rules
+        self.rng = np.random.default_rng(seed)
+        G, P = n_games, n_players
+        self.n_games, self.n_players = G, P
+        self.reserve = np.broadcast_to(np.asarray(reserve, dtype=np.int64), (P,))
+        self.declare_margin = np.broadcast_to(
+            np.asarray(declare_margin, dtype=np.int64), (P,))
+
+        self.bank = np.full((G, P), rules.initial_bank, dtype=np.int64)
+        self.home = tables.sample_dest(np.full(G * P, tables.n_city), self.rng).reshape(G, P)
+        self.start = self.home.copy()
+        self.target = np.full((G, P), -1, dtype=np.int64)
+        self.pos = np.zeros((G, P), dtype=np.int64)
+        self.engine = np.full((G, P), Engine.Basic.value, dtype=np.int64)
+        self.declared = np.zeros((G, P), dtype=bool)
+        self.rr_mask = np.zeros((G, P), dtype=np.int64)
+
+        self.player = np.zeros(G, dtype=np.int64)  # Whose turn it is
+        self.winner = np.full(G, -1, dtype=np.int64)
+        self.turns = np.zeros(G, dtype=np.int64)
+        self.done = np.zeros(G, dtype=bool)
+
+    # Per-game views of the current player's state, for the games in g
+    def _arrived(self, g: np.ndarray, p: np.ndarray) -> np.ndarray:
+        t = self.target[g, p]
+        return (t >= 0) & (self.pos[g, p] >= self.t.route_len[self.start[g, p], np.maximum(t, 0)])
+
+    def _is_winner(self, g: np.ndarray, p: np.ndarray) -> np.ndarray:
+        return (self.declared[g, p] & self._arrived(g, p)
+            & (self.target[g, p] == self.home[g, p]) & (self.bank[g, p] >= self.rules.min_cash_to_win))
+
+    def _set_trip(self, g: np.ndarray, p: np.ndarray, targets: np.ndarray):
+        cur = np.where(self.target[g, p] >= 0, self.target[g, p], self.start[g, p])
+        self.start[g, p] = cur
+        self.target[g, p] = targets
+        self.pos[g, p] = 0
+
+    # Declare or draw a new destination where needed
+    def _check_destination(self, g: np.ndarray, p: np.ndarray):
+        needs = (self.target[g, p] < 0) | (self._arrived(g, p) & ~self.declared[g, p])
+        declare = (needs & (self.target[g, p] >= 0)
+            & (self.bank[g, p] >= self.rules.min_cash_to_win + self.declare_margin[p]))
+        dg, dp = g[declare], p[declare]
+        self.declared[dg, dp] = True
+        self._set_trip(dg, dp, self.home[dg, dp])
+        roll = needs & ~declare
+        rg, rp = g[roll], p[roll]
+        cur = np.where(self.target[rg, rp] >= 0, self.target[rg, rp], self.start[rg, rp])
+        self._set_trip(rg, rp, self.t.sample_dest(cur, self.rng))
+
+    # Default purchase policy (see rollout.default_purchase), vectorized
+    def _purchase(self, g: np.ndarray, p: np.ndarray, fees: np.ndarray):
+        cash = self.bank[g, p] - fees - self.reserve[p]
+        engine = self.engine[g, p]
+        sc = (engine != Engine.Superchief.value) & (cash >= self.rules.superchief_fee)
+        ex = ~sc & (engine == Engine.Basic.value) & (cash >= self.rules.express_fee)
+        self.engine[g[sc], p[sc]] = Engine.Superchief.value
+        self.bank[g[sc], p[sc]] -= self.rules.superchief_fee
+        self.engine[g[ex], p[ex]] = Engine.Express.value
+        self.bank[g[ex], p[ex]] -= self.rules.express_fee
+
+        rr = ~sc & ~ex
+        g, p, cash = g[rr], p[rr], cash[rr]
+        unowned = (self._owned(g)[:, None] & self.t.rr_bits[None, :]) == 0
+        costs = np.where(unowned & (self.t.rr_costs[None, :] <= cash[:, None]),
+            self.t.rr_costs[None, :], 0)
+        best = costs.argmax(axis=1)
+        buy = costs[np.arange(len(g)), best] > 0
+        self.rr_mask[g[buy], p[buy]] |= self.t.rr_bits[best[buy]]
+        self.bank[g[buy], p[buy]] -= self.t.rr_costs[best[buy]]
+
+    # RRs owned by anyone, per game
+    def _owned(self, g: np.ndarray) -> np.ndarray:
+        return np.bitwise_or.reduce(self.rr_mask[g], axis=1)
+
+    # Move d hops along the current route, accumulating who gets paid
+    def _move(self, g: np.ndarray, p: np.ndarray, d: np.ndarray,
+            bank_charge: np.ndarray, charged: np.ndarray, active: np.ndarray):
+        start, target = self.start[g, p], np.maximum(self.target[g, p], 0)
+        pos = self.pos[g, p]
+        end = np.minimum(self.t.route_len[start, target], pos + d)
+        end = np.where(active, end, pos)
+        hops = pos[:, None] + np.arange(int(d.max()))[None, :]
+        route_i = (start * self.t.n_city + target) * self.t.route_bits.shape[2]
+        bits = self.t.route_bits.reshape(-1)[route_i[:, None] + hops]
+        used = np.bitwise_or.reduce(np.where(hops < end[:, None], bits, 0), axis=1)
+        masks = self.rr_mask[g]
+        bank_charge |= (used & ~np.bitwise_or.reduce(masks, axis=1)) != 0
+        charged |= ((masks & used[:, None]) != 0) \
+            & (np.arange(self.n_players)[None, :] != p[:, None])
+        self.pos[g, p] = end
+
+        # Payoffs and purchases on arrival at a destination
+        arrived = active & (end == self.t.route_len[start, target]) & (end > pos) \
+            & ~self.declared[g, p]
+        if arrived.any():
+            ag, ap = g[arrived], p[arrived]
+            self.bank[ag, ap] += self.t.payoffs[self.start[ag, ap], self.target[ag, ap]]
+            self._purchase(ag, ap, self._fees(g, bank_charge, charged)[arrived])
+
+    def _other_fee(self, g: np.ndarray) -> np.ndarray:
+        all_owned = self._owned(g) == self.t.all_rrs
+        return np.where(all_owned, 2 * self.rules.other_user_fee, self.rules.other_user_fee)
+
+    def _fees(self, g: np.ndarray, bank_charge: np.ndarray, charged: np.ndarray) -> np.ndarray:
+        return bank_charge * self.rules.bank_user_fee + self._other_fee(g) * charged.sum(axis=1)
+
+    # Cover negative balances by selling RRs to the bank, cheapest first
+    def _raise_funds(self, g: np.ndarray, p: np.ndarray):
+        short = self.bank[g, p] < 0
+        g, p = g[short], p[short]
+        while len(g) > 0:
+            has_rr = self.rr_mask[g, p] != 0
+            g, p = g[has_rr], p[has_rr]
+            owned = (self.rr_mask[g, p][:, None] & self.t.rr_bits[None, :]) != 0
+            cheapest = np.where(owned, self.t.rr_costs[None, :],
+                np.iinfo(np.int64).max).argmin(axis=1)
+            self.rr_mask[g, p] &= ~self.t.rr_bits[cheapest]
+            self.bank[g, p] += self.t.rr_costs[cheapest] // 2
+            still_short = self.bank[g, p] < 0
+            g, p = g[still_short], p[still_short]
+        np.maximum(self.bank, 0, out=self.bank)
+
+    # One turn of every unfinished game
+    def step(self):
+        g = np.nonzero(~self.done)[0]
+        p = self.player[g]
+        self._check_destination(g, p)
+        won = self._is_winner(g, p)
+
+        d1 = self.rng.integers(1, 7, size=len(g))
+        d2 = self.rng.integers(1, 7, size=len(g))
+        d3 = self.rng.integers(1, 7, size=len(g))
+        engine = self.engine[g, p]
+        bonus = (engine == Engine.Superchief.value) | ((engine == Engine.Express.value) & (d1 == d2))
+        bank_charge = np.zeros(len(g), dtype=bool)
+        charged = np.zeros((len(g), self.n_players), dtype=bool)
+
+        self._move(g, p, d1 + d2, bank_charge, charged, ~won)
+        won |= self._is_winner(g, p)
+        second = bonus & ~won
+        if second.any():
+            self._check_destination(g[second], p[second])
+            won |= self._is_winner(g, p)
+            self._move(g, p, d3, bank_charge, charged, second & ~won)
+            won |= self._is_winner(g, p)
+
+        # Pay the turn's fees
+        other_fee = self._other_fee(g)
+        self.bank[g, p] -= self._fees(g, bank_charge, charged)
+        self.bank[g] += charged * other_fee[:, None]
+        self._raise_funds(g, p)
+        self.declared[g] &= self.bank[g] > self.rules.min_cash_to_win
+        won |= self._is_winner(g, p)
+
+        self.winner[g[won]] = p[won]
+        self.done[g[won]] = True
+        self.turns[g] += 1
+        self.player[g] = (p + 1) % self.n_players
+
+    def run(self, max_turns: int = MAX_ROLLOUT_TURNS) -> BatchResult:
+        t0 = time()
+        while not self.done.all():
+            self.step()
+            self.done |= self.turns >= max_turns
+        return BatchResult(self.winner.copy(), self.turns.copy(), self.n_players,
+            time() - t0)
+
+def simulate_games(n_games: int, n_players: int, seed: int | None = None,
+        rules: GameConfig = DEFAULT_CONFIG, **policy) -> BatchResult:
+    return BatchSimulator(get_batch_tables(GameState(config=rules)), n_games,
+        n_players, seed, rules=rules, **policy).run()
+
+if __name__ == '__main__':
+    res = simulate_games(1000, 4)
+    print(f'{len(res.winners)} games in {res.elapsed:.2f}s '
+        f'({len(res.winners) / res.elapsed:.0f} games/s)')
+    print(f'  Seat win rates: {", ".join(f"{r:.1%}" for r in res.seat_win_rates)}')
+    print(f'  Average turns: {res.turns.mean():.1f}, unfinished: {(res.winners < 0).sum()}')
@@ -30,6 +30,16 @@ def read_roll_tables(table_dir: Path | str | None = None) \
             tables[table_name] = [(odd, even) for _, odd, even in rdr]
     return tables
 
+# Probability of each entry of a roll table: 2d6 picks the row, then an
+# odd/even roll on a third die picks the column
+def roll_table_probabilities(table: List[Tuple[str, str]]) -> Dict[str, float]:
+    probs: Dict[str, float] = {}
+    for i, (odd, even) in enumerate(table):
+        p: float = (6 - abs(i - 5)) / 36  # i = 5 -> d = 7 -> most common
+        probs[odd] = probs.get(odd, 0.0) + p/2
+        probs[even] = probs.get(even, 0.0) + p/2
+    return probs
+
 if __name__ == "__main__":
     payoffs = read_route_payoffs()
     print(f'Read {len(payoffs)} cities')
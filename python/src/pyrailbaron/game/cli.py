@@ -1,16 +1,18 @@
 #pyright: reportPrivateUsage=information
-from pyrailbaron.game.constants import MIN_CASH_TO_WIN, REGIONS
+from pyrailbaron.game.constants import REGIONS
 from pyrailbaron.game.interface import Interface
 from pyrailbaron.game.state import GameState, Waypoint
 from pyrailbaron.game.moves import calculate_legal_moves
-from pyrailbaron.game.logic import run_game
-from pyrailbaron.game.ai import plan_best_moves, recommend_declare, select_purchase_options
+from pyrailbaron.game.logic import run_game, REROLL_REGIONS
+from pyrailbaron.game.ai import (plan_turn_moves, recommend_declare,
+    select_purchase_options, select_rr_to_sell, recommend_auction, recommend_bid,
+    recommend_region, mcts_select_purchase, mcts_recommend_declare, mcts_recommend_auction,
+    DEFAULT_MOVE_TIME_BUDGET)
+from pyrailbaron.game.speculate import SpeculativePlanner
+from pyrailbaron.game.winprob import WinProbabilityService
 
 from random import randint
-from typing import Tuple, List, Dict
-from pyrailbaron.map.bfs import quick_network_distance
-
-from pyrailbaron.map.datamodel import R_EARTH
+from typing import Tuple, List
 
 def roll2() -> Tuple[int, int]:
     rolls = randint(1,6), randint(1,6)
@@ -22,19 +24,22 @@ def roll3() -> Tuple[int, int, int]:
     print(f'  ROLLS: {rolls}')
     return rolls
 
-REROLL_REGIONS: Dict[str, str] = {
-    'NORTHWEST': 'SOUTHEAST',
-    'SOUTHWEST':'NORTHEAST',
-    'PLAINS': 'SOUTHEAST',
-    'NORTH CENTRAL': 'SOUTHWEST',
-    'SOUTH CENTRAL': 'NORTHWEST',
-    'NORTHEAST': 'SOUTHWEST',
-    'SOUTHEAST': 'NORTHWEST'
-}
-
 class CLI_Interface(Interface):
-    def __init__(self, auto_move: bool = False):
+    # move_time_budget = seconds the AI may spend planning each move (None = no limit)
+    # speculate = plan CPU moves for every possible roll while rolling the dice
+    # mcts_budget = seconds of Monte Carlo rollouts for each CPU purchase,
+    #   declare and auction decision (None = use the heuristics)
+    # win_probability = show live win chances in the position summaries
+    def __init__(self, auto_move: bool = False,
+            move_time_budget: float | None = DEFAULT_MOVE_TIME_BUDGET,
+            speculate: bool = True, mcts_budget: float | None = None,
+            win_probability: bool = False):
         self.auto_move = auto_move
+        self.move_time_budget = move_time_budget
+        self.mcts_budget = mcts_budget
+        self.win_prob = WinProbabilityService() if win_probability else None
+        self.speculator = (SpeculativePlanner(move_time_budget)
+            if auto_move and speculate else None)
         self.turn_count = 0
         self.cpu_count = 0
 
@@ -69,6 +74,8 @@ class CLI_Interface(Interface):
 
     def announce_turn(self, s: GameState, player_i: int):
         self.turn_count += 1
+        if self.win_prob:
+            self.win_prob.update(s, player_i)
         print(f"Starting {s.players[player_i].name}'s turn (#{self.turn_count})")
 
     def get_destination(self, s: GameState, player_i: int) -> str:
@@ -79,7 +86,7 @@ class CLI_Interface(Interface):
         player_region = s.map.points[ps.location].region
         if region == player_region:
             if self.auto_move:
-                region = REROLL_REGIONS[region]
+                region = recommend_region(s, player_i)
             else:
                 print('  YOU CHOOSE: ')
                 for i,r in enumerate(REGIONS):
@@ -94,8 +101,13 @@ class CLI_Interface(Interface):
         return city
     
     def roll_for_distance(self, s: GameState, player_i: int) -> Tuple[int, int]:
+        if self.speculator:
+            self.speculator.start_turn(s, player_i)
         print(f'{s.players[player_i].name} >> ROLL FOR DISTANCE')
-        return roll2()
+        d1, d2 = roll2()
+        if self.speculator:
+            self.speculator.dice_rolled(s, player_i, d1, d2)
+        return d1, d2
 
     def bonus_roll(self, s: GameState, player_i: int) -> int:
         print(f'{s.players[player_i].name} >> BONUS ROLL')
@@ -117,51 +129,10 @@ class CLI_Interface(Interface):
         
         waypoints: List[Waypoint] = []
         if self.auto_move:
-            rover_dest = -1
-            min_dist = R_EARTH * 10
-            rover_tgt: str | None = None
-            if not ps.declared:
-                # Undeclared players will check if other players are declared and
-                # attempt to rover them if possible
-                for oth_ps in s.players:
-                    if oth_ps.declared:
-                        assert ps.index != oth_ps.index, "Players cannot rover themselves"
-                        dist_to_declared = s.map.gc_distance(ps.location, oth_ps.location)
-                        if dist_to_declared < min_dist:
-                            rover_dest = oth_ps.location
-                            rover_tgt = oth_ps.name
-                            min_dist = dist_to_declared
-
-            if rover_dest >= 0:
-                try:
-                    print(f'  AI >> Attempting to plan rover for {rover_tgt} at {s.map.points[rover_dest].display_name}')
-                    # Try to do a rover play
-                    waypoints = plan_best_moves(s, player_i, d, init_rr, moves_so_far, 
-                        dest_pt=rover_dest, path_length_flex=2) 
-                    
-                    print(f'  AI >> Verifying that rover still allows trip to {s.map.points[ps.destinationIndex].display_name}')
-                    # Check if we can still reach our "real" destination after the rover
-                    # If not we need to revert to normal planning
-                    rover_end_pt = waypoints[-1][1]
-                    if rover_end_pt != ps.destinationIndex:
-                        if quick_network_distance(s.map, rover_end_pt, ps.destinationIndex,
-                            ps.history + waypoints) < 0:
-                            print('  AI >> SKIPPING ROVER')
-                            rover_dest = -1
-
-                    # If we are still planning a rover, plan the remaining trip to the
-                    # destination after pulling the rover where needed
-                    if rover_dest > 0:
-                        if (len(waypoints) <= d and rover_dest != ps.destinationIndex
-                                and waypoints[-1][1] == rover_dest):
-                            waypoints = plan_best_moves(s, player_i, d, init_rr,
-                                moves_so_far, forced_moves=waypoints, path_length_flex=2)
-                except:
-                    print('  AI >> FAILED TO PLAN ROVER')
-                    rover_dest = -1
-            if rover_dest < 0:
-                waypoints = plan_best_moves(s, player_i, d, init_rr, moves_so_far,
-                    path_length_flex=2)
+            plan = (self.speculator.lookup(s, player_i, d, init_rr, moves_so_far)
+                if self.speculator else None)
+            waypoints = plan if plan is not None else plan_turn_moves(
+                s, player_i, d, init_rr, moves_so_far, self.move_time_budget)
             for wp in waypoints:
                 print(f'  AI >> {move_str(wp)}')
             return waypoints
@@ -193,10 +164,12 @@ class CLI_Interface(Interface):
         return waypoints
 
     def summarize(self, s: GameState):
-        print('\nCURRENT POSITION:')
+        est = self.win_prob.estimate() if self.win_prob else None
+        print('\nCURRENT POSITION:' + (f' (WIN % FROM {est.n_rollouts} GAMES)' if est else ''))
         for ps in s.players:
             rrs = [s.map.railroads[rr].shortName for rr in ps.rr_owned]
-            print(f'  {ps.name:10} {"*" if ps.declared else " "} {ps.bank:6}  {ps.engine.name:>10}   {", ".join(rrs)}')
+            win = f' {est.win_pcts[ps.index]:5.1f}%' if est else ''
+            print(f'  {ps.name:10} {"*" if ps.declared else " "} {ps.bank:6}{win}  {ps.engine.name:>10}   {", ".join(rrs)}')
 
     def update_bank_amts(self, s: GameState):
         self.summarize(s)
@@ -213,15 +186,7 @@ class CLI_Interface(Interface):
         assert len(ps.rr_owned) > 0, "Can't ask to sell RRs when none owned"
         print(f'{ps.name} >> SELECT A RAILROAD TO SELL ({amt_required} NEEDED)')
         if self.auto_move:
-            most_expensive: str | None = None
-            highest_price: int | None = None
-            for rr in ps.rr_owned:
-                price = s.map.railroads[rr].cost
-                if not highest_price or price > highest_price:
-                    most_expensive = rr; highest_price = price
-            assert most_expensive, "Should find at least one RR to sell"
-            print(f'  AI >> Selling {most_expensive} (MOST EXPENSIVE)')
-            return most_expensive
+            return select_rr_to_sell(s, player_i, amt_required)
 
         for i,rr in enumerate(ps.rr_owned):
             rr_data = s.map.railroads[rr]
@@ -238,8 +203,9 @@ class CLI_Interface(Interface):
 
     def ask_to_auction(self, s: GameState, player_i: int, rr_to_sell: str) -> bool:
         if self.auto_move:
-            print('  AI >> Sell immediately to bank')
-            return False
+            if self.mcts_budget is not None:
+                return mcts_recommend_auction(s, player_i, rr_to_sell, self.mcts_budget)
+            return recommend_auction(s, player_i, rr_to_sell)
 
         print('Choose...')
         print('  [A] Auction to other players')
@@ -249,6 +215,9 @@ class CLI_Interface(Interface):
     def ask_for_bid(self, s: GameState, selling_player_i: int, bidding_player_i: int, rr_to_sell: str, min_bid: int) -> int:
         ps = s.players[bidding_player_i]
         if ps.bank >= min_bid:
+            if self.auto_move:
+                print(f'{ps.name} >> BID FOR {rr_to_sell} (MIN = {min_bid})')
+                return recommend_bid(s, selling_player_i, bidding_player_i, rr_to_sell, min_bid)
             return int(input(f'{ps.name} >>> ENTER BID (MIN = {min_bid}, MAX = {ps.bank}, PASS = 0): '))
         else:
             print(f'{ps.name} PASSES (NOT ENOUGH BANK)')
@@ -268,6 +237,8 @@ class CLI_Interface(Interface):
             print('  NO OPTIONS')
             return None
         if self.auto_move:
+            if self.mcts_budget is not None:
+                return mcts_select_purchase(s, player_i, user_fee, self.mcts_budget)
             best_opt = select_purchase_options(s, player_i, user_fee)
             return best_opt
 
@@ -288,15 +259,17 @@ class CLI_Interface(Interface):
     def ask_to_declare(self, s: GameState, player_i: int) -> bool:
         ps = s.players[player_i]
         print(f'{ps.name} >>> DO YOU WANT TO DECLARE?')
-        print(f'You currently have {ps.bank} - you will need to return to {ps.homeCity} with {MIN_CASH_TO_WIN} to win')
+        print(f'You currently have {ps.bank} - you will need to return to {ps.homeCity} with {s.config.min_cash_to_win} to win')
         if self.auto_move:
+            if self.mcts_budget is not None:
+                return mcts_recommend_declare(s, player_i, self.mcts_budget)
             return recommend_declare(s, player_i)
 
         return input('Declare for your trip home (Y/N)? ').upper().strip() == 'Y'
 
     def announce_undeclared(self, s: GameState, player_i: int):
         ps = s.players[player_i]
-        print(f'{ps.name} HAS BECOME UNDECLARED (BANK {ps.bank} FELL BELOW {MIN_CASH_TO_WIN})')
+        print(f'{ps.name} HAS BECOME UNDECLARED (BANK {ps.bank} FELL BELOW {s.config.min_cash_to_win})')
 
     def announce_rover_play(self, s: GameState, decl_player_i: int, rover_player_i: int):
         dec_pn = s.players[decl_player_i].name
@@ -306,6 +279,10 @@ class CLI_Interface(Interface):
         print(f'{dec_pn} IS NO LONGER DECLARED')
 
     def show_winner(self, s: GameState, winner_i: int):
+        if self.speculator:
+            self.speculator.shutdown()
+        if self.win_prob:
+            self.win_prob.shutdown()
         print(f'\n{s.players[winner_i].name} IS THE WINNER !!!!!')
         print(f'{self.turn_count} TURNS TOTAL')
         print('\nFINAL SUMMARY')
@@ -0,0 +1,150 @@
+from pyrailbaron.game.state import GameState, PlayerState, Engine
+from pyrailbaron.game.ledger import Account, Ledger, Reason, Transaction
+from pyrailbaron.game.snapshot import get_segment_ids
+from pyrailbaron.map.datamodel import Map, RailSegment, make_rail_seg, derived_data, network_hash
+from pyrailbaron.map.summary import get_rr_ids, get_rr_names
+from hashlib import sha1
+from random import Random
+from struct import Struct
+from typing import Dict, List, Tuple
+import json
+import math
+
+# Compact binary encoding of the dynamic part of a game (players, ownership,
+# uncommitted transactions and optionally the dice RNG), for checkpointing
+# every turn and shipping states to worker processes. The map, charts and
+# config aren't stored; the encoding carries a hash of them instead and
+# decoding takes a GameState that already has them. Histories are stored as
+# rail segment ids (see snapshot.get_segment_ids), cities as point ids.
+# The ledger only holds uncommitted transactions (settled totals are in each
+# player's Account), so it is stored whole.
+
+MAGIC = b'RBS1'
+_HEADER = Struct('<4s20sBBII') # magic, static hash, players, has RNG, pending transactions, batch
+_PLAYER = Struct('<ihhhBBBBbi?BBHHHHHHhdd')
+_ACCOUNT = Struct(f'<{4 * len(Reason)}i')
+_RNG = Struct('<625Id')
+_REASONS = list(Reason)
+_REASON_NAMES = [r.name for r in Reason]
+
+# Fingerprint of everything a decoded state is expected to share with the
+# GameState it is decoded against
+def static_hash(s: GameState) -> bytes:
+    def build() -> bytes:
+        return sha1(json.dumps([network_hash(s.map),
+            [p.city_names for p in s.map.points], s.route_payoffs,
+            s.roll_tables, s.config.to_dict()], sort_keys=True).encode()).digest()
+    return derived_data(s.map, 'static_hash', build, s.route_payoffs,
+        s.roll_tables, s.config)
+
+# Segment id -> rail segment
+def get_segments(m: Map) -> List[RailSegment]:
+    return derived_data(m, 'segments', lambda: list(get_segment_ids(m)))
+
+def _city_id(m: Map, pt: int, name: str | None) -> Tuple[int, int]:
+    if name is None:
+        return -1, 0
+    return pt, m.points[pt].city_names.index(name)
+
+def _city_name(m: Map, pt: int, name_i: int) -> str | None:
+    return None if pt < 0 else m.points[pt].city_names[name_i]
+
+def _encode_account(acct: Account) -> bytes:
+    vals: List[int] = []
+    for d in (acct.credits, acct.debits, acct.trip_credits, acct.trip_debits):
+        vals += [d.get(r, 0) for r in _REASON_NAMES]
+    return _ACCOUNT.pack(*vals)
+
+def _decode_account(vals: Tuple[int, ...]) -> Account:
+    n = len(_REASONS)
+    dicts: List[Dict[str, int]] = [dict((r, v) for r, v
+        in zip(_REASON_NAMES, vals[k * n:(k + 1) * n]) if v != 0) for k in range(4)]
+    return Account(*dicts)
+
+def encode_state(s: GameState, rng: Random | None = None) -> bytes:
+    m = s.map
+    seg_ids = get_segment_ids(m)
+    rr_ids = get_rr_ids(m)
+    pending = s.ledger.pending
+    parts = [_HEADER.pack(MAGIC, static_hash(s), len(s.players), rng is not None,
+        len(pending), s.ledger.batch)]
+    for ps in s.players:
+        home_pt, home_n = _city_id(m, ps.homeCityIndex, ps.homeCity)
+        start_pt, start_n = _city_id(m, ps.startCityIndex, ps.startCity)
+        dest_pt, dest_n = _city_id(m, ps._destinationIndex, ps.destination)
+        name = ps.name.encode()
+        parts.append(_PLAYER.pack(ps.bank, home_pt, start_pt, dest_pt,
+            home_n, start_n, dest_n, ps.engine.value,
+            -1 if ps.rr is None else rr_ids[ps.rr],
+            -1 if ps.established_rate is None else ps.established_rate,
+            ps.declared, len(name), len(ps.rr_owned), len(ps.history),
+            ps.rover_play_wins, ps.rover_play_losses, ps.times_declared,
+            ps.trips_completed, ps.trip_turns, ps.rover_play_index,
+            ps.total_miles, ps.trip_miles))
+        segs: List[int] = []
+        curr_pt = ps.startCityIndex
+        for rr, pt in ps.history:
+            segs.append(seg_ids[make_rail_seg(rr, curr_pt, pt)])
+            curr_pt = pt
+        parts += [name, bytes(rr_ids[rr] for rr in ps.rr_owned),
+            Struct(f'<{len(segs)}H').pack(*segs), _encode_account(ps.account)]
+    parts.append(Struct(f'<{3 * len(pending)}i').pack(
+        *(v for tx in pending for v in (tx.player, tx.amount, tx.reason.value))))
+    if rng is not None:
+        _, mt, gauss = rng.getstate()
+        parts.append(_RNG.pack(*mt, math.nan if gauss is None else gauss))
+    return b''.join(parts)
+
+# Rebuild a GameState encoded against static's map, charts and config (and
+# restore rng, if the state was saved with one)
+def decode_state(data: bytes, static: GameState, rng: Random | None = None) -> GameState:
+    magic, s_hash, n_players, has_rng, n_tx, batch = _HEADER.unpack_from(data)
+    assert magic == MAGIC, "Not an encoded game state"
+    assert s_hash == static_hash(static), "State was saved against different map/charts/config"
+    m = static.map
+    segments = get_segments(m)
+    rr_names = get_rr_names(m)
+    pos = _HEADER.size
+    players: List[PlayerState] = []
+    for player_i in range(n_players):
+        (bank, home_pt, start_pt, dest_pt, home_n, start_n, dest_n, engine,
+            rr, rate, declared, n_name, n_owned, n_hist, rover_wins,
+            rover_losses, times_declared, trips_completed, trip_turns,
+            rover_play_index, total_miles, trip_miles) = _PLAYER.unpack_from(data, pos)
+        pos += _PLAYER.size
+        name = data[pos:pos + n_name].decode()
+        pos += n_name
+        rr_owned = [rr_names[rr_id] for rr_id in data[pos:pos + n_owned]]
+        pos += n_owned
+        history: List[Tuple[str, int]] = []
+        curr_pt = start_pt
+        for seg_id in Struct(f'<{n_hist}H').unpack_from(data, pos):
+            seg_rr, a, b = segments[seg_id]
+            curr_pt = b if curr_pt == a else a
+            history.append((seg_rr, curr_pt))
+        pos += 2 * n_hist
+        account = _decode_account(_ACCOUNT.unpack_from(data, pos))
+        pos += _ACCOUNT.size
+        players.append(PlayerState(index=player_i, name=name,
+            _homeCity=_city_name(m, home_pt, home_n),
+            _startCity=_city_name(m, start_pt, start_n),
+            _destination=_city_name(m, dest_pt, dest_n),
+            _homeCityIndex=home_pt, _startCityIndex=start_pt,
+            _destinationIndex=dest_pt, bank=bank, engine=Engine(engine),
+            rr=None if rr < 0 else rr_names[rr],
+            established_rate=None if rate < 0 else rate, rr_owned=rr_owned,
+            history=history, declared=declared, account=account,
+            total_miles=total_miles, rover_play_wins=rover_wins,
+            rover_play_losses=rover_losses, times_declared=times_declared,
+            trips_completed=trips_completed, trip_turns=trip_turns,
+            rover_play_index=rover_play_index, trip_miles=trip_miles))
+    vals = Struct(f'<{3 * n_tx}i').unpack_from(data, pos)
+    pos += 12 * n_tx
+    pending = [Transaction(vals[k], vals[k + 1], _REASONS[vals[k + 2]], batch)
+        for k in range(0, 3 * n_tx, 3)]
+    if has_rng and rng is not None:
+        *mt, gauss = _RNG.unpack_from(data, pos)
+        rng.setstate((3, tuple(mt), None if math.isnan(gauss) else gauss))
+    return GameState(map=m, route_payoffs=static.route_payoffs,
+        roll_tables=static.roll_tables, players=players, config=static.config,
+        ledger=Ledger(pending, batch))
@@ -0,0 +1,55 @@
+from pyrailbaron.game.constants import *
+from pyrailbaron.map.routes import MAX_PATHS_PER_PAIR
+from dataclasses import dataclass, field
+from dataclasses_json import dataclass_json
+
+# Rule settings and AI tunables. The defaults are the standard game (see
+# constants.py); a game's settings live in GameState.config, and the AI's
+# decisions take an AIConfig (defaulting to the game's) so players with
+# different settings can play each other.
+#
+# Everything that prices a game follows GameConfig: the rules engine
+# (logic.py, fees.calculate_user_fees, purchase options), the AI's route
+# planner, move frontier, expectimax, trip simulations, railroad valuation
+# and rollouts, the batch simulator and the GUI. The offline policy tables
+# and trip cost model record the rules they were built under and are ignored
+# in games with other rules.
+
+@dataclass_json
+@dataclass(frozen=True)
+class AIConfig:
+    # Purchase risk filter
+    n_dest: int = 200               # Random destinations to simulate
+    n_roll_per_dest: int = 10       # Rolls simulated for each destination
+    crit_pct: float = 0.05          # We must be able to pay the next trip 1-crit_pct of the time
+    min_sim_threshold: int = 50000  # Don't simulate trips if we can spare at least this much
+    min_bal: int = 5000             # Don't let the expected ending balance go below this
+    max_paths: int = MAX_PATHS_PER_PAIR # Catalogued routes tried per destination
+
+    # Railroad scoring
+    score_per_free_pt: int = 250
+    score_per_locked_pt: int = 250
+    score_per_trip_share: int = 20000 # i.e. $200 per % of likely next trips using the RR
+
+    # Declaring
+    declare_sim_threshold: int = 100000 # Declare without simulating this far over the target
+    declare_n_roll: int = 1000
+    declare_crit_pct: float = 0.10
+    declare_tolerance: int = 5000
+
+    min_bid_reserve: int = 5000     # Don't bid away the last of our cash
+
+@dataclass_json
+@dataclass(frozen=True)
+class GameConfig:
+    initial_bank: int = INITIAL_BANK
+    min_cash_to_win: int = MIN_CASH_TO_WIN
+    bank_user_fee: int = BANK_USER_FEE
+    other_user_fee: int = OTHER_USER_FEE
+    min_bid_incr: int = MIN_BID_INCR
+    rover_play_fee: int = ROVER_PLAY_FEE
+    express_fee: int = EXPRESS_FEE
+    superchief_fee: int = SUPERCHIEF_FEE
+    ai: AIConfig = field(default_factory=AIConfig)
+
+DEFAULT_CONFIG = GameConfig()
@@ -1,6 +1,6 @@
 from typing import List
 
-# TODO: Move these to a config and allow them to be changed
+# Standard rules; a game can change them with a GameConfig (see config.py)
 INITIAL_BANK = 20000
 MIN_CASH_TO_WIN = 200000
 BANK_USER_FEE = 1000
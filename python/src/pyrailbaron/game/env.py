@@ -0,0 +1,415 @@
+from pyrailbaron.game.interface import Interface
+from pyrailbaron.game.state import GameState, Engine
+from pyrailbaron.game.logic import run_game, REROLL_REGIONS
+from pyrailbaron.game.moves import find_legal_moves
+from pyrailbaron.game.snapshot import get_segment_ids
+from pyrailbaron.game.ai import (plan_turn_moves, select_purchase_options,
+    recommend_declare, select_rr_to_sell, recommend_auction, recommend_bid,
+    set_quiet_logging)
+from pyrailbaron.game.rollout import ROLLOUT_RESERVE
+from pyrailbaron.map.datamodel import Map, Waypoint, make_rail_seg, derived_data
+from pyrailbaron.map.summary import get_rr_names
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Any
+from random import Random
+from multiprocessing.connection import Connection
+import multiprocessing
+import random
+import traceback
+import numpy as np
+
+# Reinforcement-learning environment over the full game rules. One seat
+# ("AGENT") is played by the learner and the rest by the scripted AI. The game
+# loop drives an Interface, so each environment runs its games in its own
+# worker process, where the agent's Interface calls send an observation down
+# a pipe and block until step() sends back an action; everything else (dice,
+# destinations, opponents, the agent's sales and bids) is played out
+# automatically in between. step() sends every action before waiting on any
+# reply, so the environments play in parallel.
+#
+# The agent decides three things, each from one shared discrete action space:
+#   - moves, one hop at a time: action k takes the k-th connection (see
+#     get_move_slots) out of the current point
+#   - purchases: none, Express, Superchief or a railroad
+#   - whether to declare
+# and every observation comes with a mask of the actions that are legal now.
+
+AGENT_NAME = 'AGENT'
+PHASE_MOVE, PHASE_PURCHASE, PHASE_DECLARE = 0, 1, 2
+# The scripted players' move planning is limited by stages rather than seconds
+# (as in tournament.py), so an episode plays the same from a seed however busy
+# the machine is
+OPPONENT_MOVE_STAGES = 4 # Planning stages per roll (see ai.plan_turn_moves)
+MAX_EPISODE_DECISIONS = 5000
+
+# select_purchase_options simulates hundreds of trips per option and can take
+# seconds, which swamps everything else in a training run. With fast_opponents
+# the scripted players buy with the rollout default policy instead; by default
+# they use the real AI.
+def quick_purchase(s: GameState, player_i: int, user_fee: int) -> str | None:
+    ps = s.players[player_i]
+    cash = ps.bank + user_fee - ROLLOUT_RESERVE
+    if ps.engine != Engine.Superchief and cash >= s.config.superchief_fee:
+        return Engine.Superchief.name
+    if ps.engine == Engine.Basic and cash >= s.config.express_fee:
+        return Engine.Express.name
+    best_cost, best = 0, None
+    for rr, price in s.get_player_purchase_opts(player_i):
+        if rr in s.map.railroads and best_cost < price <= cash:
+            best_cost, best = price, rr
+    return best
+
+# Every connection out of each point in a fixed order; the busiest point sets
+# the number of move actions
+def get_move_slots(m: Map) -> List[List[Waypoint]]:
+    return derived_data(m, 'move_slots', lambda: [
+        sorted((rr, q) for rr, pts in p.connections.items() for q in pts)
+        for p in m.points])
+
+@dataclass(frozen=True)
+class ActionLayout:
+    n_move: int
+    rr_names: List[str]
+
+    @property
+    def purchase_base(self) -> int:
+        return self.n_move
+
+    @property
+    def purchase_opts(self) -> List[str | None]:
+        return [None, Engine.Express.name, Engine.Superchief.name] + self.rr_names
+
+    @property
+    def declare_base(self) -> int:
+        return self.n_move + len(self.purchase_opts)
+
+    @property
+    def n_actions(self) -> int:
+        return self.declare_base + 2
+
+def get_action_layout(m: Map) -> ActionLayout:
+    return derived_data(m, 'action_layout', lambda: ActionLayout(
+        max(len(slots) for slots in get_move_slots(m)), get_rr_names(m)))
+
+# Fixed-size arrays describing the game from player_i's seat
+def encode_observation(s: GameState, player_i: int, phase: int,
+        moves_left: int = 0) -> Dict[str, np.ndarray]:
+    m = s.map
+    seg_ids = get_segment_ids(m)
+    rr_ids = dict((rr, i) for i, rr in enumerate(get_rr_names(m)))
+    P = len(s.players)
+    ownership = np.zeros((P, len(rr_ids)), dtype=np.int8)
+    for ps in s.players:
+        for rr in ps.rr_owned:
+            ownership[ps.index, rr_ids[rr]] = 1
+    used = np.zeros(len(seg_ids), dtype=np.int8)
+    ps = s.players[player_i]
+    curr_pt = ps.startCityIndex
+    for rr, pt in ps.history:
+        used[seg_ids[make_rail_seg(rr, curr_pt, pt)]] = 1
+        curr_pt = pt
+    return {
+        'seat': np.array(player_i, dtype=np.int32),
+        'phase': np.array(phase, dtype=np.int32),
+        'moves_left': np.array(moves_left, dtype=np.int32),
+        'location': np.array([p.location for p in s.players], dtype=np.int32),
+        'destination': np.array([p.destinationIndex for p in s.players], dtype=np.int32),
+        'home': np.array([p.homeCityIndex for p in s.players], dtype=np.int32),
+        'bank': np.array([p.bank / s.config.min_cash_to_win for p in s.players], dtype=np.float32),
+        'engine': np.array([p.engine.value for p in s.players], dtype=np.int8),
+        'declared': np.array([p.declared for p in s.players], dtype=np.int8),
+        'ownership': ownership,
+        'used_segments': used,
+    }
+
+class _Abort(Exception):
+    pass
+
+# Sent in place of an action by reset(): drop the current game and start over
+RESTART = 'restart'
+
+class _Restart(Exception):
+    pass
+
+# The rules have no way out of a position with no legal move, so the agent
+# loses the game if it moves into one
+class _BoxedIn(Exception):
+    pass
+
+# Plays the scripted seats and hands the agent's decisions to the env
+class _EnvInterface(Interface):
+    def __init__(self, env_i: int, n_players: int, rng: Random, conn: Connection,
+            opponent_move_stages: int, fast_opponents: bool):
+        self.env_i = env_i
+        self.rng = rng
+        self.conn = conn
+        self.opponent_move_stages = opponent_move_stages
+        self.fast_opponents = fast_opponents
+        self.names = [AGENT_NAME] + [f'CPU{i}' for i in range(1, n_players)]
+        self.n_decisions = 0
+        self.closed = False
+
+    def _is_agent(self, s: GameState, player_i: int) -> bool:
+        return s.players[player_i].name == AGENT_NAME
+
+    def _decide(self, s: GameState, player_i: int, phase: int, mask: np.ndarray,
+            moves_left: int = 0) -> int:
+        self.n_decisions += 1
+        self.conn.send(('obs', (encode_observation(s, player_i, phase, moves_left), mask)))
+        action = self.conn.recv()
+        if action is None:
+            self.closed = True
+            raise _Abort()
+        if action == RESTART:
+            raise _Restart()
+        assert mask[action], f"Action {action} is not legal here"
+        return action
+
+    def get_player_name(self) -> str:
+        return self.names.pop(0)
+
+    def announce_player_order(self, s: GameState):
+        pass
+
+    def get_home_city(self, s: GameState, player_i: int) -> str:
+        return s.random_lookup(s.random_lookup('REGION', self.rng), self.rng)
+
+    def announce_turn(self, s: GameState, player_i: int):
+        if self.n_decisions >= MAX_EPISODE_DECISIONS:
+            raise _Abort()
+
+    def get_destination(self, s: GameState, player_i: int) -> str:
+        ps = s.players[player_i]
+        region = s.random_lookup('REGION', self.rng)
+        if region == s.map.points[ps.location].region:
+            region = REROLL_REGIONS[region]
+        city, city_i = s.map.lookup_city(s.random_lookup(region, self.rng))
+        while city_i == ps.location:
+            city, city_i = s.map.lookup_city(s.random_lookup(region, self.rng))
+        return city
+
+    def roll_for_distance(self, s: GameState, player_i: int) -> Tuple[int, int]:
+        return self.rng.randint(1, 6), self.rng.randint(1, 6)
+
+    def bonus_roll(self, s: GameState, player_i: int) -> int:
+        return self.rng.randint(1, 6)
+
+    def get_player_move(self, s: GameState, player_i: int, d: int, init_rr: str | None, moves_so_far: int) -> List[Waypoint]:
+        if not self._is_agent(s, player_i):
+            return plan_turn_moves(s, player_i, d, init_rr, moves_so_far,
+                max_stages=self.opponent_move_stages)
+        ps = s.players[player_i]
+        layout = get_action_layout(s.map)
+        slots = get_move_slots(s.map)
+        waypoints: List[Waypoint] = []
+        curr_pt = ps.location
+        for hop in range(d):
+            legal = find_legal_moves(s.map, ps.startCityIndex, ps.history + waypoints,
+                ps.destinationIndex, ps.rover_play_index)
+            if len(legal) == 0:
+                raise _BoxedIn()
+            mask = np.zeros(layout.n_actions, dtype=bool)
+            for k, wp in enumerate(slots[curr_pt]):
+                mask[k] = wp in legal
+            action = self._decide(s, player_i, PHASE_MOVE, mask, d - hop)
+            wp = slots[curr_pt][action]
+            waypoints.append(wp)
+            curr_pt = wp[1]
+            if curr_pt == ps.destinationIndex:
+                break
+        return waypoints
+
+    def update_bank_amts(self, s: GameState):
+        pass
+
+    def update_owners(self, s: GameState):
+        pass
+
+    def display_shortfall(self, s: GameState, player_i: int, amt: int):
+        pass
+
+    def select_rr_to_sell(self, s: GameState, player_i: int, amt_required: int) -> str:
+        return select_rr_to_sell(s, player_i, amt_required)
+
+    def announce_route_payoff(self, s: GameState, player_i: int, payoff: int):
+        pass
+
+    def ask_to_auction(self, s: GameState, player_i: int, rr_to_sell: str) -> bool:
+        return recommend_auction(s, player_i, rr_to_sell)
+
+    def ask_for_bid(self, s: GameState, selling_player_i: int, bidding_player_i: int, rr_to_sell: str, min_bid: int) -> int:
+        if s.players[bidding_player_i].bank < min_bid:
+            return 0
+        return recommend_bid(s, selling_player_i, bidding_player_i, rr_to_sell, min_bid)
+
+    def announce_sale(self, s: GameState, seller_i: int, buyer_i: int, rr: str, price: int):
+        pass
+
+    def announce_sale_to_bank(self, s: GameState, seller_i: int, rr: str, price: int):
+        pass
+
+    def get_purchase(self, s: GameState, player_i: int, user_fee: int) -> str|None:
+        if len(s.get_player_purchase_opts(player_i)) == 0:
+            return None
+        if not self._is_agent(s, player_i):
+            if self.fast_opponents:
+                return quick_purchase(s, player_i, user_fee)
+            return select_purchase_options(s, player_i, user_fee)
+        layout = get_action_layout(s.map)
+        mask = np.zeros(layout.n_actions, dtype=bool)
+        mask[layout.purchase_base] = True
+        opts = layout.purchase_opts
+        for opt, _ in s.get_player_purchase_opts(player_i):
+            mask[layout.purchase_base + opts.index(opt)] = True
+        action = self._decide(s, player_i, PHASE_PURCHASE, mask)
+        return opts[action - layout.purchase_base]
+
+    def ask_to_declare(self, s: GameState, player_i: int) -> bool:
+        if not self._is_agent(s, player_i):
+            return recommend_declare(s, player_i)
+        layout = get_action_layout(s.map)
+        mask = np.zeros(layout.n_actions, dtype=bool)
+        mask[layout.declare_base:layout.declare_base + 2] = True
+        return self._decide(s, player_i, PHASE_DECLARE, mask) == layout.declare_base + 1
+
+    def announce_undeclared(self, s: GameState, player_i: int):
+        pass
+
+    def announce_rover_play(self, s: GameState, decl_player_i: int, rover_player_i: int):
+        pass
+
+    def show_winner(self, s: GameState, winner_i: int):
+        reward = 1.0 if self._is_agent(s, winner_i) else -1.0
+        self.conn.send(('done', reward))
+
+# One environment's worker process: plays game after game, until the env
+# sends None in place of an action. A restart drops the game in progress
+# without reporting it.
+def _env_worker(env_i: int, n_players: int, seed: int, conn: Connection,
+        opponent_move_stages: int, fast_opponents: bool):
+    set_quiet_logging(True)
+    random.seed(seed) # The AI's simulations use the global RNG
+    static = GameState()
+    rng = Random(seed)
+    while True:
+        i = _EnvInterface(env_i, n_players, rng, conn, opponent_move_stages,
+            fast_opponents)
+        try:
+            run_game(n_players, i, static)
+        except _BoxedIn:
+            conn.send(('done', -1.0))
+        except _Restart:
+            pass
+        except _Abort:
+            if i.closed:
+                return
+            conn.send(('truncated', 0.0))
+        except EOFError:
+            return # The env went away without closing
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+            return
+
+# Parent's end of one environment
+class _EnvWorker:
+    def __init__(self, env_i: int, n_players: int, seed: int,
+            opponent_move_stages: int, fast_opponents: bool):
+        self.env_i = env_i
+        # Spawn rather than fork, as for the rollout pool
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_env_worker, args=(env_i, n_players,
+            seed, child_conn, opponent_move_stages, fast_opponents), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.awaiting_action = False
+
+    def send(self, action: int | str | None):
+        self.conn.send(action)
+        self.awaiting_action = False
+
+    # Next request from the game: ('obs', (obs, mask)), or the end of an
+    # episode (the next episode's first observation follows)
+    def next(self) -> Tuple[str, Any]:
+        kind, payload = self.conn.recv()
+        if kind == 'error':
+            raise RuntimeError(f"Environment {self.env_i} failed:\n{payload}")
+        self.awaiting_action = kind == 'obs'
+        return kind, payload
+
+    # First observation of a fresh game. A game waiting on an action is
+    # dropped; anything it already sent (an unread observation, or the end
+    # of an episode) is read past until the next observation.
+    def restart(self) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        if self.awaiting_action:
+            self.send(RESTART)
+        kind, payload = self.next()
+        while kind != 'obs':
+            kind, payload = self.next()
+        return payload
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+class RailBaronVecEnv:
+    def __init__(self, n_envs: int, n_players: int = 3, seed: int | None = None,
+            opponent_move_stages: int = OPPONENT_MOVE_STAGES,
+            fast_opponents: bool = False):
+        self.n_envs = n_envs
+        self.n_players = n_players
+        self.layout = get_action_layout(GameState().map)
+        rng = Random(seed)
+        self.workers = [_EnvWorker(i, n_players, rng.getrandbits(32),
+            opponent_move_stages, fast_opponents) for i in range(n_envs)]
+        self._obs: List[Dict[str, np.ndarray]] = []
+        self._masks: List[np.ndarray] = []
+
+    @property
+    def n_actions(self) -> int:
+        return self.layout.n_actions
+
+    @staticmethod
+    def _stack(obs: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        return dict((k, np.stack([o[k] for o in obs])) for k in obs[0])
+
+    # First observation of every environment, with info['action_mask'].
+    # Games in progress are abandoned.
+    def reset(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        self._obs, self._masks = [], []
+        for w in self.workers:
+            obs, mask = w.restart()
+            self._obs.append(obs)
+            self._masks.append(mask)
+        return self._stack(self._obs), {'action_mask': np.stack(self._masks)}
+
+    # Apply one action per environment. Finished episodes restart at once, so
+    # the observation returned for them is the first of the next episode.
+    def step(self, actions: np.ndarray) -> Tuple[Dict[str, np.ndarray],
+            np.ndarray, np.ndarray, np.ndarray, Dict[str, Any]]:
+        assert len(actions) == self.n_envs, "Need one action per environment"
+        for w, a in zip(self.workers, actions):
+            w.send(int(a))
+        rewards = np.zeros(self.n_envs, dtype=np.float32)
+        terminated = np.zeros(self.n_envs, dtype=bool)
+        truncated = np.zeros(self.n_envs, dtype=bool)
+        for i, w in enumerate(self.workers):
+            kind, payload = w.next()
+            if kind != 'obs':
+                rewards[i] = payload
+                terminated[i] = kind == 'done'
+                truncated[i] = kind == 'truncated'
+                kind, payload = w.next()
+            self._obs[i], self._masks[i] = payload
+        return (self._stack(self._obs), rewards, terminated, truncated,
+            {'action_mask': np.stack(self._masks)})
+
+    def close(self):
+        for w in self.workers:
+            w.close()
@@ -0,0 +1,199 @@
+from pyrailbaron.game.state import Engine, GameState
+from pyrailbaron.game.planner import FeeModel, TurnState, expected_roll
+from pyrailbaron.map.datamodel import Waypoint, RailSegment, make_rail_seg
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Optional
+from time import time
+
+# Expectimax over the next few turns of a trip. The greedy planner picks the
+# route with the lowest expected fees and moves d hops along it; this instead
+# asks, for every place we could stop this turn, where each possible roll of
+# our engine would let us get to next turn, and so on.
+#
+# Moves are limited to the candidate routes from the greedy planner's search,
+# merged into a DAG on (point, railroad, used rail segments) so that routes
+# sharing a prefix share nodes. Each turn costs TURN_VALUE on top of its fees,
+# which is how arriving sooner is traded off against paying less. Past the
+# lookahead horizon, the rest of the trip is estimated from the remaining hops
+# and the fees along the cheapest remaining route.
+
+TURN_VALUE = 4000           # About what a turn is worth in payoffs
+MAX_LOOKAHEAD_TURNS = 3
+EXPECTIMAX_FLEX = 2         # Extra hops over the shortest route to consider
+EXPECTIMAX_MAX_ROUTES = 50  # Candidate routes merged into the DAG
+HOP_SLACK = 3               # Ignore stops this much further from the destination than the closest
+
+# Exact distribution of the distance moved in a turn for each engine
+def roll_distribution(e: Engine) -> Dict[int, float]:
+    probs: Dict[int, float] = {}
+    for d1 in range(1, 7):
+        for d2 in range(1, 7):
+            for d3 in range(1, 7):
+                d = d1 + d2
+                if (d1 == d2 and e == Engine.Express) or e == Engine.Superchief:
+                    d += d3
+                probs[d] = probs.get(d, 0.0) + 1 / 216
+    return probs
+
+# Expected number of turns to cover h hops, moving the full roll every turn
+def expected_turns(e: Engine, max_hops: int) -> List[float]:
+    probs = roll_distribution(e)
+    turns = [0.0] * (max_hops + 1)
+    for h in range(1, max_hops + 1):
+        turns[h] = 1 + sum(p * turns[max(0, h - r)] for r, p in probs.items())
+    return turns
+
+@dataclass
+class _Node:
+    pt: int
+    rr: Optional[str]
+    seg_hash: int
+    children: Dict[Waypoint, '_Node'] = field(default_factory=dict)
+    tails: List[Tuple[Waypoint, ...]] = field(default_factory=list)
+    rem_hops: int = 0
+
+# A place we can stop at the end of a turn
+@dataclass
+class _Stop:
+    node: _Node
+    fees: int
+    est: Optional[int]
+    moves: Tuple[Waypoint, ...]
+
+class _OutOfTime(Exception):
+    pass
+
+class ExpectimaxPlanner:
+    def __init__(self, s: GameState, player_i: int, dest_pt: int,
+            routes: List[List[Waypoint]], used_rail_segs: List[RailSegment],
+            start_rr: Optional[str], time_budget: float | None = None):
+        ps = s.players[player_i]
+        self.dest_pt = dest_pt
+        self.engine = ps.engine
+        self.fees = FeeModel(player_i, [p.rr_owned for p in s.players],
+            s.doubleFees, s.config)
+        self.rolls = list(roll_distribution(ps.engine).items())
+        self.turn_len = expected_roll(ps.engine)
+        self.deadline = time() + time_budget if time_budget is not None else None
+        self.n_evals = 0
+
+        # Merge the routes into a DAG keyed by (point, railroad, used segments)
+        self._nodes: Dict[Tuple[int, Optional[str], int], _Node] = {}
+        start_hash = 0
+        for rs in used_rail_segs:
+            start_hash ^= hash(rs)
+        self.root = self._node(ps.location, start_rr, start_hash)
+        max_hops = 0
+        for path in routes:
+            node = self.root
+            for i, (rr, pt) in enumerate(path):
+                node.tails.append(tuple(path[i:]))
+                if (rr, pt) not in node.children:
+                    seg_hash = node.seg_hash ^ hash(make_rail_seg(rr, node.pt, pt))
+                    node.children[(rr, pt)] = self._node(pt, rr, seg_hash)
+                node = node.children[(rr, pt)]
+            max_hops = max(max_hops, len(path))
+        for node in self._nodes.values():
+            node.rem_hops = min((len(t) for t in node.tails), default=0)
+        self.turns = expected_turns(ps.engine, max_hops)
+        self._values: Dict[Tuple[Tuple[int, Optional[str], int], Optional[int], int], float] = {}
+        self._leaves: Dict[Tuple[Tuple[int, Optional[str], int], Optional[int]], float] = {}
+
+    def _node(self, pt: int, rr: Optional[str], seg_hash: int) -> _Node:
+        key = (pt, rr, seg_hash)
+        if key not in self._nodes:
+            self._nodes[key] = _Node(pt, rr, seg_hash)
+        return self._nodes[key]
+
+    @staticmethod
+    def _key(node: _Node) -> Tuple[int, Optional[str], int]:
+        return (node.pt, node.rr, node.seg_hash)
+
+    # Every place we can stop after moving d hops (or reaching the
+    # destination) from node, with the cheapest fees to get there
+    def stops(self, node: _Node, d: int, turn: TurnState) -> List[_Stop]:
+        best: Dict[Tuple[Tuple[int, Optional[str], int], Optional[int]], _Stop] = {}
+        def visit(n: _Node, hops: int, t: TurnState, fees: int, moves: Tuple[Waypoint, ...]):
+            if hops == d or n.pt == self.dest_pt:
+                key = (self._key(n), t[2])
+                if key not in best or fees < best[key].fees:
+                    best[key] = _Stop(n, fees, t[2], moves)
+                return
+            for (rr, pt), child in n.children.items():
+                t2, fee = self.fees.hop(t, n.rr, rr)
+                visit(child, hops + 1, t2, fees + fee, moves + ((rr, pt),))
+        visit(node, 0, turn, 0, ())
+        return list(best.values())
+
+    # Estimated cost of the rest of the trip from node along its cheapest tail
+    def leaf(self, node: _Node, est: Optional[int]) -> float:
+        key = (self._key(node), est)
+        if key not in self._leaves:
+            best = float('inf')
+            for tail in node.tails:
+                turn = self.fees.start_turn(node.rr, est)
+                prev_rr, fees = node.rr, 0
+                for i, (rr, _) in enumerate(tail):
+                    if i > 0 and i % self.turn_len == 0:
+                        turn = self.fees.start_turn(prev_rr, turn[2])
+                    turn, fee = self.fees.hop(turn, prev_rr, rr)
+                    fees += fee
+                    prev_rr = rr
+                best = min(best, fees + TURN_VALUE * self.turns[len(tail)])
+            self._leaves[key] = best if node.tails else 0.0
+        return self._leaves[key]
+
+    # Lower bound on the cost of finishing the trip from a stop
+    def _bound(self, stop: _Stop) -> float:
+        return stop.fees + TURN_VALUE * (1 + self.turns[stop.node.rem_hops])
+
+    def _best_stop(self, stops: List[_Stop], k: int) -> Tuple[float, Optional[_Stop]]:
+        if not stops:
+            return float('inf'), None
+        closest = min(s.node.rem_hops for s in stops)
+        best_cost, best_stop = float('inf'), None
+        for stop in sorted(stops, key=self._bound):
+            if stop.node.rem_hops > closest + HOP_SLACK:
+                continue
+            if self._bound(stop) >= best_cost:
+                break # Stops are sorted by bound, so none of the rest can win
+            cost = stop.fees + TURN_VALUE + self.value(stop.node, stop.est, k)
+            if cost < best_cost:
+                best_cost, best_stop = cost, stop
+        return best_cost, best_stop
+
+    # Expected cost of the rest of the trip from node, looking k turns ahead
+    def value(self, node: _Node, est: Optional[int], k: int) -> float:
+        if node.pt == self.dest_pt:
+            return 0.0
+        if k == 0:
+            return self.leaf(node, est)
+        key = (self._key(node), est, k)
+        if key not in self._values:
+            if self.deadline is not None and time() > self.deadline:
+                raise _OutOfTime()
+            self.n_evals += 1
+            turn = self.fees.start_turn(node.rr, est)
+            total = 0.0
+            for d, p in self.rolls:
+                cost, _ = self._best_stop(self.stops(node, d, turn), k - 1)
+                total += p * cost
+            self._values[key] = total
+        return self._values[key]
+
+    # Best moves for a known roll d, looking up to max_turns turns past this one;
+    # the lookahead is deepened one turn at a time until time runs out
+    def plan(self, d: int, turn: TurnState, max_turns: int = MAX_LOOKAHEAD_TURNS) \
+            -> Tuple[List[Waypoint], int]:
+        stops = self.stops(self.root, d, turn)
+        assert len(stops) > 0, "Must have somewhere to stop"
+        best_stop = min(stops, key=lambda s: (s.node.rem_hops, s.fees))
+        depth = -1
+        for k in range(max_turns + 1):
+            try:
+                _, stop = self._best_stop(stops, k)
+            except _OutOfTime:
+                break
+            if stop is not None:
+                best_stop, depth = stop, k
+        return list(best_stop.moves), depth
@@ -1,8 +1,70 @@
 from pyrailbaron.map.datamodel import Map
 from pyrailbaron.map.datamodel import Waypoint
+from pyrailbaron.map.summary import get_rr_ids, summarize_path
 from pyrailbaron.game.constants import *
+from pyrailbaron.game.config import GameConfig, DEFAULT_CONFIG
 
-from typing import List, Tuple
+from dataclasses import dataclass
+from typing import List, Tuple, Iterator
+
+# The user fee rules, one railroad at a time. Every fee calculation (whole
+# turns, compiled path slices and the planner's hop-by-hop search) goes
+# through fee_hop. A turn's fee state is (still on the initial RR, rate
+# established before the turn, new established rate, bitmask of who has to
+# be paid: bit 0 = bank, bit i + 1 = player i). Taking the same RR again is
+# a no-op, so a run of hops on one RR only needs one step.
+TurnFees = Tuple[bool, int | None, int | None, int]
+
+def start_turn_fees(has_init_rr: bool, established_rate: int | None) -> TurnFees:
+    return (has_init_rr, established_rate, established_rate, 0)
+
+# on_init_rr = whether rr is the RR the player started the turn on
+# owner_i = owner of rr (-1 = bank)
+def fee_hop(turn: TurnFees, on_init_rr: bool, owner_i: int, player_i: int,
+        cfg: GameConfig = DEFAULT_CONFIG) -> TurnFees:
+    on_first, est_in, new_est, charged = turn
+    if not on_init_rr:
+        # As soon as we leave the RR we were on, the established rate no
+        # longer applies
+        on_first = False
+    elif on_first:
+        if est_in == 0 or owner_i == player_i:
+            return turn # No charge if we started free or own it now
+        elif est_in == cfg.bank_user_fee:
+            # If we established at the bank rate and we don't own it, we
+            # pay the bank rate regardless
+            return (on_first, est_in, new_est, charged | 1)
+
+    if not on_first:
+        # Update established rate
+        new_est = (0 if owner_i == player_i
+            else (cfg.bank_user_fee if owner_i == -1 else cfg.other_user_fee))
+    if owner_i == -1:
+        charged |= 1
+    elif owner_i != player_i:
+        charged |= 1 << (owner_i + 1)
+    return (on_first, est_in, new_est, charged)
+
+# Total the moving player pays to everyone in the charged bitmask
+def charged_fee(charged: int, doubleFees: bool,
+        cfg: GameConfig = DEFAULT_CONFIG) -> int:
+    return ((charged & 1) * cfg.bank_user_fee + (charged >> 1).bit_count()
+        * cfg.other_user_fee * (2 if doubleFees else 1))
+
+# bank_deltas[0..n] for a finished turn's fee state
+def turn_fee_deltas(turn: TurnFees, player_i: int, n_players: int,
+        doubleFees: bool, cfg: GameConfig = DEFAULT_CONFIG) -> List[int]:
+    charged = turn[3]
+    bank_deltas = [0] * n_players
+    other_fee = cfg.other_user_fee * (2 if doubleFees else 1)
+    for charge_i in range(n_players):
+        if (charged >> (charge_i + 1)) & 1:
+            assert charge_i != player_i, "Can't charge self user fees"
+            bank_deltas[player_i] -= other_fee
+            bank_deltas[charge_i] += other_fee
+    if charged & 1:
+        bank_deltas[player_i] -= cfg.bank_user_fee
+    return bank_deltas
 
 # After all moves are completed on a player's turn, calculate the total charges
 # to the bank and/or other players for rails used
@@ -11,53 +73,69 @@ from typing import List, Tuple
 def calculate_user_fees(m: Map, player_i: int,
         waypoints: List[Waypoint], player_rr: List[List[str]],
         init_rr: str | None, established_rate: int | None = None,
-        doubleFees: bool = False) -> Tuple[List[int], int | None]:
+        doubleFees: bool = False,
+        cfg: GameConfig = DEFAULT_CONFIG) -> Tuple[List[int], int | None]:
     if len(waypoints) == 0:
         return [0] * len(player_rr), established_rate
-    def get_owner(rr: str) -> int:
-        for i, rr_owned in enumerate(player_rr):
-            if rr in rr_owned:
-                return i
-        return -1
-
-    # Determine who we have to pay charges to
-    bank_charge = False
-    player_charges = [False] * len(player_rr)
-    on_first_rr = init_rr is not None
-    new_established_rate = established_rate
+    owners = dict((rr, i) for i, rr_owned in enumerate(player_rr) for rr in rr_owned)
+    turn = start_turn_fees(init_rr is not None, established_rate)
     for rr, _ in waypoints:
-        if rr != init_rr:
-            # As soon as we leave the RR we were on, the established rate no
-            # longer applies
-            on_first_rr = False
-        elif on_first_rr:
-            if established_rate == 0 or rr in player_rr[player_i]:
-                continue # No charge if we started free or own it now
-            elif established_rate == BANK_USER_FEE:
-                # If we established at the bank rate and we don't own it, we
-                # pay the bank rate regardless
-                bank_charge = True
-                continue
-        
-        owner_i = get_owner(rr)
-        if not on_first_rr:
-            # Update established rate
-            new_established_rate = (
-                0 if owner_i == player_i 
-                else (BANK_USER_FEE if owner_i == -1 
-                else OTHER_USER_FEE))
-        if owner_i == -1:
-            bank_charge = True
-        elif owner_i != player_i:
-            player_charges[owner_i] = True
-
-    # Calculate total transaction amounts; this will trigger selling as needed
-    bank_deltas = [0] * len(player_rr)
-    for charge_i, do_charge in enumerate(player_charges):
-        if do_charge:
-            assert charge_i != player_i, "Can't charge self user fees"
-            bank_deltas[player_i] -= OTHER_USER_FEE * (2 if doubleFees else 1)
-            bank_deltas[charge_i] += OTHER_USER_FEE * (2 if doubleFees else 1)
-    if bank_charge:
-        bank_deltas[player_i] -= BANK_USER_FEE
-    return bank_deltas, new_established_rate
\ No newline at end of file
+        turn = fee_hop(turn, rr == init_rr, owners.get(rr, -1), player_i, cfg)
+    return turn_fee_deltas(turn, player_i, len(player_rr), doubleFees, cfg), turn[2]
+
+# The AI prices the same paths over and over with different slices (e.g. one
+# per simulated turn), so paths are compiled into runs of hops on the same RR.
+# Every hop in a run is charged the same way, so fees for any slice only need
+# one step per run.
+@dataclass(frozen=True)
+class CompiledPath:
+    run_rrs: Tuple[int, ...]    # RR id of each run
+    hop_runs: Tuple[int, ...]   # Index of the run containing each hop
+
+    def __len__(self) -> int:
+        return len(self.hop_runs)
+
+    def rr_at(self, hop_i: int) -> int:
+        return self.run_rrs[self.hop_runs[hop_i]]
+
+    # RR ids of the runs overlapping path[a:b]
+    def runs(self, a: int, b: int) -> Iterator[int]:
+        b = min(b, len(self.hop_runs))
+        if a >= b:
+            return iter(())
+        return iter(self.run_rrs[self.hop_runs[a]:self.hop_runs[b - 1] + 1])
+
+def compile_path(m: Map, path: List[Waypoint]) -> CompiledPath:
+    run_rrs: List[int] = []
+    hop_runs: List[int] = []
+    for rr_id, n in summarize_path(m, path).runs:
+        hop_runs += [len(run_rrs)] * n
+        run_rrs.append(rr_id)
+    return CompiledPath(tuple(run_rrs), tuple(hop_runs))
+
+# RR id of rr, or -1 for no RR
+def get_rr_id(m: Map, rr: str | None) -> int:
+    return get_rr_ids(m)[rr] if rr is not None else -1
+
+# Owner of each RR id (-1 = bank)
+def get_owners(m: Map, player_rr: List[List[str]]) -> List[int]:
+    ids = get_rr_ids(m)
+    owners = [-1] * len(ids)
+    for i, rr_owned in enumerate(player_rr):
+        for rr in rr_owned:
+            owners[ids[rr]] = i
+    return owners
+
+# Same as calculate_user_fees for the waypoints path[a:b] of a compiled path
+# init_rr_id = RR id the player was on at the start of the turn (-1 = none)
+def calculate_slice_fees(cp: CompiledPath, a: int, b: int, player_i: int,
+        owners: List[int], n_players: int, init_rr_id: int,
+        established_rate: int | None = None,
+        doubleFees: bool = False,
+        cfg: GameConfig = DEFAULT_CONFIG) -> Tuple[List[int], int | None]:
+    if a >= min(b, len(cp)):
+        return [0] * n_players, established_rate
+    turn = start_turn_fees(init_rr_id >= 0, established_rate)
+    for rr_id in cp.runs(a, b):
+        turn = fee_hop(turn, rr_id == init_rr_id, owners[rr_id], player_i, cfg)
+    return turn_fee_deltas(turn, player_i, n_players, doubleFees, cfg), turn[2]
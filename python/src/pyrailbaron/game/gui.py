@@ -3,6 +3,7 @@ from pyrailbaron.game.screens.move import MoveScreen
 from pyrailbaron.game.state import GameState
 from pyrailbaron.game.interface import Interface
 from pyrailbaron.game.logic import run_game
+from pyrailbaron.game.winprob import WinProbabilityService
 from pyrailbaron.teensy.serial import Serial
 
 import pygame as pg
@@ -23,17 +24,22 @@ SPLASH_SCREEN_TIME: float = 5.0
 BUTTON_MARGIN: int = 40
 
 class PyGame_Interface(Interface):
-    def __init__(self):
+    # win_probability = run rollouts for live win chances during each game
+    def __init__(self, win_probability: bool = False):
         super().__init__()
         pg.init()
         self.screen = pg.display.set_mode(SCREENRECT.size)
         self.n_cpu_players: int = 0
+        self.win_probability = win_probability
+        self.win_prob: WinProbabilityService | None = None
 
     def display_splash(self):
         SplashScreen(self.screen).run()
 
     def run_game(self, n_players: int):
         assert n_players > 1, "Must have at least two players"
+        if self.win_probability:
+            self.win_prob = WinProbabilityService()
         run_game(n_players, self)
 
     def get_player_name(self) -> str:
@@ -61,7 +67,9 @@ class PyGame_Interface(Interface):
 
     def announce_turn(self, s: GameState, player_i: int):
         Serial.set_active_player(player_i, len(s.players))
-        AnnounceTurnScreen(self.screen, s, player_i).run()
+        if self.win_prob:
+            self.win_prob.update(s, player_i)
+        AnnounceTurnScreen(self.screen, s, player_i, self.win_prob).run()
 
     def get_destination(self, s: GameState, player_i: int) -> str:
         ps = s.players[player_i]
@@ -150,7 +158,7 @@ class PyGame_Interface(Interface):
         if ps.bank < min_bid:
             return 0
         rr_name = s.map.railroads[rr_to_sell].shortName
-        return AuctionScreen(self.screen, ps.name, rr_name, min_bid, ps.bank).run().bid
+        return AuctionScreen(self.screen, s, ps.name, rr_name, min_bid, ps.bank).run().bid
 
     def announce_sale(self, s: GameState, seller_i: int, buyer_i: int, rr: str, price: int):
         seller_n = s.players[seller_i].name
@@ -174,18 +182,21 @@ class PyGame_Interface(Interface):
 
     def ask_to_declare(self, s: GameState, player_i: int) -> bool:
         ps = s.players[player_i]
-        return DeclareScreen(self.screen, ps.name, ps.displayHomeCity).run().declare
+        return DeclareScreen(self.screen, s, ps.name, ps.displayHomeCity).run().declare
 
     def announce_undeclared(self, s: GameState, player_i: int):
         AnnounceUndeclaredScreen(self.screen, s.players[player_i].name).run()
     
     def announce_rover_play(self, s: GameState, decl_player_i: int, rover_player_i: int):
-        AnnounceRoverScreen(self.screen,
+        AnnounceRoverScreen(self.screen, s,
             s.players[decl_player_i].name,
             s.players[rover_player_i].name,
             s.map.points[s.players[decl_player_i].location].display_name).run()
 
     def show_winner(self, s: GameState, winner_i: int):
+        if self.win_prob:
+            self.win_prob.shutdown()
+            self.win_prob = None
         AnnounceWinnerScreen(self.screen, s.players[winner_i].name).run()
         
     def run(self):
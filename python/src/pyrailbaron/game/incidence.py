@@ -0,0 +1,109 @@
+from pyrailbaron.game.state import GameState
+from pyrailbaron.game.sampling import get_destination_sampler
+from pyrailbaron.map.datamodel import derived_data
+from pyrailbaron.map.routes import get_route_store
+from pyrailbaron.map.summary import get_rr_ids, rr_mask
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Which railroads serve which points, and which railroads the likely trips
+# use, as sparse index arrays. Railroad valuations that used to loop over
+# every point for every option are reductions over these arrays, computed once
+# per ownership "epoch" (i.e. until someone buys or sells a railroad).
+
+MAX_CACHED_EPOCHS = 64
+
+class RailroadIncidence:
+    def __init__(self, s: GameState):
+        self.state = s
+        self.rr_ids = get_rr_ids(s.map)
+        self.n_rr = len(self.rr_ids)
+
+        # Railroad bitmask of each point
+        self.pt_masks = np.array([rr_mask(s.map, p.connections.keys())
+            for p in s.map.points], dtype=np.int64)
+
+        # Railroad x point incidence in CSR form: the points served by railroad
+        # r are pt_indices[pt_indptr[r]:pt_indptr[r+1]]
+        rr_pts: List[List[int]] = [[] for _ in range(self.n_rr)]
+        for p in s.map.points:
+            for rr in p.connections:
+                rr_pts[self.rr_ids[rr]].append(p.index)
+        self.pt_indptr = np.cumsum([0] + [len(pts) for pts in rr_pts]).astype(np.int64)
+        self.pt_indices = np.array([pt for pts in rr_pts for pt in pts], dtype=np.int64)
+        self._pt_rows = np.repeat(np.arange(self.n_rr, dtype=np.int64),
+            np.diff(self.pt_indptr))
+
+        self._trip_shares: Dict[int, np.ndarray] = {}
+        self._epochs: Dict[Tuple[int, Tuple[int, ...]], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def rr_points(self, rr: str) -> np.ndarray:
+        r = self.rr_ids[rr]
+        return self.pt_indices[self.pt_indptr[r]:self.pt_indptr[r + 1]]
+
+    def _sum_rows(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self._pt_rows, weights=values,
+            minlength=self.n_rr).astype(np.int64)
+
+    # For each railroad, the number of its points player_i would newly reach
+    # ("free" points) and the number of (point, opponent) pairs player_i
+    # would lock out by buying it. A point locks out an opponent when every
+    # other railroad there is owned by some other player and none of them by
+    # that opponent.
+    def point_scores(self, player_i: int, player_rr: List[List[str]]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        owned = tuple(rr_mask(self.state.map, rrs) for rrs in player_rr)
+        key = (player_i, owned)
+        if key not in self._epochs:
+            if len(self._epochs) >= MAX_CACHED_EPOCHS:
+                self._epochs.clear()
+            self._epochs[key] = self._point_scores(player_i, owned)
+        return self._epochs[key]
+
+    def _point_scores(self, player_i: int, owned: Tuple[int, ...]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        masks = self.pt_masks
+        others = 0
+        n_locked_players = np.zeros(len(masks), dtype=np.int64)
+        for j, mask in enumerate(owned):
+            if j != player_i:
+                others |= mask
+                n_locked_players += (masks & mask) == 0
+        free = (masks & owned[player_i]) == 0
+        n_free = self._sum_rows(free[self.pt_indices])
+
+        not_others = masks & ~others
+        rr_bits = np.left_shift(1, self._pt_rows)
+        locks = (not_others[self.pt_indices] & ~rr_bits) == 0
+        n_locked = self._sum_rows(locks * n_locked_players[self.pt_indices])
+        return n_free, n_locked
+
+    # Share of likely trips from start_pt that use each railroad, weighting
+    # each destination by its roll probability and each catalogued route to it
+    # equally
+    def trip_shares(self, start_pt: int) -> np.ndarray:
+        if start_pt not in self._trip_shares:
+            self._trip_shares[start_pt] = self._build_trip_shares(start_pt)
+        return self._trip_shares[start_pt]
+
+    def _build_trip_shares(self, start_pt: int) -> np.ndarray:
+        s = self.state
+        store = get_route_store(s.map)
+        sampler = get_destination_sampler(s)
+        dest_pts, dest_probs = sampler.dest_distribution(
+            s.map.points[start_pt].region)
+        bits = np.arange(self.n_rr, dtype=np.int64)
+        shares = np.zeros(self.n_rr, dtype=np.float64)
+        # Route x railroad incidence, one block of routes per destination
+        for dest_pt, p in zip(dest_pts.tolist(), dest_probs.tolist()):
+            paths = store.paths_between(start_pt, dest_pt)
+            if not paths:
+                continue
+            route_masks = np.array([rr_mask(s.map, set(rr for rr, _ in path))
+                for path in paths], dtype=np.int64)
+            uses = (route_masks[:, None] >> bits[None, :]) & 1
+            shares += p * uses.mean(axis=0)
+        return shares
+
+def get_rr_incidence(s: GameState) -> RailroadIncidence:
+    return derived_data(s.map, 'rr_incidence', lambda: RailroadIncidence(s))
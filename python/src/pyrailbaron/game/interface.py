@@ -93,7 +93,8 @@ class Interface(ABC):
     def ask_to_declare(self, s: GameState, player_i: int) -> bool:
         pass
 
-    # Announce that a declared player has falled below MIN_CASH_TO_WIN
+    # Announce that a declared player has falled below the cash to win
+    # (config.min_cash_to_win)
     @abstractmethod
     def announce_undeclared(self, s: GameState, player_i: int):
         pass
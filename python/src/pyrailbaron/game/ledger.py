@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from dataclasses_json import dataclass_json
+
+from typing import AbstractSet, Dict, List
+from enum import Enum
+
+# Why money changed hands
+class Reason(Enum):
+    InitialBank = 0
+    RoutePayoff = 1
+    UserFee = 2
+    RoverPlay = 3
+    Purchase = 4
+    SaleToBank = 5
+    Auction = 6
+    BankCover = 7 # The bank pays whatever a player couldn't raise
+
+@dataclass_json
+@dataclass
+class Transaction:
+    player: int
+    amount: int # Positive = credit, negative = debit
+    reason: Reason
+    batch: int  # Which commit settled (or will settle) this transaction
+
+# Running credit/debit totals by reason for one player, for the whole game and
+# the current trip. These include transactions that haven't been committed yet,
+# so e.g. a trip's fees are known before its payoff is paid.
+@dataclass_json
+@dataclass
+class Account:
+    credits: Dict[str, int] = field(default_factory=dict)
+    debits: Dict[str, int] = field(default_factory=dict)
+    trip_credits: Dict[str, int] = field(default_factory=dict)
+    trip_debits: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, tx: Transaction):
+        r = tx.reason.name
+        if tx.amount >= 0:
+            self.credits[r] = self.credits.get(r, 0) + tx.amount
+            self.trip_credits[r] = self.trip_credits.get(r, 0) + tx.amount
+        else:
+            self.debits[r] = self.debits.get(r, 0) - tx.amount
+            self.trip_debits[r] = self.trip_debits.get(r, 0) - tx.amount
+
+    def start_trip(self):
+        self.trip_credits.clear()
+        self.trip_debits.clear()
+
+    def credited(self, reason: Reason, trip: bool = False) -> int:
+        return (self.trip_credits if trip else self.credits).get(reason.name, 0)
+
+    def debited(self, reason: Reason, trip: bool = False) -> int:
+        return (self.trip_debits if trip else self.debits).get(reason.name, 0)
+
+# Transactions posted but not yet settled. Transactions are posted as they
+# happen and settled in batches by logic.commit_transactions, which is the
+# only place bank balances change (and the UI/hardware gets updated). Settled
+# transactions are dropped; their totals live on in each player's Account.
+# A commit can hold back transactions for some reasons (e.g. a turn's user
+# fees, which are known before the payoff but paid after the purchase).
+@dataclass_json
+@dataclass
+class Ledger:
+    pending: List[Transaction] = field(default_factory=list)
+    batch: int = 0
+
+    def post(self, player_i: int, amount: int, reason: Reason) -> Transaction:
+        tx = Transaction(player_i, amount, reason, self.batch)
+        self.pending.append(tx)
+        return tx
+
+    # Pending transactions that aren't held back
+    def settling(self, held: AbstractSet[Reason] = frozenset()) -> List[Transaction]:
+        return [tx for tx in self.pending if tx.reason not in held]
+
+    # Net of everything pending (and not held back) for player_i
+    def pending_net(self, player_i: int, held: AbstractSet[Reason] = frozenset()) -> int:
+        return sum(tx.amount for tx in self.settling(held) if tx.player == player_i)
+
+    # Close the current batch, returning each player's net change; held
+    # transactions stay pending and move to the next batch
+    def commit(self, n_players: int, held: AbstractSet[Reason] = frozenset()) -> List[int]:
+        deltas = [0] * n_players
+        for tx in self.settling(held):
+            deltas[tx.player] += tx.amount
+        self.batch += 1
+        self.pending = [Transaction(tx.player, tx.amount, tx.reason, self.batch)
+            for tx in self.pending if tx.reason in held]
+        return deltas
@@ -5,13 +5,16 @@ from pyrailbaron.game.interface import Interface
 from pyrailbaron.game.state import Engine, GameState, PlayerState, Waypoint
 from pyrailbaron.game.constants import *
 from pyrailbaron.game.fees import calculate_user_fees
-from typing import List
+from pyrailbaron.game.ledger import Reason
+from typing import AbstractSet, Dict, List
 from random import shuffle
 
-# Basic game loop, will run to completion unless error
-def run_game(n_players: int, i: Interface):
+# Basic game loop, will run to completion unless error. Pass a finished game
+# as static to reuse its map, charts (and everything derived from them) and
+# config.
+def run_game(n_players: int, i: Interface, static: GameState | None = None):
     # Setup the initial game state
-    s = init_game(i, n_players)
+    s = init_game(i, n_players, static)
     
     # Player index 0,1,2...n,0,1,2,... etc
     # Each loop is one player's turn, the loop only breaks when player_i wins
@@ -62,8 +65,10 @@ def run_game(n_players: int, i: Interface):
     i.show_winner(s, player_i)
 
 # Initialize the game state for all players
-def init_game(i: Interface, n_players: int) -> GameState:
-    s = GameState()
+def init_game(i: Interface, n_players: int, static: GameState | None = None) -> GameState:
+    s = GameState() if static is None else GameState(
+        map=static.map, route_payoffs=static.route_payoffs,
+        roll_tables=static.roll_tables, config=static.config)
 
     player_names = [i.get_player_name() for _ in range(n_players)]
     shuffle(player_names)
@@ -76,8 +81,10 @@ def init_game(i: Interface, n_players: int) -> GameState:
         s.players.append(p)
     i.announce_player_order(s)
 
-    # Deposit initial 20k
-    update_balances(s, i, [INITIAL_BANK] * n_players)
+    # Deposit initial bank (20k in the standard rules)
+    for player_i in range(n_players):
+        post(s, player_i, s.config.initial_bank, Reason.InitialBank)
+    commit_transactions(s, i)
 
     # Roll for home city for each player
     for player_i in range(n_players):
@@ -85,29 +92,50 @@ def init_game(i: Interface, n_players: int) -> GameState:
 
     return s
 
-# Any time we need to update balances we call this method
-def update_balances(s: GameState, i: Interface, bank_deltas: List[int],
-        allow_selling: bool = False):
-    # First check if any player will go negative, then sell/auction as needed
-    for player_i, delta in enumerate(bank_deltas):
-        new_balance = s.players[player_i].bank + delta
-        if new_balance < 0:
+# Record a credit/debit in the ledger; it only reaches the bank balance when
+# the batch it is in is committed
+def post(s: GameState, player_i: int, amount: int, reason: Reason):
+    if amount != 0:
+        tx = s.ledger.post(player_i, amount, reason)
+        s.players[player_i].account.record(tx)
+
+# A turn's user fees are posted as soon as the moves are done (so the trip
+# totals include them) but are paid after the payoff and purchase
+TURN_FEES = frozenset([Reason.UserFee])
+
+# Settle all transactions posted since the last commit in one go, except
+# those held back. Called at the points where a player needs to see their
+# actual balance (after a payoff, before the purchase decision) and at the
+# end of each move, so the displayed banks only get updated once per batch.
+def commit_transactions(s: GameState, i: Interface, allow_selling: bool = False,
+        held: AbstractSet[Reason] = frozenset()):
+    if len(s.ledger.settling(held)) == 0:
+        return
+
+    # First check if any player's net position is negative, then sell/auction
+    # as needed; proceeds are posted to this same batch
+    for player_i, ps in enumerate(s.players):
+        shortfall = -(ps.bank + s.ledger.pending_net(player_i, held))
+        if shortfall > 0:
             assert allow_selling, "Can only sell where explicitly allowed"
-            raise_funds(s, i, player_i, -new_balance)
+            raise_funds(s, i, player_i, shortfall)
+
+    # It's theoretically possible for a player to sell all their RRs during
+    # raise_funds and still not have enough balance to pay all fees - in this
+    # case, the bank pays them (i.e. positive deltas are unaffected)
+    for player_i, ps in enumerate(s.players):
+        shortfall = -(ps.bank + s.ledger.pending_net(player_i, held))
+        if shortfall > 0:
+            post(s, player_i, shortfall, Reason.BankCover)
 
     # Update bank balances and display
-    for player_i, delta in enumerate(bank_deltas):
-        # Note that we floor negative balances at zero; its theoretically
-        # possible for a player to sell all their RRs during raise_funds
-        # and still not have enough balance to pay all fees - in this case,
-        # the bank pays them (i.e. positive deltas are unaffected)
-        ps = s.players[player_i]
-        ps.bank = max(0, ps.bank + delta)
+    for ps, delta in zip(s.players, s.ledger.commit(len(s.players), held)):
+        ps.bank += delta
     i.update_bank_amts(s)
 
     # If a declared player falls below 200k they immediately become undeclared
     for ps in s.players:
-        if ps.declared and ps.bank <= MIN_CASH_TO_WIN:
+        if ps.declared and ps.bank <= s.config.min_cash_to_win:
             ps.declared = False
             i.announce_undeclared(s, ps.index)
             check_destination(s, i, ps.index)
@@ -145,29 +173,27 @@ def do_move(s: GameState, i: Interface, player_i: int, d: int, init_rr: str | No
                 winner=False, rover_play_index=len(other_ps.history) - 1)
 
             other_ps.declared = False
-            bank_deltas = [0] * len(s.players)
-            bank_deltas[player_j] = -ROVER_PLAY_FEE
-            bank_deltas[player_i] = ROVER_PLAY_FEE
-            update_balances(s, i, bank_deltas)
+            post(s, player_j, -s.config.rover_play_fee, Reason.RoverPlay)
+            post(s, player_i, s.config.rover_play_fee, Reason.RoverPlay)
 
             i.announce_rover_play(s, player_j, player_i)
 
     bank_deltas = [0] * len(s.players)
     if is_last_move:
         # We need to pay user fees AFTER payoff/purchase, but we'd like to know
-        # what they will be when we do make a purchase decision. So, we calculate
-        # and store and eventually pass the user fee to i.get_purchase
+        # what they will be when we do make a purchase decision. So, we post
+        # them now, hold them back from the payoff and purchase commits and
+        # pass the user fee to i.get_purchase
         history = [] if moves_so_far <= 0 else s.players[player_i].history[-moves_so_far:]
         bank_deltas = calc_turn_user_fees(s, player_i, history + waypoints, init_rr)
-        for ps in s.players:
-            ps.record_user_fees(bank_deltas)
+        for player_j, fee in enumerate(bank_deltas):
+            post(s, player_j, fee, Reason.UserFee)
 
     # Check if player_i has reached destination for payoff/purchasing
     check_arrival(s, i, player_i, bank_deltas[player_i])
 
-    if is_last_move:
-        # Do user fee transaction
-        update_balances(s, i, bank_deltas, allow_selling=True)
+    # Settle the fees and rover plays for this move
+    commit_transactions(s, i, allow_selling=True)
 
     return waypoints
 
@@ -195,9 +221,7 @@ def raise_funds(s: GameState, i: Interface, player_i: int, min_amt: int):
         if sell_to_bank:
             i.announce_sale_to_bank(s, player_i, rr_to_sell, min_sell_amt)
 
-            bank_deltas = [0] * len(s.players)
-            bank_deltas[player_i] = min_sell_amt
-            update_balances(s, i, bank_deltas)
+            post(s, player_i, min_sell_amt, Reason.SaleToBank)
 
             amt_raised += min_sell_amt
             s.players[player_i].rr_owned.remove(rr_to_sell)
@@ -219,10 +243,8 @@ def auction(s: GameState, i: Interface, seller_i: int, rr_to_sell: str, min_sell
             assert highest_bid >= min_sell_amt, "Cannot close bidding less than min"
             i.announce_sale(s, 
                         seller_i, highest_bidder, rr_to_sell, highest_bid)
-            bank_deltas = [0] * len(s.players)
-            bank_deltas[seller_i] = highest_bid
-            bank_deltas[highest_bidder] = -highest_bid
-            update_balances(s, i, bank_deltas)
+            post(s, seller_i, highest_bid, Reason.Auction)
+            post(s, highest_bidder, -highest_bid, Reason.Auction)
 
             s.players[seller_i].rr_owned.remove(rr_to_sell)
             s.players[highest_bidder].rr_owned.append(rr_to_sell)
@@ -231,7 +253,7 @@ def auction(s: GameState, i: Interface, seller_i: int, rr_to_sell: str, min_sell
 
         # Ask for a bid/pass (update if bid)
         min_bid = (min_sell_amt if highest_bid < 0  
-                    else highest_bid + MIN_BID_INCR)
+                    else highest_bid + s.config.min_bid_incr)
         bid = i.ask_for_bid(s, seller_i, bidder_i, rr_to_sell, min_bid)
         assert bid == 0 or bid >= min_bid, "Must pass or bid at least min"
         assert bid <= s.players[bidder_i].bank, "Can't bid more than bank"
@@ -254,9 +276,21 @@ def calc_turn_user_fees(s: GameState, player_i: int,
     player_rr = [p.rr_owned for p in s.players]
     bank_deltas, ps.established_rate = calculate_user_fees(
         s.map, player_i, waypoints, player_rr,
-        init_rr, ps.established_rate, s.doubleFees)
+        init_rr, ps.established_rate, s.doubleFees, s.config)
     return bank_deltas
 
+# Region to draw from instead when a player's destination region comes up as
+# the one they're already in
+REROLL_REGIONS: Dict[str, str] = {
+    'NORTHWEST': 'SOUTHEAST',
+    'SOUTHWEST':'NORTHEAST',
+    'PLAINS': 'SOUTHEAST',
+    'NORTH CENTRAL': 'SOUTHWEST',
+    'SOUTH CENTRAL': 'NORTHWEST',
+    'NORTHEAST': 'SOUTHWEST',
+    'SOUTHEAST': 'NORTHWEST'
+}
+
 def check_destination(s: GameState, i: Interface, player_i: int) -> None:
     ps = s.players[player_i]
     needs_destination = (ps.destination is None or (
@@ -281,12 +315,10 @@ def check_arrival(s: GameState, i: Interface, player_i: int, user_fee: int):
     assert ps.destination is not None, "Must know destination"
 
     # Calculate route payoff and distribute to player
-    payoff = s.route_payoffs[ps.startCity][ps.destination]
+    payoff = s.get_route_payoff(ps.startCity, ps.destination)
     i.announce_route_payoff(s, player_i, payoff)
-    ps.record_route_payoff(payoff)
-    bank_deltas = [0] * len(s.players)
-    bank_deltas[player_i] = payoff
-    update_balances(s, i, bank_deltas)
+    post(s, player_i, payoff, Reason.RoutePayoff)
+    commit_transactions(s, i, allow_selling=True, held=TURN_FEES)
 
     # Allow player to purchase an engine or railroad
     do_purchase(s, i, player_i, user_fee)
@@ -294,7 +326,7 @@ def check_arrival(s: GameState, i: Interface, player_i: int, user_fee: int):
 # Check if player_i meets the win condition
 def check_for_winner(s: GameState, i: Interface, player_i: int) -> bool:
     ps = s.players[player_i]
-    return ps.declared and ps.atHomeCity and ps.bank >= MIN_CASH_TO_WIN
+    return ps.declared and ps.atHomeCity and ps.bank >= s.config.min_cash_to_win
 
 # Purchase an engine or railroad after a payoff
 def do_purchase(s: GameState, i: Interface, player_i: int, user_fee: int):
@@ -306,19 +338,18 @@ def do_purchase(s: GameState, i: Interface, player_i: int, user_fee: int):
     # Validate purchase and perform cash transaction
     if purchase == Engine.Express.name :
         assert ps.engine == Engine.Basic, "Can only upgrade basic -> express"
-        purchase_amt = EXPRESS_FEE
+        purchase_amt = s.config.express_fee
     elif purchase == Engine.Superchief.name:
         assert ps.engine != Engine.Superchief, "Can't buy a superchief twice"
-        purchase_amt = SUPERCHIEF_FEE
+        purchase_amt = s.config.superchief_fee
     else:
         assert purchase in s.map.railroads, "Must buy an engine or a railroad"
         assert purchase not in ps.rr_owned, "Can't buy a railroad twice"
         assert s.get_owner(purchase) == -1, "Can only buy RR from the bank"
         purchase_amt = s.map.railroads[purchase].cost
     assert purchase_amt <= ps.bank, "Can't spend more than bank on purchase"
-    bank_deltas = [0] * len(s.players)
-    bank_deltas[player_i] -= purchase_amt
-    update_balances(s, i, bank_deltas)
+    post(s, player_i, -purchase_amt, Reason.Purchase)
+    commit_transactions(s, i, held=TURN_FEES)
 
     # Only apply the *results* of the purchase after the asserts :)
     if purchase == Engine.Express.name:
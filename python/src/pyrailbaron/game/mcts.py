@@ -0,0 +1,151 @@
+from pyrailbaron.game.rollout import (RolloutModel, RolloutState, CompactGame,
+    check_destination, finish_turn, play_out, worker_model, get_rollout_pool,
+    shutdown_rollout_pool, DEFAULT_ROLLOUT_WORKERS)
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from random import Random
+from math import sqrt, log
+from time import time
+
+# Monte Carlo search over one decision (a purchase, declaring, or selling a
+# railroad). Each candidate action is applied to a CompactGame and the game
+# is played out with fast rollouts (see rollout.py); UCB1 decides which
+# action gets the next batch of rollouts, so hopeless actions stop being
+# sampled early. Batches run on a pool of worker processes, and the calling
+# process runs small batches of its own while it waits, so a search always
+# makes progress even before the pool has started up.
+
+# Actions, as plain tuples so they can be sent to the workers:
+#   ('buy', option | None, fee)       purchase after a payoff, then pay fee
+#   ('declare', declare)              declare (or not) at the start of a turn
+#   ('sell', rr_id, buyer, price)     sell a RR (buyer -1 = bank)
+Action = Tuple
+
+UCB_C = 1.4
+ROLLOUT_BATCH = 32          # Rollouts per batch sent to a worker
+LOCAL_BATCH = 4             # Rollouts per batch run while waiting on workers
+
+# Apply an action for player_i, returning the next player to move, or the
+# winner (as -2 - winner) if the action ended the game
+def apply_action(st: RolloutState, player_i: int, action: Action, rng: Random) -> int:
+    kind = action[0]
+    next_i = (player_i + 1) % st.n
+    if kind == 'buy':
+        _, option, fee = action
+        st.buy(player_i, option)
+        st.bank[player_i] -= fee
+        st.raise_funds(player_i)
+        st.check_undeclared(player_i)
+    elif kind == 'declare':
+        if action[1]:
+            st.declare(player_i)
+        check_destination(st, player_i, rng, allow_declare=False)
+        if finish_turn(st, player_i, rng):
+            return -2 - player_i
+    elif kind == 'sell':
+        _, rr_id, buyer, price = action
+        if buyer < 0:
+            st.sell_to_bank(player_i, rr_id)
+        else:
+            st.owner[rr_id] = buyer
+            st.bank[buyer] -= price
+            st.bank[player_i] += price
+            st.check_undeclared(buyer)
+    else:
+        assert False, f"Unknown action {kind}"
+    return next_i
+
+# Number of rollouts (out of n) that player_i wins after taking action
+def run_rollouts(model: RolloutModel, game: CompactGame, player_i: int,
+        action: Action, n: int, seed: int) -> int:
+    rng = Random(seed)
+    wins = 0
+    for _ in range(n):
+        st = RolloutState(model, game)
+        next_i = apply_action(st, player_i, action, rng)
+        winner = -2 - next_i if next_i < -1 else play_out(st, next_i, rng)
+        wins += winner == player_i
+    return wins
+
+def _worker_rollouts(game: CompactGame, player_i: int, action: Action,
+        n: int, seed: int) -> int:
+    return run_rollouts(worker_model(), game, player_i, action, n, seed)
+
+@dataclass
+class MCTSResult:
+    actions: List[Action]
+    visits: List[int]
+    wins: List[int]
+    elapsed: float
+
+    @property
+    def win_rates(self) -> List[float]:
+        return [w / v if v > 0 else 0.0 for w, v in zip(self.wins, self.visits)]
+
+    @property
+    def total_visits(self) -> int:
+        return sum(self.visits)
+
+    # The most visited action (the usual robust choice), ties going to the
+    # higher win rate
+    @property
+    def best(self) -> Action:
+        k = max(range(len(self.actions)),
+            key=lambda k: (self.visits[k], self.win_rates[k]))
+        return self.actions[k]
+
+def search(model: RolloutModel, game: CompactGame, player_i: int,
+        actions: List[Action], time_budget: float,
+        n_workers: int = DEFAULT_ROLLOUT_WORKERS, seed: int | None = None) -> MCTSResult:
+    assert len(actions) > 0, "Need at least one action to search"
+    start = time()
+    deadline = start + time_budget
+    rng = Random(seed)
+    visits = [0] * len(actions)
+    wins = [0] * len(actions)
+    in_flight = [0] * len(actions)  # Rollouts submitted but not returned ("virtual losses")
+
+    def select() -> int:
+        total = sum(visits) + sum(in_flight) + 1
+        def ucb(k: int) -> float:
+            n = visits[k] + in_flight[k]
+            if n == 0:
+                return float('inf')
+            return wins[k] / n + UCB_C * sqrt(log(total) / n)
+        return max(range(len(actions)), key=ucb)
+
+    pool = get_rollout_pool() if n_workers > 0 else None
+    pending: Dict[Future[int], Tuple[int, int]] = {}
+    while time() < deadline:
+        while pool is not None and len(pending) < 2 * n_workers:
+            k = select()
+            try:
+                f = pool.submit(_worker_rollouts, game, player_i, actions[k],
+                    ROLLOUT_BATCH, rng.getrandbits(32))
+            except BrokenProcessPool:
+                # A worker died; carry on in this process and start a fresh
+                # pool next time
+                shutdown_rollout_pool()
+                pool = None
+                break
+            pending[f] = (k, ROLLOUT_BATCH)
+            in_flight[k] += ROLLOUT_BATCH
+
+        k = select()
+        wins[k] += run_rollouts(model, game, player_i, actions[k],
+            LOCAL_BATCH, rng.getrandbits(32))
+        visits[k] += LOCAL_BATCH
+
+        for f in [f for f in pending if f.done()]:
+            k, n = pending.pop(f)
+            in_flight[k] -= n
+            if f.exception() is None:
+                wins[k] += f.result()
+                visits[k] += n
+
+    for f in pending:
+        f.cancel()
+    return MCTSResult(actions, visits, wins, time() - start)
+
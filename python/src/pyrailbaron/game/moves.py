@@ -1,12 +1,21 @@
-from dataclasses import dataclass
-from pyrailbaron.game.fees import calculate_user_fees
+from dataclasses import dataclass, field
+from pyrailbaron.game.fees import (calculate_user_fees, calculate_slice_fees,
+    compile_path, get_owners, get_rr_id)
+from pyrailbaron.game.config import GameConfig, DEFAULT_CONFIG
 from pyrailbaron.map.bfs import quick_network_distance
 from pyrailbaron.map.datamodel import (
-    Map, Waypoint, RailSegment, make_rail_seg, get_valid_waypoints)
-from typing import List, MutableSet, Tuple
+    Map, Waypoint, RailSegment, make_rail_seg, rail_segs_from_wps, get_valid_waypoints)
+from typing import List, MutableSet, Set, FrozenSet, Tuple, Dict
 
 def calculate_legal_moves(m: Map, start_pt: int, history: List[Waypoint], dest_pt: int,
         rover_play_index: int) -> List[Waypoint]:
+    valid_moves = find_legal_moves(m, start_pt, history, dest_pt, rover_play_index)
+    assert len(valid_moves) > 0, "Must have a valid move available at all times"
+    return valid_moves
+
+# Same as calculate_legal_moves, but returns an empty list if there are none
+def find_legal_moves(m: Map, start_pt: int, history: List[Waypoint], dest_pt: int,
+        rover_play_index: int) -> List[Waypoint]:
     # First, collect the rail segs used so far
     rail_segs_used: List[RailSegment] = []
     curr_pt = start_pt
@@ -49,9 +58,8 @@ def calculate_legal_moves(m: Map, start_pt: int, history: List[Waypoint], dest_p
         if wp[1] == dest_pt or len(valid_wp(wp[1])) > 1]
     if len(valid_moves) == 0 and rover_play_index > 0:
         rover_start_pt = history[rover_play_index][1]
-        valid_moves = calculate_legal_moves(m, rover_start_pt, 
+        valid_moves = find_legal_moves(m, rover_start_pt, 
             history[(rover_play_index + 1):], dest_pt, -1)
-    assert len(valid_moves) > 0, "Must have a valid move available at all times"
     return valid_moves
 
 @dataclass
@@ -65,12 +73,15 @@ class MoveReport:
             trip_history: List[Waypoint], moves_this_turn: int,
             player_rr: List[List[str]], player_i: int, 
             init_rr: str|None, established_rate: int|None, 
-            doubleFees: bool) -> 'MoveReport':
+            doubleFees: bool, cfg: GameConfig = DEFAULT_CONFIG) -> 'MoveReport':
         history = trip_history[-moves_this_turn:] if moves_this_turn > 0 else []
-        fees_before, _ = calculate_user_fees(m, player_i, history, 
-            player_rr, init_rr, established_rate, doubleFees)
-        fees_after, _ = calculate_user_fees(m, player_i, history + [move],
-            player_rr, init_rr, established_rate, doubleFees)
+        cp = compile_path(m, history + [move])
+        owners = get_owners(m, player_rr)
+        init_rr_id = get_rr_id(m, init_rr)
+        fees_before, _ = calculate_slice_fees(cp, 0, len(history), player_i,
+            owners, len(player_rr), init_rr_id, established_rate, doubleFees, cfg)
+        fees_after, _ = calculate_slice_fees(cp, 0, len(cp), player_i,
+            owners, len(player_rr), init_rr_id, established_rate, doubleFees, cfg)
         bank_deltas = [fa - fb for fb,fa in zip(fees_before, fees_after)]
         dest_dist = quick_network_distance(m, start_pt, dest_pt, 
             trip_history+[move])
@@ -81,19 +92,209 @@ def get_legal_moves_with_scores(
         dest_pt: int, rover_play_index: int, 
         moves_this_turn: int, player_rr: List[List[str]], player_i: int, 
         init_rr: str|None, established_rate: int|None, 
-        doubleFees: bool) -> List[MoveReport]:
+        doubleFees: bool, cfg: GameConfig = DEFAULT_CONFIG) -> List[MoveReport]:
     moves = calculate_legal_moves(
         m, start_pt, history, dest_pt, rover_play_index)
     def score(wp: Waypoint) -> MoveReport:
         return MoveReport.score(wp, m, start_pt, dest_pt, history, 
             moves_this_turn, player_rr, player_i, 
-            init_rr, established_rate, doubleFees)
+            init_rr, established_rate, doubleFees, cfg)
     reports = list(map(score, moves))
-    for r in reports:
-        if r.dest_dist < 0:
-            reports.remove(r)
+    return sort_move_reports(reports, dest_pt, player_i)
+
+def sort_move_reports(reports: List[MoveReport], dest_pt: int,
+        player_i: int) -> List[MoveReport]:
+    reports = [r for r in reports if r.dest_dist >= 0]
     def sort_key(r: MoveReport) -> Tuple[int, int, int]:
         return (0 if r.move[1] == dest_pt else 1,   # Rank all moves to dest 1st
                 -r.bank_deltas[player_i],           # Then look at cost
                 r.dest_dist)                        # Finally, look at rem dist
-    return list(sorted(reports, key=sort_key))
\ No newline at end of file
+    return list(sorted(reports, key=sort_key))
+
+# A state partway through a turn. Tracking every distinct set of rail segments
+# used blows up quickly (tens of thousands of states for a roll of 9 from a
+# busy junction), so move sequences which reach the same point on the same RR
+# after the same number of moves owing the same fees are merged, and the first
+# legal sequence found is kept as the witness for the state. Another sequence
+# only shares the witness's subtree if some way through it avoids the rail
+# segments that sequence used (see TurnFrontier._finish); otherwise it gets a
+# subtree of its own. A sequence that can't finish the roll only rules out
+# that state for the same rail segments; another sequence with different
+# segments used may still get through.
+@dataclass
+class TurnNode:
+    pt: int
+    moves: List[Waypoint]       # Witness sequence reaching this state
+    bank_deltas: List[int]      # Fees for the whole turn so far
+    dest_dist: int | None = None
+    children: Dict[Waypoint, 'TurnNode'] = field(default_factory=dict)
+
+    @property
+    def last_rr(self) -> str | None:
+        return self.moves[-1][0] if len(self.moves) > 0 else None
+
+# Summary of one distinct place a turn can end
+@dataclass
+class TurnEndpoint:
+    pt: int
+    last_rr: str | None
+    moves: List[Waypoint]       # Cheapest sequence found ending here
+    bank_deltas: List[int]
+    dest_dist: int
+
+    @property
+    def at_dest(self) -> bool:
+        return self.dest_dist == 0
+
+# Every place a roll of d moves (stopping early at the destination) can end,
+# computed once per roll so the GUI and AI can both work from it
+# history = trip history so far (including moves taken previously this turn)
+# moves_so_far = # of moves taken previously this turn
+class TurnFrontier:
+    def __init__(self, m: Map, start_pt: int, history: List[Waypoint],
+            dest_pt: int, rover_play_index: int, d: int, moves_so_far: int,
+            player_rr: List[List[str]], player_i: int,
+            init_rr: str|None, established_rate: int|None, doubleFees: bool,
+            cfg: GameConfig = DEFAULT_CONFIG):
+        self.map = m
+        self.start_pt = start_pt
+        self.history = history
+        self.dest_pt = dest_pt
+        self.rover_play_index = rover_play_index
+        self.d = d
+        self.player_i = player_i
+        self._turn_history = history[-moves_so_far:] if moves_so_far > 0 else []
+        self._fee_args = (player_rr, init_rr, established_rate, doubleFees)
+        self.cfg = cfg
+
+        curr_pt = history[-1][1] if len(history) > 0 else start_pt
+        self._nodes: Dict[Tuple[int, str|None, int, Tuple[int, ...]], TurnNode] = {}
+        self._dead: Set[Tuple[Tuple[int, str|None, int, Tuple[int, ...]],
+            FrozenSet[RailSegment]]] = set()
+        self._ends: Dict[Tuple[int, str|None], TurnNode] = {}
+        self.root = TurnNode(curr_pt, [], self._turn_fees([]))
+        self._expand(self.root)
+        self.endpoints: List[TurnEndpoint] = list(sorted(
+            (TurnEndpoint(n.pt, n.last_rr, n.moves, n.bank_deltas,
+                self.dest_dist(n)) for n in self._ends.values()),
+            key=lambda e: (e.dest_dist < 0, e.dest_dist, -e.bank_deltas[player_i])))
+
+    def _turn_fees(self, moves: List[Waypoint]) -> List[int]:
+        player_rr, init_rr, established_rate, doubleFees = self._fee_args
+        bank_deltas, _ = calculate_user_fees(self.map, self.player_i,
+            self._turn_history + moves, player_rr, init_rr, established_rate,
+            doubleFees, self.cfg)
+        return bank_deltas
+
+    def _legal_moves(self, moves: List[Waypoint]) -> List[Waypoint]:
+        return find_legal_moves(self.map, self.start_pt, self.history + moves,
+            self.dest_pt, self.rover_play_index)
+
+    # Remaining network distance to the destination, computed on demand
+    def dest_dist(self, node: TurnNode) -> int:
+        if node.dest_dist is None:
+            node.dest_dist = quick_network_distance(self.map, self.start_pt,
+                self.dest_pt, self.history + node.moves)
+        return node.dest_dist
+
+    # Returns False if there is no legal way to finish the roll from node
+    def _expand(self, node: TurnNode) -> bool:
+        if len(node.moves) == self.d or node.pt == self.dest_pt:
+            self._add_endpoint(node)
+            return True
+        for wp in self._legal_moves(node.moves):
+            moves = node.moves + [wp]
+            bank_deltas = self._turn_fees(moves)
+            key = (wp[1], wp[0], len(moves), tuple(bank_deltas))
+            segs = frozenset(rail_segs_from_wps(self.root.pt, moves))
+            child = self._nodes.get(key)
+            if child is not None and self._finish(child, segs) is None:
+                child = None
+            if child is None:
+                dead_key = (key, segs)
+                if dead_key in self._dead:
+                    continue
+                child = TurnNode(wp[1], moves, bank_deltas)
+                if not self._expand(child):
+                    self._dead.add(dead_key)
+                    continue
+                self._nodes.setdefault(key, child)
+            node.children[wp] = child
+        return len(node.children) > 0
+
+    # A state can be reached over different rail segments than its witness,
+    # so its subtree is only shared with a prefix that used segs if some way
+    # through it to the end of the roll uses none of them. Returns the moves
+    # after node on such a way, or None.
+    def _finish(self, node: TurnNode, segs: FrozenSet[RailSegment]) -> List[Waypoint] | None:
+        failed: Set[int] = set()
+        def search(n: TurnNode) -> List[Waypoint] | None:
+            if len(n.children) == 0:
+                return []
+            if id(n) in failed:
+                return None
+            for wp, child in n.children.items():
+                if make_rail_seg(wp[0], n.pt, wp[1]) not in segs:
+                    rest = search(child)
+                    if rest is not None:
+                        return [wp] + rest
+            failed.add(id(n))
+            return None
+        return search(node)
+
+    def _add_endpoint(self, node: TurnNode):
+        key = (node.pt, node.last_rr)
+        end = self._ends.get(key)
+        if end is None or node.bank_deltas[self.player_i] > end.bank_deltas[self.player_i]:
+            self._ends[key] = node
+
+    # Whether the roll can be finished legally after moves + [wp] through
+    # child's subtree, checked in full (trapped points included)
+    def _can_finish(self, moves: List[Waypoint], wp: Waypoint, child: TurnNode) -> bool:
+        rest = self._finish(child, frozenset(rail_segs_from_wps(self.root.pt, moves + [wp])))
+        return rest is not None and is_legal_sequence(self.map, self.start_pt,
+            self.history + moves, [wp] + rest, self.dest_pt, self.rover_play_index)
+
+    # Scored options for the next move after the given moves this roll. Moves
+    # which reach a state through a different sequence than its witness can
+    # have used different rail segments, so those are scored from scratch (as
+    # are moves off the frontier, which we fall back to rather than get stuck,
+    # and any option whose way to finish the roll doesn't check out).
+    def options_after(self, moves: List[Waypoint]) -> List[MoveReport]:
+        node: TurnNode | None = self.root
+        for wp in moves:
+            node = node.children.get(wp) if node else None
+        if (node is None or node.moves != moves or len(node.children) == 0
+                or not all(self._can_finish(moves, wp, child)
+                    for wp, child in node.children.items())):
+            return get_legal_moves_with_scores(self.map, self.start_pt,
+                self.history + moves, self.dest_pt, self.rover_play_index,
+                len(self._turn_history) + len(moves), *self._fee_args[:1],
+                self.player_i, *self._fee_args[1:], self.cfg)
+        def child_dist(wp: Waypoint, child: TurnNode) -> int:
+            if child.moves[-1] == wp and child.moves[:-1] == moves:
+                return self.dest_dist(child)
+            return quick_network_distance(self.map, self.start_pt,
+                self.dest_pt, self.history + moves + [wp])
+        reports = [MoveReport(wp, [a - b for a, b in
+                zip(child.bank_deltas, node.bank_deltas)], child_dist(wp, child))
+            for wp, child in node.children.items()]
+        return sort_move_reports(reports, self.dest_pt, self.player_i)
+
+    # Whether moves is a complete legal use of this roll
+    def is_legal_turn(self, moves: List[Waypoint]) -> bool:
+        if not is_legal_sequence(self.map, self.start_pt, self.history, moves,
+                self.dest_pt, self.rover_play_index):
+            return False
+        return len(moves) == self.d or (len(moves) > 0 and moves[-1][1] == self.dest_pt)
+
+# Whether each of moves is legal in turn after history (stopping at dest_pt)
+def is_legal_sequence(m: Map, start_pt: int, history: List[Waypoint],
+        moves: List[Waypoint], dest_pt: int, rover_play_index: int) -> bool:
+    for i, wp in enumerate(moves):
+        if wp not in find_legal_moves(m, start_pt, history + moves[:i],
+                dest_pt, rover_play_index):
+            return False
+        if wp[1] == dest_pt:
+            return i == len(moves) - 1
+    return True
@@ -0,0 +1,70 @@
+from pyrailbaron.game.constants import REGIONS
+from pyrailbaron.game.charts import roll_table_probabilities
+from pyrailbaron.map.datamodel import Map
+from typing import Dict, List, Tuple
+from fractions import Fraction
+from math import floor
+import numpy as np
+
+HALF = Fraction(1, 2)
+
+# Route payoffs and roll-table probabilities as arrays over city ids (the
+# order of the payoff chart). Cities, not points, are the index because two
+# cities can share a point (Minneapolis/St. Paul) and still have different
+# payoffs on the chart.
+class PayoffTable:
+    def __init__(self, m: Map, route_payoffs: Dict[str, Dict[str, int]],
+            roll_tables: Dict[str, List[Tuple[str, str]]]):
+        self.cities: List[str] = list(route_payoffs)
+        self.city_ids: Dict[str, int] = dict(
+            (c, i) for i, c in enumerate(self.cities))
+        self.city_pts = np.array([m.lookup_city(c)[1] for c in self.cities],
+            dtype=np.int32)
+        n = len(self.cities)
+        self.matrix = np.zeros((n, n), dtype=np.int32)
+        for start, row in route_payoffs.items():
+            for dest, payoff in row.items():
+                self.matrix[self.city_ids[start], self.city_ids[dest]] = payoff
+
+        # Probability of rolling each city on each region's table
+        self.region_probs = np.zeros((len(REGIONS), n), dtype=np.float64)
+        for r, region in enumerate(REGIONS):
+            for city, p in roll_table_probabilities(roll_tables[region]).items():
+                self.region_probs[r, self.city_id(m, city)] += p
+
+        # Average payoff from each start city to each region, leaving out the
+        # start city itself; rounded to $500 like the chart. Roll probabilities
+        # are whole multiples of 1/72, so the averages are computed exactly and
+        # ties ($250) always round up.
+        counts = np.rint(self.region_probs * 72).astype(np.int64)
+        sum_payoff = self.matrix.astype(np.int64) @ counts.T
+        sum_count = counts.sum(axis=1)[None, :] - counts.T
+        self.expected = np.array([[floor(Fraction(int(sp), int(sc) * 500) + HALF) * 500
+                for sp, sc in zip(sp_row, sc_row)]
+            for sp_row, sc_row in zip(sum_payoff, sum_count)], dtype=np.int32)
+
+        # Expected payoff of a whole trip from each start city, with the region
+        # rerolled until it's not the start region
+        p_region = roll_table_probabilities(roll_tables['REGION'])
+        self.trip_ev = np.zeros(n, dtype=np.float64)
+        for i, pt in enumerate(self.city_pts.tolist()):
+            start_region = m.points[pt].region
+            probs = np.array([0.0 if r == start_region else p_region.get(r, 0.0)
+                for r in REGIONS])
+            self.trip_ev[i] = (probs / probs.sum()) @ self.region_probs @ self.matrix[i]
+
+    # Roll tables use their own spellings of city names
+    def city_id(self, m: Map, city: str) -> int:
+        if city not in self.city_ids:
+            self.city_ids[city] = self.city_ids[m.lookup_city(city)[0]]
+        return self.city_ids[city]
+
+    def payoff(self, start_city: str, dest_city: str) -> int:
+        return int(self.matrix[self.city_ids[start_city], self.city_ids[dest_city]])
+
+    def expected_region_payoffs(self, start_city: str) -> Dict[str, int]:
+        row = self.expected[self.city_ids[start_city]]
+        return dict((region, int(row[r])) for r, region in enumerate(REGIONS))
+
+    def expected_trip_payoff(self, start_city: str) -> float:
+        return float(self.trip_ev[self.city_ids[start_city]])
@@ -0,0 +1,191 @@
+from dataclasses import dataclass
+from pyrailbaron.game.config import GameConfig, DEFAULT_CONFIG
+from pyrailbaron.game.fees import TurnFees, start_turn_fees, fee_hop, charged_fee
+from pyrailbaron.game.state import Engine
+from pyrailbaron.map.contract import get_contracted_graph
+from pyrailbaron.map.datamodel import Map, Waypoint, RailSegment
+from pyrailbaron.map.summary import summarize_path
+from typing import List, Dict, Tuple, Optional
+from heapq import heappush, heappop
+
+# Route planner which searches directly over (point, railroad, established
+# rate, hops) states with user fees as the cost, rather than enumerating paths
+# and pricing each one. The first turn is exactly d hops long; later turns are
+# assumed to be the average roll for the player's engine.
+
+def expected_roll(e: Engine) -> int:
+    avg = 7.0
+    if e == Engine.Express:
+        avg += 3.5 / 6 # Bonus die on doubles
+    elif e == Engine.Superchief:
+        avg += 3.5
+    return int(round(avg))
+
+# Fee state within a single turn (see fees.fee_hop)
+TurnState = TurnFees
+
+@dataclass
+class PlannedRoute:
+    hops: int
+    fees: int           # Expected fees paid by the player (positive)
+    path: List[Waypoint]
+
+@dataclass
+class _Label:
+    pt: int
+    rr: Optional[str]
+    hops: int
+    fees: int
+    turn: TurnState
+    visited: int
+    parent: Optional['_Label']
+    waypoints: Tuple[Waypoint, ...]
+
+    @property
+    def path(self) -> List[Waypoint]:
+        parts: List[Tuple[Waypoint, ...]] = []
+        label: _Label | None = self
+        while label:
+            parts.append(label.waypoints)
+            label = label.parent
+        return [wp for part in reversed(parts) for wp in part]
+
+class FeeModel:
+    def __init__(self, player_i: int, player_rr: List[List[str]], doubleFees: bool,
+            cfg: GameConfig = DEFAULT_CONFIG):
+        self.player_i = player_i
+        self.owners: Dict[str, int] = dict(
+            (rr, i) for i, rr_owned in enumerate(player_rr) for rr in rr_owned)
+        self.doubleFees = doubleFees
+        self.cfg = cfg
+
+    def start_turn(self, init_rr: Optional[str], est: Optional[int]) -> TurnState:
+        return start_turn_fees(init_rr is not None, est)
+
+    # Take one hop from prev_rr onto rr; returns the new state and any newly
+    # charged fees. While on_first is set, prev_rr is the turn's initial RR.
+    def hop(self, turn: TurnState, prev_rr: Optional[str], rr: str) -> Tuple[TurnState, int]:
+        new_turn = fee_hop(turn, rr == prev_rr, self.owners.get(rr, -1),
+            self.player_i, self.cfg)
+        return new_turn, charged_fee(new_turn[3] & ~turn[3], self.doubleFees, self.cfg)
+
+# Label search for routes from start_pt to dest_pt which are at most
+# path_length_flex longer than the shortest route; returns a label for every
+# non-dominated way of arriving
+# previous_moves = moves already taken this turn (their fees are not counted)
+def _search_arrivals(m: Map, player_i: int, start_pt: int, dest_pt: int,
+        used_rail_segs: List[RailSegment], d: int, engine: Engine,
+        player_rr: List[List[str]], init_rr: str | None,
+        established_rate: int | None, doubleFees: bool,
+        previous_moves: List[Waypoint], path_length_flex: int,
+        cfg: GameConfig = DEFAULT_CONFIG) -> List[_Label]:
+    g = get_contracted_graph(m)
+    blocked = set(used_rail_segs)
+    dist_to = g.distances(dest_pt, blocked)
+    if start_pt not in dist_to or start_pt == dest_pt:
+        return []
+    max_hops = dist_to[start_pt] + path_length_flex
+    turn_len = expected_roll(engine)
+    fees = FeeModel(player_i, player_rr, doubleFees, cfg)
+
+    # Replay the moves already taken this turn to find the initial fee state
+    turn = fees.start_turn(init_rr, established_rate)
+    start_rr = init_rr
+    for rr, _ in previous_moves:
+        turn, _ = fees.hop(turn, start_rr, rr)
+        start_rr = rr
+
+    def new_turn_at(hops: int) -> bool:
+        return hops == d or (hops > d and (hops - d) % turn_len == 0)
+
+    StateKey = Tuple[int, Optional[str], int, TurnState]
+    best: Dict[StateKey, int] = {}
+    arrivals: List[_Label] = []
+    queue: List[Tuple[int, int, int, _Label]] = []
+    n_queued = 0
+    def push(label: _Label):
+        nonlocal n_queued
+        key = (label.pt, label.rr, label.hops, label.turn)
+        if label.fees < best.get(key, label.fees + 1):
+            best[key] = label.fees
+            heappush(queue, (label.hops, label.fees, n_queued, label))
+            n_queued += 1
+    push(_Label(start_pt, start_rr, 0, 0, turn, 1 << start_pt, None, ()))
+
+    while len(queue) > 0:
+        _, _, _, label = heappop(queue)
+        if best[(label.pt, label.rr, label.hops, label.turn)] < label.fees:
+            continue
+        for e in g.edges_from(label.pt):
+            if e.pts_mask & label.visited and not e.passes(dest_pt):
+                continue
+            rr, hops, cost, turn = label.rr, label.hops, label.fees, label.turn
+            open_hops = e.open_hops(blocked)
+            for hop_i, (next_rr, next_pt) in enumerate(e.waypoints):
+                if (hop_i >= open_hops or hops >= max_hops
+                        or (label.visited >> next_pt) & 1):
+                    break
+                if new_turn_at(hops):
+                    turn = fees.start_turn(rr, turn[2])
+                turn, fee = fees.hop(turn, rr, next_rr)
+                rr, hops, cost = next_rr, hops + 1, cost + fee
+                if next_pt == dest_pt:
+                    arrivals.append(_Label(next_pt, rr, hops, cost, turn,
+                        label.visited, label, e.waypoints[:hop_i + 1]))
+                    break
+                if next_pt == e.end_pt and hops + dist_to.get(next_pt, max_hops) <= max_hops:
+                    push(_Label(next_pt, rr, hops, cost, turn,
+                        label.visited | e.pts_mask, label, e.waypoints))
+
+    return arrivals
+
+# Returns the Pareto front of (hops, expected fees) routes from start_pt to
+# dest_pt which are at most path_length_flex longer than the shortest route
+# previous_moves = moves already taken this turn (their fees are not counted)
+def plan_pareto_routes(m: Map, player_i: int, start_pt: int, dest_pt: int,
+        used_rail_segs: List[RailSegment], d: int, engine: Engine,
+        player_rr: List[List[str]], init_rr: str | None,
+        established_rate: int | None, doubleFees: bool,
+        previous_moves: List[Waypoint] = [],
+        path_length_flex: int = 0,
+        cfg: GameConfig = DEFAULT_CONFIG) -> List[PlannedRoute]:
+    arrivals = _search_arrivals(m, player_i, start_pt, dest_pt, used_rail_segs,
+        d, engine, player_rr, init_rr, established_rate, doubleFees,
+        previous_moves, path_length_flex, cfg)
+
+    # Keep the cheapest route for each length (fewest railroads on ties),
+    # then drop longer routes which aren't cheaper
+    by_hops: Dict[int, Tuple[int, int, List[Waypoint]]] = {}
+    for a in arrivals:
+        path = a.path
+        n_rrs = summarize_path(m, path).n_rrs
+        if a.hops not in by_hops or (a.fees, n_rrs) < by_hops[a.hops][:2]:
+            by_hops[a.hops] = (a.fees, n_rrs, path)
+    front: List[PlannedRoute] = []
+    for hops in sorted(by_hops):
+        cost, _, path = by_hops[hops]
+        if len(front) == 0 or cost < front[-1].fees:
+            front.append(PlannedRoute(hops, cost, path))
+    return front
+
+
+# Up to max_routes distinct routes from the same search, fewest hops then
+# lowest expected fees first; unlike the Pareto front, this keeps routes which
+# only look worse under the average-roll assumption
+def plan_candidate_routes(m: Map, player_i: int, start_pt: int, dest_pt: int,
+        used_rail_segs: List[RailSegment], d: int, engine: Engine,
+        player_rr: List[List[str]], init_rr: str | None,
+        established_rate: int | None, doubleFees: bool,
+        previous_moves: List[Waypoint] = [],
+        path_length_flex: int = 0, max_routes: int = 50,
+        cfg: GameConfig = DEFAULT_CONFIG) -> List[PlannedRoute]:
+    arrivals = _search_arrivals(m, player_i, start_pt, dest_pt, used_rail_segs,
+        d, engine, player_rr, init_rr, established_rate, doubleFees,
+        previous_moves, path_length_flex, cfg)
+    routes: Dict[Tuple[Waypoint, ...], PlannedRoute] = {}
+    for a in sorted(arrivals, key=lambda a: (a.hops, a.fees)):
+        path = a.path
+        routes.setdefault(tuple(path), PlannedRoute(a.hops, a.fees, path))
+        if len(routes) >= max_routes:
+            break
+    return list(routes.values())
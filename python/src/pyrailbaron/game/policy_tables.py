@@ -0,0 +1,256 @@
+from pyrailbaron.game.constants import *
+from pyrailbaron.game.state import GameState, Engine
+from pyrailbaron.game.config import GameConfig
+from pyrailbaron.game.rollout import (RolloutModel, RolloutState, CompactGame,
+    CompactPlayer, get_rollout_model, check_destination, finish_turn,
+    MAX_ROLLOUT_TURNS)
+from pyrailbaron.map.datamodel import derived_data, network_hash
+from pathlib import Path
+from typing import List, Tuple
+from random import Random
+from math import sqrt
+from time import time
+import json
+import numpy as np
+
+# Lookup tables for AI decisions that mostly depend on a few coarse
+# features, built offline from whole-game rollouts (see rollout.py) and
+# shipped as small arrays in data/policy_tables.npz:
+#   - declaring: how often a player who declared with a given bank (above
+#     the amount needed to win), distance home and engine made it home
+#     without becoming undeclared
+#   - engine upgrades: the distribution of the next trip's fees by engine,
+#     start region and how many railroads are owned, for the purchase risk
+#     filter
+#   - region choice: the region with the best payoff per turn from each city
+# Declare and upgrade cells only answer when their sample is big enough to
+# settle the decision either way; otherwise the AI simulates as before. The
+# tables are only used with the rules (GameConfig) they were built for.
+#
+#   python -m pyrailbaron.game.policy_tables [N_GAMES]
+
+DEFAULT_TABLES_PATH = (Path(__file__) / '../../../../../data/policy_tables.npz').resolve()
+BANK_STEP = 10000      # Declare table bank buckets (above the amount to win)
+N_BANK_BUCKETS = 10
+DIST_STEP = 8          # Declare table distance buckets, in hops
+N_DIST_BUCKETS = 8
+N_OWNED_BUCKETS = 4    # Trip table buckets of the share of railroads owned
+MIN_CELL_SAMPLES = 30
+TABLE_SLACK = 5000     # Extra margin on trip fees, which only roughly reflect ownership
+MAX_DECLARE_MARGIN = 100000 # Rollout players declare at a random margin up to this
+Z_95 = 1.96
+
+def _bank_bucket(bank: int, min_cash: int) -> int:
+    return min(max(0, bank - min_cash) // BANK_STEP, N_BANK_BUCKETS - 1)
+
+def _dist_bucket(dist: int) -> int:
+    return min(dist // DIST_STEP, N_DIST_BUCKETS - 1)
+
+def _owned_bucket(n_owned: int, n_rr: int) -> int:
+    return min(n_owned * N_OWNED_BUCKETS // n_rr, N_OWNED_BUCKETS - 1)
+
+def _wilson(wins: int, n: int) -> Tuple[float, float]:
+    p, z2 = wins / n, Z_95 * Z_95
+    mid = (p + z2 / (2 * n)) / (1 + z2 / n)
+    half = Z_95 * sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+    return mid - half, mid + half
+
+class PolicyTables:
+    def __init__(self, declare_n: np.ndarray, declare_wins: np.ndarray,
+            trip_n: np.ndarray, trip_fees: np.ndarray, region_pref: np.ndarray):
+        self.declare_n = declare_n      # [bank bucket, distance bucket, engine]
+        self.declare_wins = declare_wins
+        self.trip_n = trip_n            # [engine, start region, owned bucket]
+        self.trip_fees = trip_fees      # [engine, start region, owned bucket, percentile 0-100]
+        self.region_pref = region_pref  # [city id] -> region index
+
+    # Declare if we're confidently above 1-crit_pct chance of getting home
+    # with enough to win (min_cash), don't if we're confidently below, None
+    # if unsure
+    def declare(self, bank: int, min_cash: int, dist: int, engine: Engine,
+            crit_pct: float) -> bool | None:
+        if bank < min_cash:
+            return False
+        cell = (_bank_bucket(bank, min_cash), _dist_bucket(dist), engine.value)
+        n = int(self.declare_n[cell])
+        if n < MIN_CELL_SAMPLES:
+            return None
+        lo, hi = _wilson(int(self.declare_wins[cell]), n)
+        if lo >= 1 - crit_pct:
+            return True
+        if hi < 1 - crit_pct:
+            return False
+        return None
+
+    # Keep/drop an engine upgrade leaving bal_after in the bank, by the
+    # 1-crit_pct quantile of the next trip's fees (with its confidence
+    # interval and TABLE_SLACK); None if that doesn't settle it
+    def engine_upgrade(self, engine: Engine, region: str, n_owned: int, n_rr: int,
+            bal_after: int, min_bal: int, crit_pct: float) -> bool | None:
+        cell = (engine.value, REGIONS.index(region), _owned_bucket(n_owned, n_rr))
+        n = int(self.trip_n[cell])
+        if n < MIN_CELL_SAMPLES:
+            return None
+        p = 1 - crit_pct
+        spread = Z_95 * sqrt(p * (1 - p) / n)
+        pcts = np.arange(101)
+        fees_hi = np.interp(100 * min(1.0, p + spread), pcts, self.trip_fees[cell])
+        fees_lo = np.interp(100 * max(0.0, p - spread), pcts, self.trip_fees[cell])
+        if bal_after - fees_hi - TABLE_SLACK > min_bal:
+            return True
+        if bal_after - fees_lo + TABLE_SLACK <= min_bal:
+            return False
+        return None
+
+    def region(self, city_id: int) -> str:
+        return REGIONS[int(self.region_pref[city_id])]
+
+# The game rules the tables depend on (everything but the AI settings)
+def rules_key(cfg: GameConfig) -> str:
+    rules = cfg.to_dict()
+    del rules['ai']
+    return json.dumps(rules, sort_keys=True)
+
+def read_policy_tables(s: GameState,
+        tables_path: Path = DEFAULT_TABLES_PATH) -> PolicyTables | None:
+    if not tables_path.exists():
+        return None
+    data = np.load(tables_path)
+    if str(data['map_hash']) != network_hash(s.map):
+        print(f'Policy tables {tables_path} do not match map, ignoring them')
+        return None
+    if str(data['rules']) != rules_key(s.config):
+        return None # Built for other rules; simulate instead
+    return PolicyTables(data['declare_n'], data['declare_wins'],
+        data['trip_n'], data['trip_fees'], data['region_pref'])
+
+def get_policy_tables(s: GameState) -> PolicyTables | None:
+    return derived_data(s.map, 'policy_tables', lambda: read_policy_tables(s),
+        s.config)
+
+# Expected number of turns to cover each distance with a basic engine
+def expected_turns(max_dist: int) -> np.ndarray:
+    p_roll = np.zeros(13)
+    for d1 in range(1, 7):
+        for d2 in range(1, 7):
+            p_roll[d1 + d2] += 1 / 36
+    turns = np.zeros(max_dist + 1)
+    for dist in range(1, max_dist + 1):
+        turns[dist] = 1 + sum(p * turns[max(0, dist - d)]
+            for d, p in enumerate(p_roll) if p > 0)
+    return turns
+
+# Region with the best expected payoff per turn from each city, when the
+# player gets to choose
+def region_preferences(s: GameState) -> np.ndarray:
+    model = get_rollout_model(s)
+    lengths = np.array([[len(r) for r in row] for row in model.routes])
+    turns = expected_turns(int(lengths.max()))[lengths]
+    payoffs = np.array(model.payoffs, dtype=np.float64)
+    pref = np.zeros(model.n_city, dtype=np.int8)
+    for a in range(model.n_city):
+        best, best_rate = 0, -1.0
+        for r in range(len(REGIONS)):
+            probs = s.payoff_table.region_probs[r].copy()
+            probs[np.array(model.city_pts) == model.city_pts[a]] = 0.0
+            if probs.sum() == 0:
+                continue
+            probs /= probs.sum()
+            rate = float(probs @ payoffs[a]) / float(probs @ turns[a])
+            if rate > best_rate:
+                best, best_rate = r, rate
+        pref[a] = best
+    return pref
+
+# Start of a rollout game: everyone at a random home city with the initial bank
+def new_compact_game(model: RolloutModel, n_players: int, rng: Random,
+        rules: GameConfig) -> CompactGame:
+    weights = model.dest_weights(None)
+    homes = rng.choices(range(model.n_city), weights=weights.tolist(), k=n_players)
+    players: List[CompactPlayer] = [(rules.initial_bank, h, -1, h,
+        Engine.Basic.value, 0, False, ()) for h in homes]
+    return CompactGame(tuple(players), rules)
+
+# Play rollout games, declaring at a random margin over the amount needed to
+# win, and record every declaration's outcome and every undeclared trip's fees
+# (including the arrival turn's)
+def simulate_samples(model: RolloutModel, rules: GameConfig, n_games: int, seed: int = 0) \
+        -> Tuple[List[Tuple[int, int, int, bool]], List[Tuple[int, int, int, int]]]:
+    rng = Random(seed)
+    declares: List[Tuple[int, int, int, bool]] = [] # (bank, dist, engine, made it)
+    trips: List[Tuple[int, int, int, int]] = []     # (engine, region, owned bucket, fees)
+    city_regions = [REGIONS.index(model.map.points[pt].region) for pt in model.city_pts]
+    for _ in range(n_games):
+        st = RolloutState(model, new_compact_game(model, rng.choice([3, 4]), rng, rules))
+        open_declare: List[Tuple[int, int, int] | None] = [None] * st.n
+        open_trip: List[List[int] | None] = [None] * st.n
+        trip_key = [(-1, -1)] * st.n
+        player_i = 0
+        for _ in range(MAX_ROLLOUT_TURNS):
+            i = player_i
+            if (st.target[i] >= 0 and st.arrived(i) and not st.declared[i]
+                    and st.bank[i] >= rules.min_cash_to_win + rng.random() * MAX_DECLARE_MARGIN):
+                open_declare[i] = (st.bank[i], len(model.routes[st.current_city(i)][st.home[i]]),
+                    st.engine[i])
+                st.declare(i)
+            check_destination(st, i, rng, allow_declare=False)
+            if (st.start[i], st.target[i]) != trip_key[i]:
+                trip_key[i] = (st.start[i], st.target[i])
+                open_trip[i] = (None if st.declared[i]
+                    else [st.engine[i], city_regions[st.start[i]],
+                        _owned_bucket(st.n_owned, model.n_rr), 0])
+
+            paid = st.fees_paid[i]
+            won = finish_turn(st, i, rng)
+            trip = open_trip[i]
+            if trip is not None:
+                trip[3] += st.fees_paid[i] - paid
+            if st.arrived(i) or (st.start[i], st.target[i]) != trip_key[i]:
+                if trip is not None:
+                    trips.append((trip[0], trip[1], trip[2], trip[3]))
+                open_trip[i] = None
+
+            declared = open_declare[i]
+            if declared is not None and (won or not st.declared[i]):
+                declares.append(declared + (won,))
+                open_declare[i] = None
+            if won:
+                break
+            player_i = (player_i + 1) % st.n
+    return declares, trips
+
+def build_policy_tables(s: GameState, n_games: int, seed: int = 0) -> PolicyTables:
+    model = get_rollout_model(s)
+    declares, trips = simulate_samples(model, s.config, n_games, seed)
+    declare_n = np.zeros((N_BANK_BUCKETS, N_DIST_BUCKETS, len(Engine)), dtype=np.int32)
+    declare_wins = np.zeros_like(declare_n)
+    for bank, dist, engine, won in declares:
+        cell = (_bank_bucket(bank, s.config.min_cash_to_win), _dist_bucket(dist), engine)
+        declare_n[cell] += 1
+        declare_wins[cell] += won
+    trip_n = np.zeros((len(Engine), len(REGIONS), N_OWNED_BUCKETS), dtype=np.int32)
+    trip_fees = np.zeros(trip_n.shape + (101,), dtype=np.int32)
+    fees = np.array(trips, dtype=np.int64).reshape(-1, 4)
+    for cell in np.ndindex(*trip_n.shape):
+        cell_fees = fees[(fees[:, :3] == cell).all(axis=1), 3]
+        trip_n[cell] = len(cell_fees)
+        if len(cell_fees) > 0:
+            trip_fees[cell] = np.percentile(cell_fees, np.arange(101))
+    return PolicyTables(declare_n, declare_wins, trip_n, trip_fees,
+        region_preferences(s))
+
+def write_policy_tables(s: GameState, n_games: int,
+        tables_path: Path = DEFAULT_TABLES_PATH):
+    t0 = time()
+    tables = build_policy_tables(s, n_games)
+    np.savez_compressed(tables_path, declare_n=tables.declare_n,
+        declare_wins=tables.declare_wins, trip_n=tables.trip_n,
+        trip_fees=tables.trip_fees, region_pref=tables.region_pref,
+        map_hash=network_hash(s.map), rules=rules_key(s.config))
+    print(f'Wrote policy tables to {tables_path} from {n_games} games '
+        f'({int(tables.declare_n.sum())} declares, {int(tables.trip_n.sum())} trips) '
+        f'in {time() - t0:.0f}s')
+
+if __name__ == '__main__':
+    import sys
+    write_policy_tables(GameState(), int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
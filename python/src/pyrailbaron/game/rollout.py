@@ -0,0 +1,380 @@
+from pyrailbaron.game.constants import *
+from pyrailbaron.game.state import GameState, Engine
+from pyrailbaron.game.config import GameConfig, DEFAULT_CONFIG
+from pyrailbaron.game.payoffs import PayoffTable
+from pyrailbaron.game.sampling import AliasTable
+from pyrailbaron.map.datamodel import Map, derived_data
+from pyrailbaron.map.summary import get_rr_ids
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from random import Random
+import multiprocessing
+import threading
+import atexit
+import os
+import numpy as np
+
+# Fast, simplified whole-game rollouts for the Monte Carlo AI. A rollout
+# plays every player to the end of the game with a fixed default policy:
+#   - every trip follows the shortest route (fewest hops) between cities
+#   - user fees are charged per turn like the real game, but without
+#     established rates, and rover plays are ignored
+#   - after a payoff, buy the best engine or most expensive railroad that
+#     leaves ROLLOUT_RESERVE in the bank
+#   - declare as soon as the bank allows (plus ROLLOUT_DECLARE_MARGIN)
+#   - shortfalls are covered by selling railroads to the bank, cheapest first
+# A player who becomes undeclared keeps heading home and is paid for that
+# trip as a normal destination. Rollouts only have to rank decisions, so
+# these shortcuts are fine as long as they hit every option equally.
+
+ROLLOUT_RESERVE = 10000
+ROLLOUT_DECLARE_MARGIN = 10000
+MAX_ROLLOUT_TURNS = 500     # Player-turns before a rollout is called a draw
+
+# Engine values as plain ints; Enum attribute lookups are slow in the inner loop
+_BASIC = Engine.Basic.value
+_EXPRESS = Engine.Express.value
+_SUPERCHIEF = Engine.Superchief.value
+
+def _die(rng: Random) -> int:
+    return int(rng.random() * 6) + 1
+
+# Static tables for rollouts, built once per map and charts: the payoff
+# matrix, a destination alias table per start city and the shortest route
+# (as railroad ids per hop) between every pair of cities
+class RolloutModel:
+    def __init__(self, m: Map, payoffs: PayoffTable,
+            region_probs: Dict[str, float]):
+        self.map = m
+        self.rr_ids = get_rr_ids(m)
+        self.rr_names = list(self.rr_ids)
+        self.rr_costs = [m.railroads[rr].cost for rr in self.rr_names]
+        self.n_rr = len(self.rr_names)
+        self.cities = payoffs.cities
+        self.city_ids = payoffs.city_ids
+        self.city_pts: List[int] = payoffs.city_pts.tolist()
+        self.n_city = len(self.cities)
+        self.payoffs: List[List[int]] = payoffs.matrix.tolist()
+
+        # Routes between cities, from one BFS per city point
+        self._pt_routes: Dict[int, Dict[int, Tuple[int, ...]]] = {}
+        self.routes: List[List[Tuple[int, ...]]] = [
+            [self.route_from_point(a_pt, b) for b in range(self.n_city)]
+            for a_pt in self.city_pts]
+
+        # Destination alias tables from each start city
+        self._region_probs = region_probs
+        self._city_region_probs = payoffs.region_probs
+        self._dest_tables: List[Tuple[List[int], List[float], List[int]]] = []
+        for a in range(self.n_city):
+            weights = self.dest_weights(a)
+            ids = np.nonzero(weights)[0]
+            table = AliasTable(ids.astype(np.int32), weights[ids])
+            self._dest_tables.append((table.outcomes.tolist(),
+                table.prob.tolist(), table.alias.tolist()))
+
+    # Destination probabilities of every city from start_city: the region is
+    # rerolled until it differs from the start region, and the start point
+    # itself is rerolled. None gives the plain roll (e.g. for home cities).
+    def dest_weights(self, start_city: int | None) -> np.ndarray:
+        start_pt = self.city_pts[start_city] if start_city is not None else -1
+        start_region = self.map.points[start_pt].region if start_pt >= 0 else None
+        weights = np.zeros(self.n_city, dtype=np.float64)
+        for r, region in enumerate(REGIONS):
+            if region != start_region and region in self._region_probs:
+                weights += self._region_probs[region] * self._city_region_probs[r]
+        weights[np.array(self.city_pts) == start_pt] = 0.0
+        return weights / weights.sum()
+
+    # Shortest route from any point to a city, as the RR id of each hop
+    def route_from_point(self, pt: int, dest_city: int) -> Tuple[int, ...]:
+        if pt not in self._pt_routes:
+            self._pt_routes[pt] = self._bfs(pt)
+        return self._pt_routes[pt].get(self.city_pts[dest_city], ())
+
+    def _bfs(self, start_pt: int) -> Dict[int, Tuple[int, ...]]:
+        parents: Dict[int, Tuple[int, int]] = {start_pt: (-1, -1)}
+        queue = deque([start_pt])
+        while queue:
+            pt = queue.popleft()
+            for rr, next_pts in self.map.points[pt].connections.items():
+                for next_pt in next_pts:
+                    if next_pt not in parents:
+                        parents[next_pt] = (pt, self.rr_ids[rr])
+                        queue.append(next_pt)
+        city_pts = set(self.city_pts)
+        routes: Dict[int, Tuple[int, ...]] = {}
+        for end_pt in city_pts:
+            if end_pt not in parents:
+                continue
+            hops: List[int] = []
+            pt = end_pt
+            while pt != start_pt:
+                pt, rr_id = parents[pt]
+                hops.append(rr_id)
+            routes[end_pt] = tuple(reversed(hops))
+        return routes
+
+    def sample_destination(self, start_city: int, rng: Random) -> int:
+        outcomes, prob, alias = self._dest_tables[start_city]
+        slot = int(rng.random() * len(prob))
+        return outcomes[slot] if rng.random() < prob[slot] else outcomes[alias[slot]]
+
+def build_rollout_model(s: GameState) -> RolloutModel:
+    return RolloutModel(s.map, s.payoff_table,
+        s.get_roll_table_probabilities('REGION'))
+
+def get_rollout_model(s: GameState) -> RolloutModel:
+    return derived_data(s.map, 'rollout_model', lambda: build_rollout_model(s),
+        s.route_payoffs, s.roll_tables)
+
+# Everything a rollout needs to know about a player:
+# (bank, start city, target city (-1 = none), home city, engine, RR bitmask,
+#  declared, remaining route as RR ids per hop)
+CompactPlayer = Tuple[int, int, int, int, int, int, bool, Tuple[int, ...]]
+
+@dataclass(frozen=True)
+class CompactGame:
+    players: Tuple[CompactPlayer, ...]
+    config: GameConfig = DEFAULT_CONFIG
+
+    @property
+    def n_players(self) -> int:
+        return len(self.players)
+
+def compact_game(s: GameState, model: RolloutModel) -> CompactGame:
+    players: List[CompactPlayer] = []
+    for ps in s.players:
+        home = model.city_ids[ps.homeCity] if ps.homeCity else 0
+        start = model.city_ids[ps.startCity] if ps.startCity else home
+        if ps.declared:
+            target = home
+        elif ps.destination is not None:
+            target = model.city_ids[ps.destination]
+        else:
+            target = -1
+        route = (model.route_from_point(ps.location, target)
+            if target >= 0 and ps.location >= 0 else ())
+        mask = 0
+        for rr in ps.rr_owned:
+            mask |= 1 << model.rr_ids[rr]
+        players.append((ps.bank, start, target, home, ps.engine.value, mask,
+            ps.declared, route))
+    return CompactGame(tuple(players), s.config)
+
+# Mutable per-rollout copy of a CompactGame
+class RolloutState:
+    def __init__(self, model: RolloutModel, game: CompactGame):
+        self.model = model
+        self.n = game.n_players
+        self.cfg = game.config
+        self.bank = [p[0] for p in game.players]
+        self.start = [p[1] for p in game.players]
+        self.target = [p[2] for p in game.players]
+        self.home = [p[3] for p in game.players]
+        self.engine = [p[4] for p in game.players]
+        self.declared = [p[6] for p in game.players]
+        self.route = [p[7] for p in game.players]
+        self.pos = [0] * self.n
+        self.owner = [-1] * model.n_rr
+        for i, p in enumerate(game.players):
+            for rr_id in range(model.n_rr):
+                if (p[5] >> rr_id) & 1:
+                    self.owner[rr_id] = i
+        self.n_owned = sum(1 for o in self.owner if o >= 0)
+        self.fees_paid = [0] * self.n
+
+    def arrived(self, i: int) -> bool:
+        return self.target[i] >= 0 and self.pos[i] == len(self.route[i])
+
+    def is_winner(self, i: int) -> bool:
+        return (self.declared[i] and self.arrived(i)
+            and self.target[i] == self.home[i] and self.bank[i] >= self.cfg.min_cash_to_win)
+
+    def current_city(self, i: int) -> int:
+        return self.target[i] if self.target[i] >= 0 else self.start[i]
+
+    def set_trip(self, i: int, start: int, target: int):
+        self.start[i], self.target[i] = start, target
+        self.route[i] = self.model.routes[start][target]
+        self.pos[i] = 0
+
+    def declare(self, i: int):
+        self.declared[i] = True
+        self.set_trip(i, self.current_city(i), self.home[i])
+
+    def buy(self, i: int, option: str | None):
+        if option is None:
+            return
+        if option == Engine.Express.name:
+            self.engine[i], cost = _EXPRESS, self.cfg.express_fee
+        elif option == Engine.Superchief.name:
+            self.engine[i], cost = _SUPERCHIEF, self.cfg.superchief_fee
+        else:
+            rr_id = self.model.rr_ids[option]
+            self.owner[rr_id] = i
+            self.n_owned += 1
+            cost = self.model.rr_costs[rr_id]
+        self.bank[i] -= cost
+
+    def sell_to_bank(self, i: int, rr_id: int):
+        self.owner[rr_id] = -1
+        self.n_owned -= 1
+        self.bank[i] += self.model.rr_costs[rr_id] // 2
+
+    # Cover a negative balance by selling RRs to the bank, cheapest first
+    def raise_funds(self, i: int):
+        if self.bank[i] >= 0:
+            return
+        owned = sorted((c, r) for r, (o, c) in
+            enumerate(zip(self.owner, self.model.rr_costs)) if o == i)
+        for _, rr_id in owned:
+            if self.bank[i] >= 0:
+                break
+            self.sell_to_bank(i, rr_id)
+        self.bank[i] = max(0, self.bank[i])
+
+    def check_undeclared(self, i: int):
+        if self.declared[i] and self.bank[i] <= self.cfg.min_cash_to_win:
+            self.declared[i] = False
+
+# Default purchase policy after a payoff, with fee still to pay this turn
+def default_purchase(st: RolloutState, i: int, fee: int) -> str | None:
+    cash = st.bank[i] - fee - ROLLOUT_RESERVE
+    engine = st.engine[i]
+    if engine != _SUPERCHIEF and cash >= st.cfg.superchief_fee:
+        return Engine.Superchief.name
+    if engine == _BASIC and cash >= st.cfg.express_fee:
+        return Engine.Express.name
+    best_cost, best = 0, None
+    for rr_id, (o, c) in enumerate(zip(st.owner, st.model.rr_costs)):
+        if o < 0 and best_cost < c <= cash:
+            best_cost, best = c, st.model.rr_names[rr_id]
+    return best
+
+# Start of turn: declare if the default policy would, and draw a new
+# destination if needed
+def check_destination(st: RolloutState, i: int, rng: Random, allow_declare: bool = True):
+    needs_destination = st.target[i] < 0 or (st.arrived(i) and not st.declared[i])
+    if (allow_declare and needs_destination and st.target[i] >= 0
+            and st.bank[i] >= st.cfg.min_cash_to_win + ROLLOUT_DECLARE_MARGIN):
+        st.declare(i)
+    elif needs_destination:
+        cur = st.current_city(i)
+        st.set_trip(i, cur, st.model.sample_destination(cur, rng))
+
+# Move the rest of player i's turn (after check_destination), paying fees
+# and payoffs, and returns whether they won
+def finish_turn(st: RolloutState, i: int, rng: Random) -> bool:
+    if st.is_winner(i):
+        return True
+    d1, d2 = _die(rng), _die(rng)
+    moves = [d1 + d2]
+    if (st.engine[i] == _SUPERCHIEF
+            or (st.engine[i] == _EXPRESS and d1 == d2)):
+        moves.append(_die(rng))
+    bank_charge = False
+    charged: List[int] = []
+    for move_i, d in enumerate(moves):
+        if move_i > 0:
+            check_destination(st, i, rng)
+        if st.is_winner(i):
+            break
+        route, pos = st.route[i], st.pos[i]
+        end = min(len(route), pos + d)
+        for rr_id in route[pos:end]:
+            o = st.owner[rr_id]
+            if o < 0:
+                bank_charge = True
+            elif o != i and o not in charged:
+                charged.append(o)
+        st.pos[i] = end
+        if st.arrived(i) and not st.declared[i]:
+            st.bank[i] += st.model.payoffs[st.start[i]][st.target[i]]
+            other_fee = st.cfg.other_user_fee * (2 if st.n_owned == st.model.n_rr else 1)
+            fee = (st.cfg.bank_user_fee if bank_charge else 0) + other_fee * len(charged)
+            st.buy(i, default_purchase(st, i, fee))
+        if st.is_winner(i):
+            break
+
+    other_fee = st.cfg.other_user_fee * (2 if st.n_owned == st.model.n_rr else 1)
+    fee = (st.cfg.bank_user_fee if bank_charge else 0) + other_fee * len(charged)
+    st.bank[i] -= fee
+    st.fees_paid[i] += fee
+    for o in charged:
+        st.bank[o] += other_fee
+    st.raise_funds(i)
+    st.check_undeclared(i)
+    return st.is_winner(i)
+
+# Play the game out from st with player_i to move; returns the winner, or -1
+# if nobody wins within max_turns player-turns
+def play_out(st: RolloutState, player_i: int, rng: Random,
+        max_turns: int = MAX_ROLLOUT_TURNS) -> int:
+    for _ in range(max_turns):
+        check_destination(st, player_i, rng)
+        if finish_turn(st, player_i, rng):
+            return player_i
+        player_i = (player_i + 1) % st.n
+    return -1
+
+# Number of rollouts (out of n) won by each player, with draws last
+def count_winners(model: RolloutModel, game: CompactGame, player_i: int,
+        n: int, seed: int) -> List[int]:
+    rng = Random(seed)
+    counts = [0] * (game.n_players + 1)
+    for _ in range(n):
+        counts[play_out(RolloutState(model, game), player_i, rng)] += 1
+    return counts
+
+# Rollouts run on one shared pool of worker processes, each of which builds
+# its own copy of the static tables at startup
+DEFAULT_ROLLOUT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+_worker_model: RolloutModel | None = None
+def _init_worker():
+    global _worker_model
+    _worker_model = build_rollout_model(GameState())
+
+def worker_model() -> RolloutModel:
+    assert _worker_model is not None, "Worker must be initialized"
+    return _worker_model
+
+def worker_count_winners(game: CompactGame, player_i: int, n: int, seed: int) -> List[int]:
+    return count_winners(worker_model(), game, player_i, n, seed)
+
+# Pool initializer for workers that play whole games (tournament matches,
+# surrogate self-play): each reads the map and charts once and reuses them
+# for every game
+_worker_static: GameState | None = None
+def init_game_worker(rules: GameConfig):
+    global _worker_static
+    from pyrailbaron.game.ai import set_quiet_logging # ai imports this module
+    _worker_static = GameState(config=rules)
+    set_quiet_logging(True)
+
+# The worker's static game (None outside a game worker), to pass to run_game
+def worker_static_game() -> GameState | None:
+    return _worker_static
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+def get_rollout_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the game may have planner threads running
+            _pool = ProcessPoolExecutor(DEFAULT_ROLLOUT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker)
+        return _pool
+
+def shutdown_rollout_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+atexit.register(shutdown_rollout_pool)
@@ -0,0 +1,87 @@
+from pyrailbaron.game.state import GameState
+from pyrailbaron.game.constants import REGIONS
+from pyrailbaron.game.charts import roll_table_probabilities
+from pyrailbaron.map.datamodel import Map, derived_data
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Walker alias table: O(n) to build, O(1) per sample. Each slot i keeps
+# outcome i with probability prob[i] and otherwise gives alias[i].
+class AliasTable:
+    def __init__(self, outcomes: np.ndarray, weights: np.ndarray):
+        assert len(outcomes) == len(weights) and len(outcomes) > 0, \
+            "Alias table needs at least one outcome"
+        n = len(weights)
+        scaled = weights.astype(np.float64) * (n / weights.sum())
+        self.outcomes = outcomes
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int32)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Anything left over is 1.0 up to rounding error
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        slots = rng.integers(0, len(self.prob), size=n)
+        keep = rng.random(n) < self.prob[slots]
+        return self.outcomes[np.where(keep, slots, self.alias[slots])]
+
+# Destination draws compiled from the roll tables. A new destination is drawn
+# by rerolling the region until it differs from the start point's region, then
+# rolling on that region's table; this is the same as drawing a point from one
+# combined distribution per start region, which is what the tables hold.
+class DestinationSampler:
+    def __init__(self, m: Map, roll_tables: Dict[str, List[Tuple[str, str]]]):
+        city_pt: Dict[str, int] = {}
+        for pt in m.points:
+            for c in pt.city_names:
+                city_pt[c] = pt.index
+        def lookup(city: str) -> int:
+            if city not in city_pt:
+                city_pt[city] = m.lookup_city(city)[1]
+            return city_pt[city]
+
+        # Point distribution within each region
+        self.region_pts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for region in REGIONS:
+            probs = roll_table_probabilities(roll_tables[region])
+            self.region_pts[region] = (
+                np.array([lookup(c) for c in probs], dtype=np.int32),
+                np.array(list(probs.values()), dtype=np.float64))
+        self.region_probs = roll_table_probabilities(roll_tables['REGION'])
+
+        self._point_region = [pt.region for pt in m.points]
+        self._tables: Dict[str | None, AliasTable] = {}
+        for start_region in REGIONS + [None]:
+            pts, weights = self.dest_distribution(start_region)
+            self._tables[start_region] = AliasTable(pts, weights)
+
+    # Combined destination distribution (points, probabilities) from a start
+    # region; None means no region is excluded
+    def dest_distribution(self, start_region: str | None) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        weights: Dict[int, float] = {}
+        total = sum(p for r, p in self.region_probs.items() if r != start_region)
+        for region, p_region in self.region_probs.items():
+            if region == start_region:
+                continue
+            pts, probs = self.region_pts[region]
+            for pt, p in zip(pts.tolist(), probs.tolist()):
+                weights[pt] = weights.get(pt, 0.0) + p * p_region / total
+        pts = np.array(list(weights.keys()), dtype=np.int32)
+        return pts, np.array(list(weights.values()), dtype=np.float64)
+
+    # n destination point indices for a player starting at start_pt
+    def sample(self, start_pt: int, n: int, rng: np.random.Generator) -> np.ndarray:
+        return self._tables[self._point_region[start_pt]].sample(n, rng)
+
+# The sampler depends on both the map and the roll tables, which are shared
+# between snapshots of the same game
+def get_destination_sampler(s: GameState) -> DestinationSampler:
+    return derived_data(s.map, 'destination_sampler',
+        lambda: DestinationSampler(s.map, s.roll_tables), s.roll_tables)
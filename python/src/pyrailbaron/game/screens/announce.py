@@ -1,5 +1,5 @@
 from pyrailbaron.game.screens.base import PyGameScreen
-from pyrailbaron.game.constants import ROVER_PLAY_FEE, SCREEN_W, SCREEN_H
+from pyrailbaron.game.constants import SCREEN_W, SCREEN_H
 from pyrailbaron.game.moves import get_legal_moves_with_scores
 
 import pygame as pg
@@ -7,6 +7,7 @@ from time import time
 from random import shuffle, randint, choice
 
 from pyrailbaron.game.state import GameState, PlayerState
+from pyrailbaron.game.winprob import WinProbabilityService, WinEstimate
 from typing import Tuple, List
 
 OK_BUTTON_W = 130
@@ -58,11 +59,41 @@ class AnnounceScreen(PyGameScreen):
         return False
 
 ANNOUNCE_TURN_TIME = 3.0
+WIN_PROB_BOUNDS = pg.Rect(SCREEN_W - 250, 120, 240, 220)
 class AnnounceTurnScreen(AnnounceScreen):
-    def __init__(self, screen: pg.surface.Surface, state: GameState, player_i: int):
+    def __init__(self, screen: pg.surface.Surface, state: GameState, player_i: int,
+            win_prob: WinProbabilityService | None = None):
         super().__init__(screen, ANNOUNCE_TURN_TIME)
         self.state = state
         self.player_i = player_i
+        self.win_prob = win_prob
+        self._shown_estimate: WinEstimate | None = None
+
+    # Win chances refine while the screen is up, so redraw them as they change
+    def paint_win_prob(self):
+        est = self.win_prob.estimate() if self.win_prob else None
+        self._shown_estimate = est
+        if est is None:
+            return
+        pg.draw.rect(self.screen, pg.Color(0,0,0), WIN_PROB_BOUNDS, 0)
+        label_t = WIN_PROB_BOUNDS.top
+        _, label_h = self.draw_text('WIN CHANCE', 'Corrigan-ExtraBold', 20,
+            pg.Rect(WIN_PROB_BOUNDS.left,label_t,WIN_PROB_BOUNDS.width,0),
+            pg.Color(255,255,255), center=False)
+        label_t += label_h * 1.25
+        for ps in self.state.players:
+            color = pg.Color(255,255,0) if ps.index == self.player_i else pg.Color(255,255,255)
+            _, label_h = self.draw_text(f'{ps.name} {est.win_pcts[ps.index]:.0f}%',
+                'Corrigan-ExtraBold', 25,
+                pg.Rect(WIN_PROB_BOUNDS.left,label_t,WIN_PROB_BOUNDS.width,0),
+                color, center=False)
+            label_t += label_h * 1.25
+
+    def animate(self) -> bool:
+        if self.win_prob and self.win_prob.estimate() is not self._shown_estimate:
+            self.paint_win_prob()
+            pg.display.update(WIN_PROB_BOUNDS)
+        return super().animate()
 
     def paint(self):
         ps = self.state.players[self.player_i]
@@ -74,31 +105,33 @@ class AnnounceTurnScreen(AnnounceScreen):
 
         label_l = 100
         label_t = 120
+        label_w = (WIN_PROB_BOUNDS.left if self.win_prob else SCREEN_W) - label_l
         _, label_h = self.draw_text('LOCATION', 'Corrigan-ExtraBold', 20,
-            pg.Rect(label_l,label_t,SCREEN_W-label_l,0), pg.Color(255,255,255),
+            pg.Rect(label_l,label_t,label_w,0), pg.Color(255,255,255),
             center=False)
         label_t += label_h * 1.25
         _, label_h = self.draw_text(loc_n, 'Corrigan-ExtraBold', 50,
-            pg.Rect(label_l,label_t,SCREEN_W-label_l,0), pg.Color(255,255,255),
+            pg.Rect(label_l,label_t,label_w,0), pg.Color(255,255,255),
             center=False)
         label_t += label_h * 1.25 + 20
         _, label_h = self.draw_text('DESTINATION', 'Corrigan-ExtraBold', 20,
-            pg.Rect(label_l,label_t,SCREEN_W-label_l,0), pg.Color(255,255,255),
+            pg.Rect(label_l,label_t,label_w,0), pg.Color(255,255,255),
             center=False)
         label_t += label_h * 1.25
         _, label_h = self.draw_text(dest_n, 'Corrigan-ExtraBold', 50,
-            pg.Rect(label_l,label_t,SCREEN_W-label_l,0), pg.Color(255,255,255),
+            pg.Rect(label_l,label_t,label_w,0), pg.Color(255,255,255),
             center=False)
         label_t += label_h * 1.25 + 20
         _, label_h = self.draw_text(ps.engine.name.upper(), 'Corrigan-ExtraBold', 35,
-            pg.Rect(label_l,label_t,SCREEN_W-label_l,0), pg.Color(255,255,255),
+            pg.Rect(label_l,label_t,label_w,0), pg.Color(255,255,255),
             center=False)
         label_t += label_h * 1.25
         if ps.declared:
             _, label_h = self.draw_text('CURRENTLY DECLARED', 'Corrigan-ExtraBold', 35,
-                pg.Rect(label_l,label_t,SCREEN_W-label_l,0), pg.Color(255,255,0),
+                pg.Rect(label_l,label_t,label_w,0), pg.Color(255,255,0),
                 center=False)
             label_t += label_h * 1.25
+        self.paint_win_prob()
 
 ANNOUNCE_ARRIVAL_TIME = 2.0
 class AnnounceArrivalScreen(AnnounceScreen):
@@ -127,7 +160,7 @@ class AnnouncePayoffScreen(AnnounceScreen):
         ps = self.state.players[self.player_i]
         assert ps.startCity, "Must know start city"
         assert ps.destination, "Must know destination"
-        return self.state.route_payoffs[ps.startCity][ps.destination]
+        return self.state.get_route_payoff(ps.startCity, ps.destination)
 
     @property
     def fees_paid(self) -> int:
@@ -278,11 +311,12 @@ class AnnounceUndeclaredScreen(AnnounceScreen):
 
 ANNOUNCE_ROVER_TIME = 4.0
 class AnnounceRoverScreen(AnnounceScreen):
-    def __init__(self, screen: pg.surface.Surface, 
+    def __init__(self, screen: pg.surface.Surface, s: GameState,
             decl_player_name: str, rover_player_name: str,
             loc_name: str):
         super().__init__(screen, ANNOUNCE_UNDECLARED_TIME)
-        self.msg = f'ROVER PLAY\nin {loc_name}!\n\n{decl_player_name} PAYS {rover_player_name}\n{ROVER_PLAY_FEE} AND BECOMES\n UNDECLARED'
+        self.state = s
+        self.msg = f'ROVER PLAY\nin {loc_name}!\n\n{decl_player_name} PAYS {rover_player_name}\n{s.config.rover_play_fee} AND BECOMES\n UNDECLARED'
 
     def paint(self):
         self.screen.fill(pg.Color(255,255,0))
@@ -334,7 +368,7 @@ if __name__ == '__main__':
         AnnounceShortfallScreen(test_s, names[0],
             randint(10,20)*500, rrs, randint(10,20)*500).run()
         AnnounceUndeclaredScreen(test_s, names[0]).run()
-        AnnounceRoverScreen(test_s, names[0], names[1], choice(s.map.points).display_name).run()
+        AnnounceRoverScreen(test_s, s, names[0], names[1], choice(s.map.points).display_name).run()
         AnnounceSaleScreen(test_s, names[0], 'CMSTP&P', names[1], 12500).run()
         AnnounceTurnScreen(test_s, s, 0).run()
         AnnounceArrivalScreen(test_s, dest_city).run()
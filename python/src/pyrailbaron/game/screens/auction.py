@@ -1,5 +1,6 @@
-from pyrailbaron.game.constants import MIN_BID_INCR, SCREEN_W, SCREEN_H
+from pyrailbaron.game.constants import SCREEN_W, SCREEN_H
 from pyrailbaron.game.screens.base import PyGameScreen
+from pyrailbaron.game.state import GameState
 
 from enum import Enum, auto
 
@@ -32,9 +33,10 @@ TOP_LABEL_W = SCREEN_W - 2 * TOP_LABEL_M
 BTN_TEXT_M = 5
 
 class AuctionScreen(PyGameScreen):
-    def __init__(self, screen: pg.surface.Surface, player_name: str, rr_name: str, min_bid: int, bank: int):
+    def __init__(self, screen: pg.surface.Surface, s: GameState, player_name: str, rr_name: str, min_bid: int, bank: int):
         super().__init__(screen)
         assert bank >= min_bid, "Can only ask for bids if bank >= min"
+        self.state = s
         self.player_name = player_name
         self.rr_name = rr_name
         self.min_bid = min_bid
@@ -59,10 +61,10 @@ class AuctionScreen(PyGameScreen):
         self._pass = True
 
     def more(self):
-        self._bid = min(self.bid + MIN_BID_INCR, self.bank)
+        self._bid = min(self.bid + self.state.config.min_bid_incr, self.bank)
 
     def less(self):
-        self._bid = max(self.min_bid, self.bid - MIN_BID_INCR)
+        self._bid = max(self.min_bid, self.bid - self.state.config.min_bid_incr)
 
     def draw_button(self, label: str, bounds: pg.Rect):
         font_size = 120
@@ -119,6 +121,6 @@ if __name__ == '__main__':
     pg.init()
     test_s = pg.display.set_mode((SCREEN_W, SCREEN_H))
     while True:
-        auct = AuctionScreen(test_s, 'TEST', 'CMSTP&P', 10000, 20000)
+        auct = AuctionScreen(test_s, GameState(), 'TEST', 'CMSTP&P', 10000, 20000)
         auct.run()
         print(auct.bid)
\ No newline at end of file
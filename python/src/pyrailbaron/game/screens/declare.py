@@ -1,5 +1,5 @@
 from pyrailbaron.game.screens.base import PyGameScreen
-from pyrailbaron.game.constants import SCREEN_W, SCREEN_H, MIN_CASH_TO_WIN
+from pyrailbaron.game.constants import SCREEN_W, SCREEN_H
 
 import pygame as pg
 from pyrailbaron.game.state import GameState
@@ -43,8 +43,9 @@ DECLARE_BTN_B = pg.Rect(DECLARE_BTN_L, BUTTON_T, BUTTON_W, BUTTON_H)
 WAIT_BTN_B = pg.Rect(WAIT_BTN_L, BUTTON_T, BUTTON_W, BUTTON_H)
 
 class DeclareScreen(PyGameScreen):
-    def __init__(self, screen: pg.surface.Surface, player_name: str, home_city: str):
+    def __init__(self, screen: pg.surface.Surface, s: GameState, player_name: str, home_city: str):
         super().__init__(screen)
+        self.state = s
         self.player_name = player_name
         self.home_city = home_city
         self._declare = False
@@ -66,7 +67,7 @@ class DeclareScreen(PyGameScreen):
         self.screen.fill(pg.Color(0,0,0))
         self.draw_text(f'{self.player_name}, READY FOR YOUR FINAL TRIP?',
             LABEL_FONT, TOP_LABEL_FONT_SIZE, TOP_LABEL_B, TOP_LABEL_C)
-        self.draw_text(f'Return to {self.home_city}\nwith {MIN_CASH_TO_WIN} to win!',
+        self.draw_text(f'Return to {self.home_city}\nwith {self.state.config.min_cash_to_win} to win!',
             LABEL_FONT, MID_LABEL_FONT_SIZE, MID_LABEL_B, MID_LABEL_C)
         if init:
             self.buttons.clear()
@@ -82,6 +83,6 @@ if __name__ == '__main__':
         region = s.random_lookup('REGION')
         city = s.random_lookup(region)
         city, _ = s.map.lookup_city(city)
-        dec_screen = DeclareScreen(test_s, 'TEST', city.replace("_",""))
+        dec_screen = DeclareScreen(test_s, s, 'TEST', city.replace("_",""))
         dec_screen.run()
         print(dec_screen.declare)
\ No newline at end of file
@@ -2,6 +2,7 @@ from pathlib import Path
 import pygame as pg
 from pyrailbaron.game.screens.base import PyGameScreen
 from pyrailbaron.map.bfs import points_within
+from pyrailbaron.map.hierarchy import get_hop_index
 
 from pyrailbaron.map.datamodel import (
     Coordinate, Map, Waypoint, make_rail_seg, rail_segs_from_wps)
@@ -107,9 +108,10 @@ def optimize_map_window(m: Map, size: Tuple[int, int],
         # reachable this turn (plus this turn's history)
         reachable_pts = points_within(m, start_pt, dest_pt, history, d)
         curr_pt = start_pt if len(history) == 0 else history[-1][1]
-        curr_dist = m.gc_distance(curr_pt, dest_pt)
+        hops = get_hop_index(m).base
+        curr_dist = hops.distance(curr_pt, dest_pt)
         closer_pts = set(filter(
-            lambda p: m.gc_distance(p, dest_pt) < curr_dist, reachable_pts))
+            lambda p: 0 <= hops.distance(p, dest_pt) < curr_dist, reachable_pts))
         pts_to_show = closer_pts.union([curr_pt] 
             + [p for _,p in turn_history + next_points])
         calculate_window()
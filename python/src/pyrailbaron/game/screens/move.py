@@ -2,7 +2,8 @@ from pyrailbaron.game.screens.base import PyGameScreen
 from pyrailbaron.game.state import GameState, PlayerState
 from pyrailbaron.map.datamodel import Waypoint
 from pyrailbaron.game.constants import SCREEN_W, SCREEN_H
-from pyrailbaron.game.moves import calculate_legal_moves, get_legal_moves_with_scores, MoveReport
+from pyrailbaron.game.moves import (calculate_legal_moves, get_legal_moves_with_scores,
+    TurnFrontier, MoveReport)
 from pyrailbaron.game.fees import calculate_user_fees
 from pyrailbaron.game.screens.map import draw_map
 
@@ -11,6 +12,7 @@ from enum import Enum, auto
 import pygame as pg
 from typing import List
 from time import time
+from threading import Thread
 
 FORCED_MOVE_TIME = 1.0
 
@@ -79,6 +81,11 @@ class MoveScreen(PyGameScreen):
         self.selected_moves: List[Waypoint] = []
         self._options: List[MoveReport] = []
         self._mark = time()
+        # The full-turn frontier can take a second or more for a big roll, so
+        # it's built in the background; until it's ready each hop is scored
+        # on its own
+        self._frontier: TurnFrontier | None = None
+        Thread(target=self.build_frontier, daemon=True).start()
         self.calculate_options()
         self._finished = False
         self._current_selection = 0
@@ -118,7 +125,7 @@ class MoveScreen(PyGameScreen):
         player_rr = [p.rr_owned for p in self.state.players]
         fees, _ = calculate_user_fees(self.state.map, self.player_i,
             self.turn_history, player_rr, self.init_rr, self.established_rate,
-            self.state.doubleFees)
+            self.state.doubleFees, self.state.config)
         return -fees[self.player_i]
 
     def draw_progress(self):
@@ -162,16 +169,25 @@ class MoveScreen(PyGameScreen):
 
         self.screen.blit(prog_surf, (0, PROGRESS_T))
 
-    def calculate_options(self):
-        m = self.state.map
-        ps = self.state.players[self.player_i]
-        moves_this_turn = self.moves_so_far + len(self.selected_moves)
+    def build_frontier(self):
         player_rr = [p.rr_owned for p in self.state.players]
-        self._options = get_legal_moves_with_scores(m, self.player.startCityIndex,
-            self.player.history + self.selected_moves, 
-            ps.destinationIndex, ps.rover_play_index, moves_this_turn,
-            player_rr, self.player_i, self.init_rr, self.established_rate,
-            self.state.doubleFees)
+        self._frontier = TurnFrontier(self.state.map, self.player.startCityIndex,
+            self.player.history, self.dest_index, self.player.rover_play_index,
+            self.distance, self.moves_so_far, player_rr, self.player_i,
+            self.init_rr, self.established_rate, self.state.doubleFees,
+            self.state.config)
+
+    def calculate_options(self):
+        if self._frontier is not None:
+            self._options = self._frontier.options_after(self.selected_moves)
+        else:
+            player_rr = [p.rr_owned for p in self.state.players]
+            self._options = get_legal_moves_with_scores(self.state.map,
+                self.player.startCityIndex, self.player.history + self.selected_moves,
+                self.dest_index, self.player.rover_play_index,
+                self.moves_so_far + len(self.selected_moves), player_rr,
+                self.player_i, self.init_rr, self.established_rate,
+                self.state.doubleFees, self.state.config)
         self._current_selection = 0
         self._mark = time()
 
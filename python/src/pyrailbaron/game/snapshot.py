@@ -0,0 +1,215 @@
+from pyrailbaron.game.state import GameState, PlayerState, Engine
+from pyrailbaron.game.config import GameConfig
+from pyrailbaron.map.datamodel import (Map, Waypoint, RailSegment, make_rail_seg,
+    derived_data)
+from pyrailbaron.map.summary import get_rr_ids, get_rr_names
+from dataclasses import dataclass, replace
+from typing import Dict, List, Tuple, Iterator
+
+# Immutable snapshots of the parts of the game the AI looks ahead over. A
+# GameSnapshot is never changed in place, so "forking" one is free; each
+# change returns a new snapshot that shares every player record it didn't
+# touch, and every snapshot of a game shares one BoardContext with the map
+# and charts. Histories are persistent linked lists with a bitset of used
+# rail segments, so a move copies neither.
+
+def get_segment_ids(m: Map) -> Dict[RailSegment, int]:
+    def build() -> Dict[RailSegment, int]:
+        segs: Dict[RailSegment, int] = {}
+        for p in m.points:
+            for rr, pts in p.connections.items():
+                for q in pts:
+                    rs = make_rail_seg(rr, p.index, q)
+                    if rs not in segs:
+                        segs[rs] = len(segs)
+        return segs
+    return derived_data(m, 'segment_ids', build)
+
+# Static data shared by every snapshot of a game
+@dataclass(frozen=True)
+class BoardContext:
+    map: Map
+    route_payoffs: Dict[str, Dict[str, int]]
+    roll_tables: Dict[str, List[Tuple[str, str]]]
+    config: GameConfig
+    player_names: Tuple[str, ...]
+    seg_ids: Dict[RailSegment, int]
+    rr_ids: Dict[str, int]
+    rr_names: List[str]
+
+# Persistent list of waypoints, newest first
+@dataclass(frozen=True)
+class History:
+    wp: Waypoint
+    prev: 'History | None'
+    length: int
+
+def iter_history(h: History | None) -> Iterator[Waypoint]:
+    wps: List[Waypoint] = []
+    while h is not None:
+        wps.append(h.wp)
+        h = h.prev
+    return reversed(wps)
+
+@dataclass(frozen=True)
+class PlayerSnapshot:
+    bank: int
+    start_pt: int
+    dest_pt: int        # Trip destination (-1 = none yet), even when declared
+    home_pt: int
+    history: History | None
+    used_segs: int      # Bitset of segment ids used this trip
+    rr_mask: int        # Bitset of railroad ids owned
+    engine: Engine
+    rr: str | None
+    established_rate: int | None
+    declared: bool
+    rover_play_index: int
+
+    @property
+    def location(self) -> int:
+        return self.history.wp[1] if self.history else self.start_pt
+
+    @property
+    def destinationIndex(self) -> int:
+        return self.home_pt if self.declared else self.dest_pt
+
+    @property
+    def atDestination(self) -> bool:
+        return self.dest_pt >= 0 and self.dest_pt == self.location
+
+    @property
+    def atHomeCity(self) -> bool:
+        return self.home_pt == self.location
+
+    def history_list(self) -> List[Waypoint]:
+        return list(iter_history(self.history))
+
+@dataclass(frozen=True)
+class GameSnapshot:
+    ctx: BoardContext
+    players: Tuple[PlayerSnapshot, ...]
+
+    def fork(self) -> 'GameSnapshot':
+        return self
+
+    def update_player(self, player_i: int, **changes) -> 'GameSnapshot':
+        players = list(self.players)
+        players[player_i] = replace(players[player_i], **changes)
+        return GameSnapshot(self.ctx, tuple(players))
+
+    def owners(self) -> List[int]:
+        owners = [-1] * len(self.ctx.rr_names)
+        for i, ps in enumerate(self.players):
+            for rr_id in range(len(owners)):
+                if (ps.rr_mask >> rr_id) & 1:
+                    owners[rr_id] = i
+        return owners
+
+    def player_rr(self) -> List[List[str]]:
+        return [[rr for rr_id, rr in enumerate(self.ctx.rr_names)
+            if (ps.rr_mask >> rr_id) & 1] for ps in self.players]
+
+    @property
+    def doubleFees(self) -> bool:
+        owned = 0
+        for ps in self.players:
+            owned |= ps.rr_mask
+        return owned == (1 << len(self.ctx.rr_names)) - 1
+
+    def move(self, player_i: int, waypoints: List[Waypoint]) -> 'GameSnapshot':
+        assert len(waypoints) > 0, "Move must contain at least one waypoint"
+        ps = self.players[player_i]
+        m = self.ctx.map
+        curr_pt = ps.location
+        history, used = ps.history, ps.used_segs
+        for rr, next_pt in waypoints:
+            assert next_pt in m.points[curr_pt].connections.get(rr, []), \
+                f"Can't take {rr} from {curr_pt} to {next_pt}"
+            bit = 1 << self.ctx.seg_ids[make_rail_seg(rr, curr_pt, next_pt)]
+            assert ps.rover_play_index >= 0 or not (used & bit), \
+                "Can only reuse rail segs after a rover play"
+            used |= bit
+            history = History((rr, next_pt), history,
+                history.length + 1 if history else 1)
+            curr_pt = next_pt
+        return self.update_player(player_i, history=history, used_segs=used,
+            rr=waypoints[-1][0])
+
+    def apply_bank_deltas(self, bank_deltas: List[int]) -> 'GameSnapshot':
+        players = tuple(replace(ps, bank=ps.bank + d) if d != 0 else ps
+            for ps, d in zip(self.players, bank_deltas))
+        return GameSnapshot(self.ctx, players)
+
+    # Move rr from one player to another (-1 = bank) for price
+    def transfer_rr(self, rr: str, from_i: int, to_i: int, price: int = 0) -> 'GameSnapshot':
+        bit = 1 << self.ctx.rr_ids[rr]
+        deltas = [0] * len(self.players)
+        snap = self
+        if from_i >= 0:
+            assert snap.players[from_i].rr_mask & bit, "Must own RR to sell it"
+            snap = snap.update_player(from_i, rr_mask=snap.players[from_i].rr_mask & ~bit)
+            deltas[from_i] += price
+        if to_i >= 0:
+            snap = snap.update_player(to_i, rr_mask=snap.players[to_i].rr_mask | bit)
+            deltas[to_i] -= price
+        return snap.apply_bank_deltas(deltas)
+
+    def set_engine(self, player_i: int, engine: Engine, price: int = 0) -> 'GameSnapshot':
+        ps = self.players[player_i]
+        return self.update_player(player_i, engine=engine, bank=ps.bank - price)
+
+    def declare(self, player_i: int) -> 'GameSnapshot':
+        return self.update_player(player_i, declared=True)
+
+    # Start a new trip from the current destination
+    def set_destination(self, player_i: int, dest_pt: int) -> 'GameSnapshot':
+        ps = self.players[player_i]
+        start_pt = ps.dest_pt if ps.dest_pt >= 0 else ps.start_pt
+        return self.update_player(player_i, start_pt=start_pt, dest_pt=dest_pt,
+            history=None, used_segs=0, rover_play_index=-1)
+
+    # Full GameState for code that needs one (e.g. the move planners).
+    # Snapshots don't track statistics, so those start from zero, and cities
+    # with more than one name (which pay the same) get their first name.
+    def to_state(self) -> GameState:
+        ctx = self.ctx
+        m = ctx.map
+        def city(pt: int) -> str | None:
+            return m.points[pt].city_names[0] if pt >= 0 else None
+        players: List[PlayerState] = []
+        for i, ps in enumerate(self.players):
+            players.append(PlayerState(index=i, name=ctx.player_names[i],
+                _homeCity=city(ps.home_pt), _homeCityIndex=ps.home_pt,
+                _startCity=city(ps.start_pt), _startCityIndex=ps.start_pt,
+                _destination=city(ps.dest_pt), _destinationIndex=ps.dest_pt,
+                bank=ps.bank, engine=ps.engine, rr=ps.rr,
+                established_rate=ps.established_rate,
+                rr_owned=[rr for rr_id, rr in enumerate(ctx.rr_names)
+                    if (ps.rr_mask >> rr_id) & 1],
+                history=ps.history_list(), declared=ps.declared,
+                rover_play_index=ps.rover_play_index))
+        return GameState(map=m, route_payoffs=ctx.route_payoffs,
+            roll_tables=ctx.roll_tables, players=players, config=ctx.config)
+
+def snapshot_game(s: GameState) -> GameSnapshot:
+    ctx = BoardContext(s.map, s.route_payoffs, s.roll_tables, s.config,
+        tuple(ps.name for ps in s.players), get_segment_ids(s.map),
+        get_rr_ids(s.map), get_rr_names(s.map))
+    players: List[PlayerSnapshot] = []
+    for ps in s.players:
+        history: History | None = None
+        used = 0
+        curr_pt = ps.startCityIndex
+        for rr, pt in ps.history:
+            history = History((rr, pt), history, history.length + 1 if history else 1)
+            used |= 1 << ctx.seg_ids[make_rail_seg(rr, curr_pt, pt)]
+            curr_pt = pt
+        rr_mask = 0
+        for rr in ps.rr_owned:
+            rr_mask |= 1 << ctx.rr_ids[rr]
+        players.append(PlayerSnapshot(ps.bank, ps.startCityIndex,
+            ps._destinationIndex, ps.homeCityIndex, history, used, rr_mask,
+            ps.engine, ps.rr, ps.established_rate, ps.declared,
+            ps.rover_play_index))
+    return GameSnapshot(ctx, tuple(players))
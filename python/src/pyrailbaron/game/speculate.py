@@ -0,0 +1,148 @@
+from pyrailbaron.game.ai import plan_turn_moves, set_quiet_logging, ai_log
+from pyrailbaron.game.state import Engine, GameState
+from pyrailbaron.game.snapshot import snapshot_game
+from pyrailbaron.map.datamodel import Waypoint
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
+from typing import List, Dict, Tuple
+from hashlib import sha1
+from threading import Event
+import json
+
+# While the dice are rolling for a CPU player, plan its move for every roll it
+# could get (and the bonus roll after each roll that can come with one) on a
+# background thread. Plans are keyed by a hash of everything the planner looks
+# at, so a plan is only used if the state hasn't changed since it was made.
+# Once the dice are known, the work for every other roll is dropped.
+
+ROLL_ORDER = [7, 6, 8, 5, 9, 4, 10, 3, 11, 2, 12] # Most likely first
+BONUS_ROLLS = range(1, 7)
+
+def planning_state_key(s: GameState, player_i: int, d: int,
+        init_rr: str | None, moves_so_far: int) -> str:
+    ps = s.players[player_i]
+    data = {
+        'player_i': player_i, 'd': d, 'init_rr': init_rr,
+        'moves_so_far': moves_so_far, 'doubleFees': s.doubleFees,
+        'start': ps.startCityIndex, 'dest': ps.destinationIndex,
+        'history': ps.history, 'rr': ps.rr, 'rate': ps.established_rate,
+        'engine': ps.engine.name, 'rover': ps.rover_play_index,
+        'players': [(p.location, p.declared, sorted(p.rr_owned))
+            for p in s.players]}
+    return sha1(json.dumps(data).encode('utf-8')).hexdigest()
+
+# Copy of the state for the worker to plan on; the static map/tables are shared
+def snapshot_state(s: GameState) -> GameState:
+    return snapshot_game(s).to_state()
+
+class SpeculativePlanner:
+    def __init__(self, time_budget: float | None = None):
+        self.time_budget = time_budget
+        self._executor = ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix='speculate')
+        self._first: Dict[str, Tuple[int, Future[List[Waypoint]]]] = {}
+        self._bonus: Dict[int, Tuple[Event, Future[Dict[str, List[Waypoint]]]]] = {}
+        self._rolled = -1
+
+    def _plan(self, s: GameState, player_i: int, d: int, init_rr: str | None,
+            moves_so_far: int) -> List[Waypoint]:
+        set_quiet_logging(True)
+        return plan_turn_moves(s, player_i, d, init_rr, moves_so_far,
+            self.time_budget)
+
+    # Plans for each bonus roll after first moving along first_moves, until
+    # stop is set
+    def _plan_bonus(self, s: GameState, player_i: int, init_rr: str | None,
+            first: Future[List[Waypoint]], stop: Event) -> Dict[str, List[Waypoint]]:
+        first_moves = first.result()
+        s = snapshot_game(s).move(player_i, first_moves).to_state()
+        ps = s.players[player_i]
+        plans: Dict[str, List[Waypoint]] = {}
+        if ps.atDestination:
+            return plans # Next destination isn't known yet
+        for b in BONUS_ROLLS:
+            if stop.is_set():
+                break
+            key = planning_state_key(s, player_i, b, init_rr, len(first_moves))
+            plans[key] = self._plan(s, player_i, b, init_rr, len(first_moves))
+        return plans
+
+    def _drop_bonus(self, d: int):
+        stop, f = self._bonus.pop(d)
+        stop.set()
+        f.cancel()
+
+    def cancel(self):
+        for _, f in self._first.values():
+            f.cancel()
+        for d in list(self._bonus):
+            self._drop_bonus(d)
+        self._first.clear()
+        self._bonus.clear()
+        self._rolled = -1
+
+    # Start planning for player_i's roll; call before the dice are rolled
+    def start_turn(self, s: GameState, player_i: int):
+        self.cancel()
+        ps = s.players[player_i]
+        if ps.destinationIndex < 0 or ps.atDestination:
+            return
+        snap = snapshot_state(s)
+        init_rr = ps.rr
+        for d in ROLL_ORDER:
+            key = planning_state_key(s, player_i, d, init_rr, 0)
+            self._first[key] = (d, self._executor.submit(
+                self._plan, snap, player_i, d, init_rr, 0))
+        if ps.engine != Engine.Basic:
+            for key, (d, first) in self._first.items():
+                # Express engines only get a bonus roll on doubles, which
+                # only even totals can be; dice_rolled drops the plan if the
+                # total comes up any other way
+                if ps.engine == Engine.Superchief or d % 2 == 0:
+                    stop = Event()
+                    self._bonus[d] = (stop, self._executor.submit(
+                        self._plan_bonus, snap, player_i, init_rr, first, stop))
+
+    # The dice came up d1, d2: stop planning for the other rolls, and for the
+    # bonus roll if this roll doesn't get one
+    def dice_rolled(self, s: GameState, player_i: int, d1: int, d2: int):
+        d = d1 + d2
+        for other_d, f in self._first.values():
+            if other_d != d:
+                f.cancel()
+        bonus = s.players[player_i].check_bonus_roll(d1, d2)
+        for other_d in list(self._bonus):
+            if other_d != d or not bonus:
+                self._drop_bonus(other_d)
+
+    # Returns the speculative plan for this roll, or None if there isn't one
+    def lookup(self, s: GameState, player_i: int, d: int, init_rr: str | None,
+            moves_so_far: int) -> List[Waypoint] | None:
+        key = planning_state_key(s, player_i, d, init_rr, moves_so_far)
+        try:
+            if moves_so_far == 0 and key in self._first:
+                rolled, first = self._first[key]
+                self._rolled = rolled
+                # The other rolls didn't happen, so stop planning for them
+                for other_d, f in self._first.values():
+                    if other_d != rolled:
+                        f.cancel()
+                for other_d in list(self._bonus):
+                    if other_d != rolled:
+                        self._drop_bonus(other_d)
+                plan = first.result()
+            elif moves_so_far > 0 and self._rolled in self._bonus:
+                plan = self._bonus[self._rolled][1].result().get(key)
+            else:
+                plan = None
+        except CancelledError:
+            plan = None
+        except Exception as e:
+            ai_log(f'Speculative planning failed ({e})')
+            plan = None
+        if plan is not None:
+            ai_log('Using speculative plan')
+        return plan
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
@@ -7,10 +7,13 @@ from typing import List, Dict, Tuple, Optional
 from enum import Enum
 
 from pyrailbaron.game.constants import *
-from pyrailbaron.map.datamodel import make_rail_seg, rail_segs_from_wps, read_map, Map, Waypoint
-from pyrailbaron.game.charts import read_route_payoffs, read_roll_tables
+from pyrailbaron.map.datamodel import make_rail_seg, rail_segs_from_wps, read_map, Map, Waypoint, derived_data
+from pyrailbaron.game.charts import read_route_payoffs, read_roll_tables, roll_table_probabilities
+from pyrailbaron.game.payoffs import PayoffTable
+from pyrailbaron.game.config import GameConfig
+from pyrailbaron.game.ledger import Account, Ledger, Reason
 
-from random import randint
+from random import randint, Random
 
 class Engine(Enum):
     Basic = 0
@@ -88,9 +91,8 @@ class PlayerState:
         self._destinationIndex = dest_i
         self.history.clear()
         self.trip_turns = 0
-        self.trip_fees_paid = 0
-        self.trip_fees_received = 0
         self.trip_miles = 0.0
+        self.account.start_trip()
         self.rover_play_index = -1
 
     bank: int = 0
@@ -102,10 +104,8 @@ class PlayerState:
         # List of rail lines (i.e. rr + pt) used this trip
     declared: bool = False
 
-    # Game statistics
-    total_fees_paid: int = 0
-    total_fees_received: int = 0
-    total_route_payoffs: int = 0
+    # Game statistics (money totals are views of the account, see ledger.py)
+    account: Account = field(default_factory=Account)
     total_miles: float = 0.0
     rover_play_wins: int = 0
     rover_play_losses: int = 0
@@ -114,22 +114,27 @@ class PlayerState:
 
     # Current trip statistics
     trip_turns: int = 0
-    trip_fees_paid: int = 0
-    trip_fees_received: int = 0
     rover_play_index: int = -1
     trip_miles: float = 0.0
+
+    @property
+    def total_fees_paid(self) -> int:
+        return self.account.debited(Reason.UserFee)
+    @property
+    def total_fees_received(self) -> int:
+        return self.account.credited(Reason.UserFee)
+    @property
+    def total_route_payoffs(self) -> int:
+        return self.account.credited(Reason.RoutePayoff)
+    @property
+    def trip_fees_paid(self) -> int:
+        return self.account.debited(Reason.UserFee, trip=True)
+    @property
+    def trip_fees_received(self) -> int:
+        return self.account.credited(Reason.UserFee, trip=True)
+
     def record_turn_start(self):
         self.trip_turns += 1
-    def record_user_fees(self, bank_deltas: List[int]):
-        fee = bank_deltas[self.index]
-        if fee > 0:
-            self.total_fees_received += fee
-            self.trip_fees_received += fee
-        else:
-            self.total_fees_paid -= fee
-            self.trip_fees_paid -= fee
-    def record_route_payoff(self, payoff: int):
-        self.total_route_payoffs += payoff
     def record_rover_play(self, winner: bool, rover_play_index: int):
         if winner:
             self.rover_play_wins += 1
@@ -217,6 +222,8 @@ class GameState:
     route_payoffs: Dict[str, Dict[str, int]] = field(default_factory=read_route_payoffs)
     roll_tables: Dict[str, List[Tuple[str, str]]] = field(default_factory=read_roll_tables)
     players: List[PlayerState] = field(default_factory=list)
+    config: GameConfig = field(default_factory=GameConfig)
+    ledger: Ledger = field(default_factory=Ledger)
 
     def set_player_home_city(self, player_i: int, hc: str):
         hc, hc_i = self.map.lookup_city(hc)
@@ -241,12 +248,18 @@ class GameState:
         return True
 
     def get_roll_table_probabilities(self, table: str) -> Dict[str, float]:
-        probs: Dict[str, float] = {}
-        for i, (odd, even) in enumerate(self.roll_tables[table]):
-            p: float = (6 - abs(i - 5)) / 36  # i = 5 -> d = 7 -> most common
-            probs[odd] = probs.get(odd, 0.0) + p/2
-            probs[even] = probs.get(even, 0.0) + p/2
-        return probs
+        return derived_data(self.map, f'roll_probs_{table}',
+            lambda: roll_table_probabilities(self.roll_tables[table]), self.roll_tables)
+
+    # Payoff matrix and expected payoffs, built once for the chart data
+    @property
+    def payoff_table(self) -> PayoffTable:
+        return derived_data(self.map, 'payoff_table',
+            lambda: PayoffTable(self.map, self.route_payoffs, self.roll_tables),
+            self.route_payoffs, self.roll_tables)
+
+    def get_route_payoff(self, start_city: str, dest_city: str) -> int:
+        return self.payoff_table.payoff(start_city, dest_city)
 
     def lookup_roll_table(self, table: str, d1: int, d2: int, d3: int) -> str:
         for d in [d1, d2, d3]:
@@ -254,17 +267,19 @@ class GameState:
         odd, even = self.roll_tables[table][d1 + d2 - 2]
         return even if d3 % 2 == 0 else odd
 
-    def random_lookup(self, table: str) -> str:
+    def random_lookup(self, table: str, rng: Random | None = None) -> str:
+        roll = rng.randint if rng else randint
         return self.lookup_roll_table(table, 
-            randint(1,6), randint(1,6), randint(1,6))
+            roll(1,6), roll(1,6), roll(1,6))
 
     def get_player_purchase_opts(self, player_i: int, sort: bool = False) -> List[Tuple[str, int]]:
         ps = self.players[player_i]
         options: List[Tuple[str, int]] = []
-        if ps.engine == Engine.Basic and ps.bank >= EXPRESS_FEE:
-            options.append((Engine.Express.name, EXPRESS_FEE))
-        if ps.engine != Engine.Superchief and ps.bank >= SUPERCHIEF_FEE:
-            options.append((Engine.Superchief.name, SUPERCHIEF_FEE))
+        express_fee, superchief_fee = self.config.express_fee, self.config.superchief_fee
+        if ps.engine == Engine.Basic and ps.bank >= express_fee:
+            options.append((Engine.Express.name, express_fee))
+        if ps.engine != Engine.Superchief and ps.bank >= superchief_fee:
+            options.append((Engine.Superchief.name, superchief_fee))
         for rr, rr_data in self.map.railroads.items():
             if self.get_owner(rr) == -1 and ps.bank >= rr_data.cost:
                 options.append((rr, rr_data.cost))
@@ -280,16 +295,4 @@ class GameState:
         return opts
 
     def get_expected_region_payoffs(self, start_city: str) -> Dict[str, int]:
-        payoffs: Dict[str, int] = {}
-        for region in REGIONS:
-            city_probs = self.get_roll_table_probabilities(region)
-            sum_payoff: float = 0.0
-            sum_prob: float = 0.0
-            for dest_city, dest_prob in city_probs.items():
-                dest_city, _ = self.map.lookup_city(dest_city)
-                if dest_city == start_city:
-                    continue
-                sum_payoff += dest_prob * self.route_payoffs[start_city][dest_city]
-                sum_prob += dest_prob
-            payoffs[region] = round((sum_payoff / sum_prob) / 500) * 500
-        return payoffs
\ No newline at end of file
+        return self.payoff_table.expected_region_payoffs(start_city)
\ No newline at end of file
@@ -0,0 +1,206 @@
+from pyrailbaron.game.constants import REGIONS
+from pyrailbaron.game.state import GameState, Engine
+from pyrailbaron.game.config import AIConfig
+from pyrailbaron.game.policy_tables import rules_key
+from pyrailbaron.game.incidence import get_rr_incidence
+from pyrailbaron.game.sampling import get_destination_sampler
+from pyrailbaron.map.bfs import quick_network_distance
+from pyrailbaron.map.datamodel import derived_data, network_hash
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Surrogate for the purchase risk filter in select_purchase_options, which
+# simulates up to n_dest * n_roll_per_dest trips per option to find the
+# crit_pct quantile of the next trip's cost. Most options are nowhere near
+# the min_bal cutoff, so a regression on a few trip features (trained
+# offline on the AI's own simulated quantiles from self-play) is enough to
+# keep or drop them; only predictions within the model's error margin of the
+# cutoff still get simulated.
+#
+# The model is a ridge regression on the features below, fit in closed form
+# and stored as plain arrays, so it only needs numpy. It is rough: the shipped
+# model (7832 samples from 25 self-play games) has a held-out R^2 of 0.57 and
+# a mean error of about $1100. So it only settles an option when its
+# predicted balance is more than margin (the MARGIN_PCT quantile of held-out
+# errors, about $5700) away from min_bal; anything closer, and everything in
+# a game with other rules or crit_pct than it was trained on, is simulated
+# with estimate_crit_cost as before.
+#
+#   python -m pyrailbaron.game.surrogate collect N   # log N self-play games
+#   python -m pyrailbaron.game.surrogate train       # fit and write the model
+
+DEFAULT_LOG_PATH = (Path(__file__) / '../../../../../data/trip_cost_log.npz').resolve()
+DEFAULT_MODEL_PATH = (Path(__file__) / '../../../../../data/trip_cost_model.npz').resolve()
+MARGIN_PCT = 0.99 # Held-out errors inside which we still simulate
+RIDGE_ALPHA = 1.0
+HOLDOUT_FRACTION = 0.2
+
+# Average hops per turn for each engine
+ENGINE_SPEED = {
+    Engine.Basic: 7.0,
+    Engine.Express: 7.0 + 3.5 / 6,
+    Engine.Superchief: 10.5 }
+
+# Expected hop count of the next trip from each point
+class TripLengths:
+    def __init__(self, s: GameState):
+        self.state = s
+        self._lengths: Dict[int, float] = {}
+
+    def expected(self, start_pt: int) -> float:
+        if start_pt not in self._lengths:
+            s = self.state
+            pts, probs = get_destination_sampler(s).dest_distribution(
+                s.map.points[start_pt].region)
+            self._lengths[start_pt] = float(sum(p * quick_network_distance(s.map, start_pt, pt)
+                for pt, p in zip(pts.tolist(), probs.tolist())))
+        return self._lengths[start_pt]
+
+def get_trip_lengths(s: GameState) -> TripLengths:
+    return derived_data(s.map, 'trip_lengths', lambda: TripLengths(s))
+
+# Features of player_i's next trip from where they are, with the given engine
+# and ownership (i.e. after a purchase)
+def trip_cost_features(s: GameState, player_i: int, engine: Engine,
+        player_rr: List[List[str]]) -> np.ndarray:
+    ps = s.players[player_i]
+    incidence = get_rr_incidence(s)
+    shares = incidence.trip_shares(ps.location)
+    owner = np.full(incidence.n_rr, -1, dtype=np.int64)
+    for i, rrs in enumerate(player_rr):
+        for rr in rrs:
+            owner[incidence.rr_ids[rr]] = i
+    own = float(shares[owner == player_i].sum())
+    bank = float(shares[owner == -1].sum())
+    other = float(shares[(owner >= 0) & (owner != player_i)].sum())
+    turns = get_trip_lengths(s).expected(ps.location) / ENGINE_SPEED[engine]
+    rate = ps.established_rate
+    region = s.map.points[ps.location].region
+    return np.array([
+        turns, turns * own, turns * bank, turns * other,
+        turns * other * s.doubleFees, float(s.doubleFees),
+        float(rate is None), float(rate == 0),
+        float(rate == s.config.bank_user_fee), float(rate == s.config.other_user_fee),
+        ps.bank / 100000] + [float(r == region) for r in REGIONS]
+        + [float(engine == e) for e in Engine], dtype=np.float64)
+
+class TripCostSurrogate:
+    def __init__(self, coef: np.ndarray, intercept: float, margin: float,
+            crit_pct: float):
+        self.coef = coef
+        self.intercept = intercept
+        self.margin = margin
+        self.crit_pct = crit_pct
+
+    def predict(self, features: np.ndarray) -> float:
+        return float(features @ self.coef + self.intercept)
+
+    # True/False if the ending balance is clearly above/below min_bal, None
+    # if we have to simulate to tell
+    def screen(self, features: np.ndarray, bal_after: int, min_bal: int) -> bool | None:
+        est_bal = bal_after + self.predict(features)
+        if est_bal - self.margin > min_bal:
+            return True
+        if est_bal + self.margin <= min_bal:
+            return False
+        return None
+
+def read_trip_cost_surrogate(s: GameState,
+        model_path: Path = DEFAULT_MODEL_PATH) -> TripCostSurrogate | None:
+    if not model_path.exists():
+        return None
+    data = np.load(model_path)
+    if str(data['map_hash']) != network_hash(s.map):
+        print(f'Trip cost model {model_path} does not match map, ignoring it')
+        return None
+    if str(data['rules']) != rules_key(s.config):
+        return None # Trained under other rules; simulate instead
+    return TripCostSurrogate(data['coef'], float(data['intercept']),
+        float(data['margin']), float(data['crit_pct']))
+
+def get_trip_cost_surrogate(s: GameState) -> TripCostSurrogate | None:
+    return derived_data(s.map, 'trip_cost_surrogate',
+        lambda: read_trip_cost_surrogate(s), s.config)
+
+# Training samples (features, simulated quantile) recorded by the AI while
+# this process is logging
+_log: List[Tuple[np.ndarray, int]] | None = None
+
+def start_trip_cost_log():
+    global _log
+    _log = []
+
+def stop_trip_cost_log() -> List[Tuple[np.ndarray, int]]:
+    global _log
+    samples, _log = _log or [], None
+    return samples
+
+def logging_trip_costs() -> bool:
+    return _log is not None
+
+def log_trip_cost(features: np.ndarray, crit_cost: int):
+    if _log is not None:
+        _log.append((features, crit_cost))
+
+# Self-play: one tournament game with every seat on the default AI settings,
+# simulating every option so the whole range of balances gets logged
+def _collect_game(seed: int) -> List[Tuple[np.ndarray, int]]:
+    from pyrailbaron.game.tournament import play_match
+    cfg = AIConfig(min_sim_threshold=1 << 30)
+    start_trip_cost_log()
+    play_match(0, 0, cfg, cfg, 3, seed)
+    return stop_trip_cost_log()
+
+def collect_samples(n_games: int, n_workers: int, seed: int = 0,
+        log_path: Path = DEFAULT_LOG_PATH):
+    from pyrailbaron.game.rollout import init_game_worker
+    from pyrailbaron.game.config import GameConfig
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    samples: List[Tuple[np.ndarray, int]] = []
+    if log_path.exists():
+        data = np.load(log_path)
+        samples = list(zip(data['X'], data['y'].tolist()))
+    with ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_game_worker, initargs=(GameConfig(),)) as pool:
+        for game_samples in pool.map(_collect_game, range(seed, seed + n_games)):
+            samples += game_samples
+            np.savez_compressed(log_path, X=np.array([x for x, _ in samples]),
+                y=np.array([y for _, y in samples]))
+            print(f'{len(samples)} samples logged')
+
+# Ridge regression (intercept not penalized); returns coef, intercept
+def fit_ridge(X: np.ndarray, y: np.ndarray, alpha: float = RIDGE_ALPHA) -> Tuple[np.ndarray, float]:
+    x_mean, y_mean = X.mean(axis=0), y.mean()
+    Xc = X - x_mean
+    coef = np.linalg.solve(Xc.T @ Xc + alpha * np.eye(X.shape[1]), Xc.T @ (y - y_mean))
+    return coef, float(y_mean - x_mean @ coef)
+
+def train_surrogate(s: GameState, log_path: Path = DEFAULT_LOG_PATH,
+        model_path: Path = DEFAULT_MODEL_PATH, crit_pct: float = AIConfig.crit_pct):
+    data = np.load(log_path)
+    X, y = data['X'], data['y'].astype(np.float64)
+    order = np.random.default_rng(0).permutation(len(y))
+    n_test = int(len(y) * HOLDOUT_FRACTION)
+    test, train = order[:n_test], order[n_test:]
+    coef, intercept = fit_ridge(X[train], y[train])
+    errors = np.abs(X[test] @ coef + intercept - y[test])
+    margin = float(np.quantile(errors, MARGIN_PCT))
+    r2 = 1 - float(((X[test] @ coef + intercept - y[test]) ** 2).sum()
+        / ((y[test] - y[test].mean()) ** 2).sum())
+    # Refit on everything now the margin is known
+    coef, intercept = fit_ridge(X, y)
+    np.savez(model_path, coef=coef, intercept=intercept,
+        margin=margin, crit_pct=crit_pct, map_hash=network_hash(s.map),
+        rules=rules_key(s.config))
+    print(f'Wrote trip cost model to {model_path} ({len(y)} samples, '
+        f'held-out R^2 {r2:.3f}, mean error {errors.mean():.0f}, margin {margin:.0f})')
+
+if __name__ == '__main__':
+    import sys
+    from pyrailbaron.game.rollout import DEFAULT_ROLLOUT_WORKERS
+    if sys.argv[1] == 'collect':
+        collect_samples(int(sys.argv[2]), DEFAULT_ROLLOUT_WORKERS)
+    else:
+        train_surrogate(GameState())
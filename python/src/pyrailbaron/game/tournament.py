@@ -0,0 +1,303 @@
+from pyrailbaron.game.interface import Interface
+from pyrailbaron.game.state import GameState
+from pyrailbaron.game.config import AIConfig, GameConfig
+from pyrailbaron.game.logic import run_game
+from pyrailbaron.game.ai import (plan_turn_moves, select_purchase_options,
+    recommend_declare, select_rr_to_sell, recommend_auction, recommend_bid,
+    recommend_region)
+from pyrailbaron.game.rollout import (DEFAULT_ROLLOUT_WORKERS, init_game_worker,
+    worker_static_game)
+from pyrailbaron.map.datamodel import Waypoint
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, replace
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from random import Random
+from math import sqrt
+from time import time, process_time
+import multiprocessing
+import random
+import json
+
+# Tournament of AI settings. Every entry plays games_per_entry full games
+# (real rules and AI, no GUI) against opponents using the baseline settings,
+# and is scored by its win rate with a 95% confidence interval; an entry no
+# better than the baseline wins 1/n_players of its games.
+#
+# Games are independent, so they're handed out one at a time to a process
+# pool and each worker takes the next game as soon as it finishes one; slow
+# games (long endgames, lots of selling) don't hold up a whole batch. Every
+# finished game is appended to the checkpoint file, and a run with the same
+# setup picks up from there, skipping the games already played.
+
+# Move planning is limited by stages rather than seconds, so a game plays the
+# same however busy the machine is
+MATCH_MOVE_STAGES = 4    # Planning stages per roll (see ai.plan_turn_moves)
+MAX_MATCH_TURNS = 2000   # Player-turns before a game is called a draw
+Z_95 = 1.96
+
+# One AIConfig per combination of the given values, e.g.
+#   config_grid(AIConfig(), crit_pct=[0.02, 0.05], min_bal=[0, 5000])
+def config_grid(base: AIConfig, **values: List[Any]) -> List[Tuple[str, AIConfig]]:
+    keys = list(values)
+    grid: List[Tuple[str, AIConfig]] = []
+    for combo in product(*(values[k] for k in keys)):
+        name = ','.join(f'{k}={v}' for k, v in zip(keys, combo))
+        grid.append((name or 'base', replace(base, **dict(zip(keys, combo)))))
+    return grid
+
+class _TurnLimit(Exception):
+    pass
+
+# Plays every seat with the AI, each with its own settings
+class _MatchInterface(Interface):
+    def __init__(self, seat_configs: List[AIConfig], rng: Random):
+        self.seat_configs = seat_configs
+        self.rng = rng
+        self.names = [f'SEAT{k}' for k in range(len(seat_configs))]
+        self.seats = dict((name, k) for k, name in enumerate(self.names))
+        self.n_turns = 0
+        self.winner_seat = -1
+
+    def _cfg(self, s: GameState, player_i: int) -> AIConfig:
+        return self.seat_configs[self.seats[s.players[player_i].name]]
+
+    def get_player_name(self) -> str:
+        return self.names.pop(0)
+
+    def announce_player_order(self, s: GameState):
+        pass
+
+    def get_home_city(self, s: GameState, player_i: int) -> str:
+        return s.random_lookup(s.random_lookup('REGION', self.rng), self.rng)
+
+    def announce_turn(self, s: GameState, player_i: int):
+        self.n_turns += 1
+        if self.n_turns > MAX_MATCH_TURNS:
+            raise _TurnLimit()
+
+    def get_destination(self, s: GameState, player_i: int) -> str:
+        ps = s.players[player_i]
+        region = s.random_lookup('REGION', self.rng)
+        if region == s.map.points[ps.location].region:
+            region = recommend_region(s, player_i)
+        city, city_i = s.map.lookup_city(s.random_lookup(region, self.rng))
+        while city_i == ps.location:
+            city, city_i = s.map.lookup_city(s.random_lookup(region, self.rng))
+        return city
+
+    def roll_for_distance(self, s: GameState, player_i: int) -> Tuple[int, int]:
+        return self.rng.randint(1, 6), self.rng.randint(1, 6)
+
+    def bonus_roll(self, s: GameState, player_i: int) -> int:
+        return self.rng.randint(1, 6)
+
+    def get_player_move(self, s: GameState, player_i: int, d: int, init_rr: str | None, moves_so_far: int) -> List[Waypoint]:
+        return plan_turn_moves(s, player_i, d, init_rr, moves_so_far,
+            max_stages=MATCH_MOVE_STAGES)
+
+    def update_bank_amts(self, s: GameState):
+        pass
+
+    def update_owners(self, s: GameState):
+        pass
+
+    def display_shortfall(self, s: GameState, player_i: int, amt: int):
+        pass
+
+    def select_rr_to_sell(self, s: GameState, player_i: int, amt_required: int) -> str:
+        return select_rr_to_sell(s, player_i, amt_required)
+
+    def announce_route_payoff(self, s: GameState, player_i: int, payoff: int):
+        pass
+
+    def ask_to_auction(self, s: GameState, player_i: int, rr_to_sell: str) -> bool:
+        return recommend_auction(s, player_i, rr_to_sell)
+
+    def ask_for_bid(self, s: GameState, selling_player_i: int, bidding_player_i: int, rr_to_sell: str, min_bid: int) -> int:
+        if s.players[bidding_player_i].bank < min_bid:
+            return 0
+        return recommend_bid(s, selling_player_i, bidding_player_i, rr_to_sell,
+            min_bid, self._cfg(s, bidding_player_i))
+
+    def announce_sale(self, s: GameState, seller_i: int, buyer_i: int, rr: str, price: int):
+        pass
+
+    def announce_sale_to_bank(self, s: GameState, seller_i: int, rr: str, price: int):
+        pass
+
+    def get_purchase(self, s: GameState, player_i: int, user_fee: int) -> str|None:
+        if len(s.get_player_purchase_opts(player_i)) == 0:
+            return None
+        return select_purchase_options(s, player_i, user_fee, self._cfg(s, player_i))
+
+    def ask_to_declare(self, s: GameState, player_i: int) -> bool:
+        return recommend_declare(s, player_i, self._cfg(s, player_i))
+
+    def announce_undeclared(self, s: GameState, player_i: int):
+        pass
+
+    def announce_rover_play(self, s: GameState, decl_player_i: int, rover_player_i: int):
+        pass
+
+    def show_winner(self, s: GameState, winner_i: int):
+        self.winner_seat = self.seats[s.players[winner_i].name]
+
+@dataclass(frozen=True)
+class GameResult:
+    game_id: int
+    entry: int
+    entry_won: bool
+    draw: bool
+    turns: int
+    seconds: float  # CPU time
+
+# Play one game with the entry in seat 0 and the baseline in the rest (the
+# seating order is shuffled by the game itself)
+def play_match(game_id: int, entry: int, entry_cfg: AIConfig,
+        baseline: AIConfig, n_players: int, seed: int) -> GameResult:
+    t0 = process_time()
+    random.seed(seed) # The AI's simulations use the global RNG
+    i = _MatchInterface([entry_cfg] + [baseline] * (n_players - 1), Random(seed))
+    try:
+        run_game(n_players, i, worker_static_game())
+    except _TurnLimit:
+        pass
+    return GameResult(game_id, entry, i.winner_seat == 0, i.winner_seat < 0,
+        i.n_turns, process_time() - t0)
+
+@dataclass(frozen=True)
+class EntryStats:
+    name: str
+    games: int
+    wins: int
+    draws: int
+    seconds: float
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    # Wilson score interval for the win rate
+    @property
+    def confidence_interval(self) -> Tuple[float, float]:
+        if self.games == 0:
+            return 0.0, 1.0
+        n, p, z2 = self.games, self.win_rate, Z_95 * Z_95
+        mid = (p + z2 / (2 * n)) / (1 + z2 / n)
+        half = Z_95 * sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+        return max(0.0, mid - half), min(1.0, mid + half)
+
+@dataclass(frozen=True)
+class TournamentReport:
+    entries: List[EntryStats]
+    n_players: int
+    cpu_seconds: float  # Compute time across all workers, including resumed games
+    wall_seconds: float # This run only
+
+    def print(self):
+        print(f'{"ENTRY":40} {"GAMES":>6} {"WIN %":>6}  {"95% CI":>13} {"CPU S":>8}')
+        for e in sorted(self.entries, key=lambda e: -e.win_rate):
+            lo, hi = e.confidence_interval
+            print(f'{e.name:40} {e.games:6} {e.win_rate:6.1%}  {lo:5.1%}-{hi:6.1%} {e.seconds:8.0f}')
+        print(f'Baseline win rate {1 / self.n_players:.1%}; '
+            f'{self.cpu_seconds:.0f} CPU s total, {self.wall_seconds:.0f} s this run')
+
+class Tournament:
+    def __init__(self, entries: List[Tuple[str, AIConfig]], games_per_entry: int,
+            n_players: int = 3, baseline: AIConfig = AIConfig(),
+            rules: GameConfig = GameConfig(), seed: int = 0,
+            checkpoint: Path | None = None):
+        assert n_players >= 2, "Need an entry and at least one opponent"
+        self.entries = entries
+        self.games_per_entry = games_per_entry
+        self.n_players = n_players
+        self.baseline = baseline
+        self.rules = rules
+        self.seed = seed
+        self.checkpoint = checkpoint
+        self.results: Dict[int, GameResult] = {}
+
+    # Game k is entry k // games_per_entry; seeds are fixed by the setup so a
+    # resumed run plays exactly the games that were missing
+    def _games(self) -> List[Tuple[int, int, int]]:
+        rng = Random(self.seed)
+        n = len(self.entries) * self.games_per_entry
+        return [(k, k // self.games_per_entry, rng.getrandbits(32)) for k in range(n)]
+
+    def _header(self) -> Dict[str, Any]:
+        return {'entries': [[name, cfg.to_dict()] for name, cfg in self.entries], # type: ignore
+            'games_per_entry': self.games_per_entry, 'n_players': self.n_players,
+            'baseline': self.baseline.to_dict(), 'rules': self.rules.to_dict(), # type: ignore
+            'seed': self.seed}
+
+    def _load_checkpoint(self):
+        if self.checkpoint is None or not self.checkpoint.exists():
+            return
+        with self.checkpoint.open('r') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if len(lines) == 0:
+            return
+        assert lines[0] == {'header': self._header()}, \
+            f"Checkpoint {self.checkpoint} is for a different tournament"
+        for line in lines[1:]:
+            result = GameResult(**line)
+            self.results[result.game_id] = result
+
+    def _save(self, result: GameResult):
+        self.results[result.game_id] = result
+        if self.checkpoint is None:
+            return
+        new_file = not self.checkpoint.exists() or self.checkpoint.stat().st_size == 0
+        with self.checkpoint.open('a') as f:
+            if new_file:
+                f.write(json.dumps({'header': self._header()}) + '\n')
+            f.write(json.dumps(result.__dict__) + '\n')
+
+    def run(self, n_workers: int = DEFAULT_ROLLOUT_WORKERS) -> TournamentReport:
+        t0 = time()
+        self._load_checkpoint()
+        todo = [g for g in self._games() if g[0] not in self.results]
+        todo.reverse() # Pop from the end in game order
+        print(f'{len(self.results)} games already played, {len(todo)} to go')
+
+        def submit(pool: ProcessPoolExecutor) -> Future[GameResult]:
+            game_id, entry, seed = todo.pop()
+            return pool.submit(play_match, game_id, entry, self.entries[entry][1],
+                self.baseline, self.n_players, seed)
+
+        with ProcessPoolExecutor(n_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_game_worker, initargs=(self.rules,)) as pool:
+            # Keep a game queued behind each running one so no worker waits on us
+            pending = set(submit(pool) for _ in range(min(2 * n_workers, len(todo))))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    self._save(f.result())
+                    if todo:
+                        pending.add(submit(pool))
+        return self.report(time() - t0)
+
+    def report(self, wall_seconds: float = 0.0) -> TournamentReport:
+        stats: List[EntryStats] = []
+        for entry, (name, _) in enumerate(self.entries):
+            rs = [r for r in self.results.values() if r.entry == entry]
+            stats.append(EntryStats(name, len(rs), sum(r.entry_won for r in rs),
+                sum(r.draw for r in rs), sum(r.seconds for r in rs)))
+        return TournamentReport(stats, self.n_players,
+            sum(r.seconds for r in self.results.values()), wall_seconds)
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare AI settings by self-play')
+    parser.add_argument('--games', type=int, default=50, help='Games per entry')
+    parser.add_argument('--players', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=DEFAULT_ROLLOUT_WORKERS)
+    parser.add_argument('--checkpoint', type=Path, default=Path('tournament.jsonl'))
+    args = parser.parse_args()
+    t = Tournament(config_grid(AIConfig(), crit_pct=[0.02, 0.05, 0.10],
+            min_bal=[0, 5000, 20000]),
+        args.games, args.players, checkpoint=args.checkpoint)
+    t.run(args.workers).print()
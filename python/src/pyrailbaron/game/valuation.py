@@ -0,0 +1,144 @@
+from pyrailbaron.game.state import GameState, PlayerState
+from pyrailbaron.game.fees import (CompiledPath, compile_path, get_owners,
+    calculate_slice_fees)
+from pyrailbaron.game.planner import expected_roll
+from pyrailbaron.game.sampling import get_destination_sampler
+from pyrailbaron.map.datamodel import derived_data
+from pyrailbaron.map.routes import get_route_store
+from pyrailbaron.map.summary import get_rr_ids
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Value of railroads to each player, as the user fees they save and collect
+# over likely trips. Each player's likely trips are their current trip (if
+# they have a destination) or the roll-table distribution of next trips from
+# where they are, each along its cheapest catalogued route split into turns
+# of an average roll. Only trips that use a railroad change when it changes
+# hands, so a valuation only prices those trips, and results are cached for
+# the current ownership "epoch" and positions of every player.
+
+VALUE_HORIZON_TRIPS = 3  # Number of trips a player is expected to make with a railroad
+MAX_CACHED_VALUES = 512
+
+@dataclass(frozen=True)
+class LikelyTrip:
+    prob: float
+    path: CompiledPath
+    turns: Tuple[Tuple[int, int], ...] # Slice of the path covered on each turn
+    rr_mask: int                       # Railroads used anywhere on the trip
+
+# Owner of every railroad, plus whether fees are doubled
+Ownership = Tuple[Tuple[int, ...], bool]
+
+# A player's position, destination (-1 = next trip) and engine, plus the
+# ownership their trips' routes were picked under
+TripKey = Tuple[int, int, int, Ownership]
+
+class RailroadValuation:
+    def __init__(self, s: GameState):
+        self.map = s.map
+        self.rules = s.config
+        self.rr_ids = get_rr_ids(s.map)
+        self._trips: Dict[int, Tuple[TripKey, List[LikelyTrip]]] = {}
+        self._deltas: Dict[Tuple[Ownership, Tuple[TripKey, ...], int, int],
+            np.ndarray] = {}
+
+    def _trip_key(self, s: GameState, ps: PlayerState) -> TripKey:
+        dest_pt = ps.destinationIndex if not ps.atDestination else -1
+        owners = get_owners(s.map, [p.rr_owned for p in s.players])
+        return ps.location, dest_pt, ps.engine.value, (tuple(owners), s.doubleFees)
+
+    # Likely trips for a player, rebuilt when they move or change engines, or
+    # any railroad changes hands (which can change the cheapest routes)
+    def likely_trips(self, s: GameState, player_i: int) -> List[LikelyTrip]:
+        ps = s.players[player_i]
+        key = self._trip_key(s, ps)
+        if player_i not in self._trips or self._trips[player_i][0] != key:
+            self._trips[player_i] = (key, self._build_trips(s, ps, key))
+        return self._trips[player_i][1]
+
+    def _build_trips(self, s: GameState, ps: PlayerState, key: TripKey) -> List[LikelyTrip]:
+        start_pt, dest_pt, _, (owner_ids, doubleFees) = key
+        if start_pt < 0:
+            return []
+        if dest_pt >= 0:
+            dests: List[Tuple[int, float]] = [(dest_pt, 1.0)]
+        else:
+            pts, probs = get_destination_sampler(s).dest_distribution(
+                s.map.points[start_pt].region)
+            dests = list(zip(pts.tolist(), probs.tolist()))
+
+        store = get_route_store(s.map)
+        owners = list(owner_ids)
+        d = expected_roll(ps.engine)
+        trips: List[LikelyTrip] = []
+        for end_pt, p in dests:
+            best: Tuple[int, LikelyTrip] | None = None
+            for path in store.paths_between(start_pt, end_pt):
+                cp = compile_path(s.map, path)
+                turns = tuple((a, a + d) for a in range(0, len(cp), d))
+                mask = 0
+                for rr_id in cp.run_rrs:
+                    mask |= 1 << rr_id
+                trip = LikelyTrip(p, cp, turns, mask)
+                cost = -self._trip_deltas(trip, ps.index, owners,
+                    len(s.players), doubleFees)[ps.index]
+                if best is None or cost < best[0]:
+                    best = (cost, trip)
+            if best:
+                trips.append(best[1])
+        return trips
+
+    # Bank deltas for everyone from one player making one trip
+    def _trip_deltas(self, trip: LikelyTrip, player_i: int, owners: List[int],
+            n_players: int, doubleFees: bool) -> List[int]:
+        deltas = [0] * n_players
+        for a, b in trip.turns:
+            turn_deltas, _ = calculate_slice_fees(trip.path, a, b, player_i,
+                owners, n_players, -1, None, doubleFees, self.rules)
+            for j, dj in enumerate(turn_deltas):
+                deltas[j] += dj
+        return deltas
+
+    # Expected bank deltas for everyone from each player's likely trips that
+    # use rr_id, if rr_id were owned by new_owner (-1 = bank)
+    def rr_deltas(self, s: GameState, rr_id: int, new_owner: int) -> np.ndarray:
+        owners = get_owners(s.map, [p.rr_owned for p in s.players])
+        owners[rr_id] = new_owner
+        doubleFees = all(o >= 0 for o in owners)
+        trip_keys = tuple(self._trip_key(s, ps) for ps in s.players)
+        key = ((tuple(owners), doubleFees), trip_keys, rr_id, new_owner)
+        if key not in self._deltas:
+            if len(self._deltas) >= MAX_CACHED_VALUES:
+                self._deltas.clear()
+            n = len(s.players)
+            total = np.zeros(n, dtype=np.float64)
+            for player_i in range(n):
+                for trip in self.likely_trips(s, player_i):
+                    if (trip.rr_mask >> rr_id) & 1:
+                        total += trip.prob * np.array(self._trip_deltas(
+                            trip, player_i, owners, n, doubleFees))
+            self._deltas[key] = total
+        return self._deltas[key]
+
+    # Expected gain to player_j over VALUE_HORIZON_TRIPS trips each from rr
+    # being owned by new_owner rather than the bank
+    def swing(self, s: GameState, player_j: int, rr: str, new_owner: int) -> int:
+        rr_id = self.rr_ids[rr]
+        diff = (self.rr_deltas(s, rr_id, new_owner)[player_j]
+            - self.rr_deltas(s, rr_id, -1)[player_j])
+        return int(round(diff * VALUE_HORIZON_TRIPS))
+
+    # Marginal value of rr to player_j (fees saved and collected by owning it)
+    def value(self, s: GameState, player_j: int, rr: str) -> int:
+        return self.swing(s, player_j, rr, player_j)
+
+    # Most player_j should pay for rr: what the bank pays on resale plus the
+    # fees it's worth
+    def max_price(self, s: GameState, player_j: int, rr: str) -> int:
+        return s.map.railroads[rr].cost // 2 + max(0, self.value(s, player_j, rr))
+
+def get_rr_valuation(s: GameState) -> RailroadValuation:
+    return derived_data(s.map, 'rr_valuation', lambda: RailroadValuation(s),
+        s.config)
@@ -0,0 +1,121 @@
+from pyrailbaron.game.state import GameState
+from pyrailbaron.game.rollout import (RolloutModel, CompactGame, get_rollout_model,
+    compact_game, count_winners, get_rollout_pool, worker_count_winners,
+    DEFAULT_ROLLOUT_WORKERS)
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from random import Random
+import threading
+
+# Live estimate of each player's chance to win, from rollouts (see rollout.py)
+# of the position at the start of the current turn. A background thread keeps
+# batches running on the rollout pool and folds in results as they come back;
+# the game loop only ever posts new positions and reads the latest published
+# estimate, so it never waits on a rollout. A new position's estimate isn't
+# published until it has MIN_PUBLISH_ROLLOUTS behind it, so the display keeps
+# showing the previous turn's numbers rather than noise.
+
+WINPROB_BATCH = 64
+MIN_PUBLISH_ROLLOUTS = 256
+MAX_POSITION_ROLLOUTS = 20000   # Stop refining a position after this many
+
+@dataclass(frozen=True)
+class WinEstimate:
+    win_pcts: Tuple[float, ...]  # Per player, in percent
+    n_rollouts: int
+
+class WinProbabilityService:
+    def __init__(self, n_workers: int = DEFAULT_ROLLOUT_WORKERS, seed: int | None = None):
+        self.n_workers = n_workers
+        self._rng = Random(seed)
+        self._cond = threading.Condition()
+        self._epoch = 0
+        self._position: Tuple[CompactGame, int] | None = None
+        self._counts: List[int] = []
+        self._published: WinEstimate | None = None
+        self._stopped = False
+        self._model: RolloutModel | None = None
+        self._thread: threading.Thread | None = None
+
+    # Post the position at the start of player_i's turn
+    def update(self, s: GameState, player_i: int):
+        self._model = get_rollout_model(s)
+        game = compact_game(s, self._model)
+        with self._cond:
+            self._epoch += 1
+            self._position = (game, player_i)
+            self._counts = [0] * (len(s.players) + 1)
+            self._cond.notify()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    # Latest published estimate (None until the first one is ready)
+    def estimate(self) -> WinEstimate | None:
+        with self._cond:
+            return self._published
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _record(self, epoch: int, counts: List[int]):
+        with self._cond:
+            if epoch != self._epoch:
+                return # Results for an old position
+            self._counts = [a + b for a, b in zip(self._counts, counts)]
+            total = sum(self._counts)
+            if total >= MIN_PUBLISH_ROLLOUTS:
+                self._published = WinEstimate(tuple(100.0 * c / total
+                    for c in self._counts[:-1]), total)
+
+    def _next_job(self) -> Tuple[int, CompactGame, int] | None:
+        with self._cond:
+            if self._position is None or self._stopped:
+                return None
+            if sum(self._counts) >= MAX_POSITION_ROLLOUTS:
+                return None
+            game, player_i = self._position
+            return self._epoch, game, player_i
+
+    def _run(self):
+        pending: Dict[Future[List[int]], int] = {}
+        pool = get_rollout_pool() if self.n_workers > 0 else None
+        while True:
+            with self._cond:
+                if self._stopped:
+                    break
+            job = self._next_job()
+            if job is None and not pending:
+                with self._cond:
+                    self._cond.wait(timeout=1.0)
+                continue
+
+            if job is not None and pool is None:
+                assert self._model is not None, "Must post a position first"
+                epoch, game, player_i = job
+                self._record(epoch, count_winners(self._model, game, player_i,
+                    WINPROB_BATCH, self._rng.getrandbits(32)))
+                continue
+
+            while job is not None and pool is not None and len(pending) < 2 * self.n_workers:
+                epoch, game, player_i = job
+                try:
+                    f = pool.submit(worker_count_winners, game, player_i,
+                        WINPROB_BATCH, self._rng.getrandbits(32))
+                except BrokenProcessPool:
+                    pool = None
+                    break
+                pending[f] = epoch
+            if not pending:
+                continue
+            done, _ = wait(list(pending), timeout=0.5, return_when=FIRST_COMPLETED)
+            for f in done:
+                epoch = pending.pop(f)
+                if f.exception() is None:
+                    self._record(epoch, f.result())
+        for f in pending:
+            f.cancel()
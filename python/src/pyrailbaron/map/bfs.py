@@ -1,168 +1,130 @@
 from pyrailbaron.map.datamodel import (
-    Map, Waypoint, RailSegment, read_map,
-    get_valid_waypoints, make_rail_seg, rail_segs_from_wps )
-from collections import deque
-from typing import List, Set, Deque, Tuple, Dict
+    Map, Waypoint, read_map,
+    rail_segs_from_wps )
+from pyrailbaron.map.contract import get_contracted_graph
+from pyrailbaron.map.hierarchy import get_hop_index
+from pyrailbaron.map.summary import get_rr_ids
+from dataclasses import dataclass
+from heapq import heappush, heappop
+from typing import List, Set, Tuple, Dict, Optional
 from time import time
-from datetime import timedelta
 from pathlib import Path
 
 def quick_network_distance(m: Map, start_pt: int, dest_pt: int, history: List[Waypoint] = []) -> int:
     curr_pt = start_pt if len(history) ==  0 else history[-1][1]
     if curr_pt == dest_pt:
         return 0
-    search_paths: Deque[List[Waypoint]] = deque()
-    pts_searched: Set[int] = set()
-    rail_segs_used = rail_segs_from_wps(start_pt, history)
-
-    for start_step in get_valid_waypoints(m, curr_pt, rail_segs_used):
-        search_paths.append([start_step])
-    pts_searched.add(curr_pt)
-
-    while len(search_paths) > 0:
-        base_path = search_paths.popleft()
-        end_pt = base_path[-1][1]
-        if end_pt == dest_pt:
-            return len(base_path)
-        rail_segs_used = rail_segs_from_wps(start_pt, history + base_path)
-        next_wp = get_valid_waypoints(m, end_pt, rail_segs_used, pts_searched)
-        for rr, next_pt in next_wp:
-            if next_pt == dest_pt:
-                return len(base_path) + 1
-            else:
-                search_paths.append(base_path + [(rr, next_pt)])
-                pts_searched.add(next_pt)
-    return -1
+    # The shortest path avoiding used rail segs never passes through dest_pt
+    # early, so this is a plain hop distance query on the blocked network
+    return get_hop_index(m).distance(curr_pt, dest_pt,
+        rail_segs_from_wps(start_pt, history))
 
 def points_within(m: Map, start_pt: int, dest_pt: int, history: List[Waypoint], d: int) -> Set[int]:
     curr_pt = start_pt if len(history) ==  0 else history[-1][1]
     if curr_pt == dest_pt:
         return set([dest_pt])
-    search_paths: Deque[List[Waypoint]] = deque()
-    pts_searched: Set[int] = set()
-    rail_segs_used = rail_segs_from_wps(start_pt, history)
-
-    for start_step in get_valid_waypoints(m, curr_pt, rail_segs_used):
-        search_paths.append([start_step])
-    pts_searched.add(curr_pt)
-
-    while len(search_paths) > 0:
-        base_path = search_paths.popleft()
-        end_pt = base_path[-1][1]
-        if end_pt == dest_pt:
-            pts_searched.add(dest_pt)
+    g = get_contracted_graph(m)
+    dist = g.distances(curr_pt, rail_segs_from_wps(start_pt, history), dest_pt, d)
+    return set(dist.keys())
+
+# Partial path found by search_all_paths, stored as a chain of super edges
+@dataclass(frozen=True)
+class RouteLabel:
+    hops: int
+    transitions: int
+    rr_mask: int
+    pt: int
+    rr_id: int                          # Last railroad taken (-1 at start)
+    parent: Optional['RouteLabel'] = None
+    waypoints: Tuple[Waypoint, ...] = ()  # Waypoints taken after parent
+
+    # Any continuation of other can be applied to this label for at most
+    # the same cost (if we arrived on a different railroad, we may need
+    # one more transition to continue the same way)
+    def dominates(self, other: 'RouteLabel') -> bool:
+        rr_penalty = 0 if self.rr_id < 0 or self.rr_id == other.rr_id else 1
+        return (self.hops <= other.hops 
+            and self.transitions + rr_penalty <= other.transitions
+            and self.rr_mask & ~other.rr_mask == 0)
+
+    # Plain dominance for finished paths
+    def beats(self, other: 'RouteLabel') -> bool:
+        return (self.hops <= other.hops
+            and self.transitions <= other.transitions
+            and self.rr_mask & ~other.rr_mask == 0)
+
+    @property
+    def sort_key(self) -> Tuple[int, int, int, int, int, int]:
+        return (self.hops, self.transitions, self.rr_mask.bit_count(),
+            self.rr_mask, self.pt, self.rr_id)
+
+    @property
+    def path(self) -> List[Waypoint]:
+        parts: List[Tuple[Waypoint, ...]] = []
+        label: RouteLabel | None = self
+        while label:
+            parts.append(label.waypoints)
+            label = label.parent
+        return [wp for part in reversed(parts) for wp in part]
+
+# Label-setting search over the contracted graph, keeping the Pareto set of
+# (hops, transitions, railroads used) labels at each point. Labels more than
+# max_extra_hops longer than the shortest route to their point are dropped,
+# which bounds the search without depending on the order paths are queued.
+# Looping back to a point is always dominated, so all paths are simple.
+DEFAULT_MAX_EXTRA_HOPS = 5
+def pareto_search(m: Map, start_pt: int, 
+        max_extra_hops: int = DEFAULT_MAX_EXTRA_HOPS,
+        skip_cities: List[int] = []) -> Dict[int, List[RouteLabel]]:
+    g = get_contracted_graph(m)
+    hops = get_hop_index(m).base
+    rr_ids = get_rr_ids(m)
+
+    settled: Dict[int, List[RouteLabel]] = {}
+    queue: List[Tuple[Tuple[int, int, int, int, int, int], int, RouteLabel]] = []
+    n_queued = 0
+    def push(label: RouteLabel):
+        nonlocal n_queued
+        heappush(queue, (label.sort_key, n_queued, label))
+        n_queued += 1
+    push(RouteLabel(0, 0, 0, start_pt, -1))
+
+    while len(queue) > 0:
+        _, _, label = heappop(queue)
+        at_pt = settled.setdefault(label.pt, [])
+        if any(l.dominates(label) for l in at_pt):
             continue
-        if len(base_path) < d:
-            rail_segs_used = rail_segs_from_wps(start_pt, history + base_path)
-            next_wp = get_valid_waypoints(m, end_pt, rail_segs_used, pts_searched)
-            for rr, next_pt in next_wp:
-                if next_pt != dest_pt:
-                    search_paths.append(base_path + [(rr, next_pt)])
-                pts_searched.add(next_pt)
-    return pts_searched
-
-# Returns the list of shortest paths from pt_from to pt_to
-def breadth_first_search(
-        m: Map, pt_from: int, pt_to: int, 
-        used_rail_segs: List[RailSegment] = [],
-        path_length_flex: int = 0) -> List[List[Waypoint]]:
-    search_paths: Deque[List[Waypoint]] = deque()
-    shortest_paths: List[List[Waypoint]] = []
-    min_path_length: int = len(m.points)
-
-    # Initialize search paths with first WPs
-    pts_searched: Set[int] = set([pt_from])
-    for rr, conn_pts in m.points[pt_from].connections.items():
-        for first_pt in conn_pts:
-            if make_rail_seg(rr, pt_from, first_pt) not in used_rail_segs:
-                search_paths.append([(rr,first_pt)])
-
-    while len(search_paths) > 0:
-        base_path = search_paths.popleft()
-
-        # Each path has a distinct history
-        path_used_segs = used_rail_segs + rail_segs_from_wps(pt_from, base_path)
-
-        # Check if this is the current shortest path to pt_to
-        end_pt = base_path[-1][1]
-        if end_pt == pt_to and len(base_path) <= min_path_length + path_length_flex:
-            if len(base_path) < min_path_length:
-                min_path_length = len(base_path)
-                shortest_paths = list(filter(
-                    lambda p: len(p) <= min_path_length + path_length_flex, 
-                    shortest_paths))
-            shortest_paths.append(base_path)
-            
-        # If this path is short enough, add the next level to the queue
-        if len(base_path) < min_path_length + path_length_flex:
-            for rr, conn_pts in m.points[end_pt].connections.items():
-                for next_pt in conn_pts:
-                    rs = make_rail_seg(rr, end_pt, next_pt)
-                    if rs not in path_used_segs and next_pt not in pts_searched:
-                        search_paths.append(base_path + [(rr, next_pt)])                        
-        
-        # Mark the end of this path as searched
-        pts_searched.add(end_pt)
-    return shortest_paths
-
-def search_all_paths(m: Map, start_pt: int, skip_cities: List[int] = []) -> Dict[int, List[List[Waypoint]]]:
-    search_paths: Deque[List[Waypoint]] = deque()
-    for wp in get_valid_waypoints(m, start_pt):
-        search_paths.append([wp])
-
-    def count_transitions(p: List[Waypoint]) -> int:
-        return sum(1 if p[i][0] != p[i - 1][0] else 0 
-                   for i in range(1, len(p)))
-
-    MAX_IN_QUEUE = 50000
-    KeyType = Tuple[int, str] # Found paths are indexed by end pt, rrs used
-    found_paths: Dict[KeyType, List[Waypoint]] = {}
-    start_t = time()
-    min_paths_by_city: Dict[int, int] = {}
-    while len(search_paths) > 0:
-        base_path = search_paths.popleft()
-        rail_segs_used = rail_segs_from_wps(start_pt, base_path)
-        end_pt = base_path[-1][1]
-
-        if end_pt in skip_cities:
+        at_pt.append(label)
+        if label.pt in skip_cities and label.pt != start_pt:
             continue
 
-        if len(m.points[end_pt].city_names) > 0:
-            t_el = timedelta(seconds=int(time() - start_t))
-            rrs_used: str = ",".join(list(sorted(set(rr for rr, _ in base_path))))
-            
-            if end_pt not in min_paths_by_city:
-                min_paths_by_city[end_pt] = len(base_path)
-            elif len(base_path) >= min_paths_by_city[end_pt] + 6:
+        for e in g.edges_from(label.pt):
+            if (e.pts_mask >> start_pt) & 1:
                 continue
-            else:
-                min_paths_by_city[end_pt] = min(
-                    min_paths_by_city[end_pt], len(base_path))
-
-            key = (end_pt, rrs_used)
-            if key not in found_paths:
-                print(f'[{t_el}] Found first path from {m.points[start_pt].display_name} to {m.points[end_pt].display_name} - {rrs_used}')
-                found_paths[key] = base_path
-            else:
-                curr_path = found_paths[key]
-                if len(base_path) < len(curr_path) or (
-                    len(base_path) == len(curr_path) and 
-                    count_transitions(base_path) < count_transitions(curr_path)):
-                    print(f'[{t_el}] Overwriting path from {m.points[start_pt].display_name} to {m.points[end_pt].display_name} - {rrs_used}')
-                    found_paths[key] = base_path
-
-        pts_traveled = [start_pt] + [p for _,p in base_path]
-        curr_rr = base_path[-1][0]
-        rr_pref = [curr_rr] + list(sorted(set(rr for rr,_ in base_path if rr != curr_rr)))
-        rr_pref += list(sorted(set(rr for rr in m.points[end_pt].connections if rr not in rr_pref)))
-        for rr in rr_pref:
-            conn_pts = m.points[end_pt].connections.get(rr, [])
-            for next_pt in conn_pts:
-                rs = make_rail_seg(rr, end_pt, next_pt)
-                if next_pt not in pts_traveled and rs not in rail_segs_used and len(search_paths) < MAX_IN_QUEUE:
-                    search_paths.append(base_path + [(rr, next_pt)])
+            new_hops = label.hops + e.length
+            if new_hops > hops.distance(start_pt, e.end_pt) + max_extra_hops:
+                continue
+            rr_id = rr_ids[e.rr]
+            new_label = RouteLabel(new_hops,
+                label.transitions + (1 if 0 <= label.rr_id != rr_id else 0),
+                label.rr_mask | (1 << rr_id), e.end_pt, rr_id, label, e.waypoints)
+            if not any(l.dominates(new_label) for l in settled.get(e.end_pt, [])):
+                push(new_label)
+    return settled
+
+# Returns the Pareto set of paths (over hops, transitions and railroads used)
+# from start_pt to every city, ordered from shortest to longest
+def search_all_paths(m: Map, start_pt: int, skip_cities: List[int] = [],
+        max_extra_hops: int = DEFAULT_MAX_EXTRA_HOPS) -> Dict[int, List[List[Waypoint]]]:
+    settled = pareto_search(m, start_pt, max_extra_hops, skip_cities)
     cities = [pt.index for pt in m.points if len(pt.city_names) > 0]
-    return dict((c, [p for k,p in found_paths.items() if k[0] == c]) for c in cities)
+    all_paths: Dict[int, List[List[Waypoint]]] = {}
+    for c in cities:
+        labels = [l for l in settled.get(c, []) if c != start_pt]
+        labels = [l for l in labels
+            if not any(oth is not l and oth.beats(l) for oth in labels)]
+        all_paths[c] = [l.path for l in sorted(labels, key=lambda l: l.sort_key)]
+    return all_paths
 
 DEFAULT_PATHS_FILE = (Path(__file__) / '../../../../../data/test_paths.csv').resolve()
 
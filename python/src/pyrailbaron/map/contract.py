@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field
+from pyrailbaron.map.datamodel import (
+    Map, Waypoint, RailSegment, make_rail_seg, derived_data)
+from typing import List, Dict, Tuple, FrozenSet, Iterable, Set
+from heapq import heappush, heappop
+
+# Most dots on the map are unnamed intermediate points on a single railroad
+# with exactly two neighbors. Searching through them one hop at a time is
+# wasteful, so we contract each such chain into a single "super edge" which
+# remembers the per-dot waypoints it stands for. Searches run on the super
+# edges and only expand them back to waypoints for the final paths.
+
+@dataclass(frozen=True)
+class SuperEdge:
+    start_pt: int
+    rr: str
+    waypoints: Tuple[Waypoint, ...]     # Per-dot waypoints after start_pt
+    rail_segs: Tuple[RailSegment, ...]  # Rail segments used by the chain
+    seg_set: FrozenSet[RailSegment]
+    pts_mask: int                       # Bitmask of points after start_pt
+    _index: Dict[int, int] = field(default_factory=dict, compare=False)
+        # Number of hops to each point along the chain
+
+    @property
+    def length(self) -> int:
+        return len(self.waypoints)
+
+    @property
+    def end_pt(self) -> int:
+        return self.waypoints[-1][1]
+
+    @property
+    def pts(self) -> List[int]:
+        return [p for _, p in self.waypoints]
+
+    def hops_to(self, pt: int) -> int:
+        return self._index.get(pt, -1)
+
+    def passes(self, pt: int) -> bool:
+        return pt in self._index
+
+    # Waypoints up to and including pt (which must lie on the chain)
+    def truncate_at(self, pt: int) -> List[Waypoint]:
+        return list(self.waypoints[:self._index[pt]])
+
+    def blocked_by(self, blocked_segs: Set[RailSegment]) -> bool:
+        return len(blocked_segs) > 0 and not self.seg_set.isdisjoint(blocked_segs)
+
+    # Number of hops we can take along the chain before a blocked segment
+    def open_hops(self, blocked_segs: Set[RailSegment]) -> int:
+        if not self.blocked_by(blocked_segs):
+            return self.length
+        return next(i for i, rs in enumerate(self.rail_segs) if rs in blocked_segs)
+
+class ContractedGraph:
+    def __init__(self, m: Map):
+        self.map = m
+        self.interior: List[bool] = [self._check_interior(m, p.index)
+            for p in m.points]
+        self.nodes: List[int] = [p.index for p in m.points
+            if not self.interior[p.index]]
+        self._edges: Dict[int, List[SuperEdge]] = {}
+
+    # An "interior" point is an unnamed dot on one railroad with 2 neighbors;
+    # these are never the end of a chain
+    @staticmethod
+    def _check_interior(m: Map, pt_i: int) -> bool:
+        p = m.points[pt_i]
+        if len(p.city_names) > 0 or len(p.connections) != 1:
+            return False
+        (conn_pts,) = p.connections.values()
+        return len(conn_pts) == 2
+
+    def is_interior(self, pt_i: int) -> bool:
+        return self.interior[pt_i]
+
+    def _follow_chain(self, pt_i: int, rr: str, first_pt: int) -> SuperEdge:
+        wps: List[Waypoint] = [(rr, first_pt)]
+        prev_pt, curr_pt = pt_i, first_pt
+        while self.interior[curr_pt] and curr_pt != pt_i:
+            next_pt, = [p for p in self.map.points[curr_pt].connections[rr]
+                if p != prev_pt]
+            wps.append((rr, next_pt))
+            prev_pt, curr_pt = curr_pt, next_pt
+        segs: List[RailSegment] = []
+        pts_mask = 0
+        index: Dict[int, int] = {}
+        prev_pt = pt_i
+        for hop_i, (_, p) in enumerate(wps):
+            segs.append(make_rail_seg(rr, prev_pt, p))
+            pts_mask |= 1 << p
+            index.setdefault(p, hop_i + 1)
+            prev_pt = p
+        return SuperEdge(pt_i, rr, tuple(wps), tuple(segs), frozenset(segs),
+            pts_mask, index)
+
+    # All super edges leaving pt_i, which may be a node OR an interior point
+    # (e.g. if a player stopped partway along a chain)
+    def edges_from(self, pt_i: int) -> List[SuperEdge]:
+        if pt_i not in self._edges:
+            self._edges[pt_i] = [self._follow_chain(pt_i, rr, first_pt)
+                for rr, conn_pts in sorted(self.map.points[pt_i].connections.items())
+                for first_pt in sorted(conn_pts)]
+        return self._edges[pt_i]
+
+    # Hop distances from start_pt to each node (and each point along traversed
+    # chains), never using blocked_segs and never passing through stop_pt
+    def distances(self, start_pt: int, blocked_segs: Iterable[RailSegment] = [],
+            stop_pt: int = -1, max_d: int = -1) -> Dict[int, int]:
+        blocked = set(blocked_segs)
+        dist: Dict[int, int] = {start_pt: 0}
+        queue: List[Tuple[int, int]] = [(0, start_pt)]
+        while len(queue) > 0:
+            d, pt_i = heappop(queue)
+            if d > dist[pt_i] or pt_i == stop_pt and pt_i != start_pt:
+                continue
+            for e in self.edges_from(pt_i):
+                for hop_i, (_, p) in enumerate(e.waypoints[:e.open_hops(blocked)]):
+                    p_d = d + hop_i + 1
+                    if max_d >= 0 and p_d > max_d:
+                        break
+                    if p_d < dist.get(p, p_d + 1):
+                        dist[p] = p_d
+                        if p == e.end_pt or p == stop_pt:
+                            heappush(queue, (p_d, p))
+                    if p == stop_pt:
+                        break
+        return dist
+
+def get_contracted_graph(m: Map) -> ContractedGraph:
+    return derived_data(m, 'contracted_graph', lambda: ContractedGraph(m))
@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 from dataclasses_json import dataclass_json
-from typing import Tuple, List, Set, Optional, Dict, Iterable
+from typing import Tuple, List, Set, Optional, Dict, Iterable, Any, Callable, TypeVar
 from math import sqrt, asin, sin, cos, pi
 from pathlib import Path
+from hashlib import sha1
+import json
 
 Coordinate = Tuple[float, float]
 
@@ -100,6 +102,28 @@ def read_map(json_path: Path | None = None) -> Map:
     with json_path.open('r') as json_file:
         return Map.from_json(json_file.read()) # type: ignore
 
+# Search structures (contracted graphs, distance indexes, etc...) are derived
+# from static data like the Map and are expensive to build, so we cache them on
+# the source object itself, and they go away with it. Data that also depends
+# on other objects (chart tables, the game config) lists them as deps: it's
+# cached per identity of each, and holds on to them so their ids can't be
+# reused while it's cached.
+T = TypeVar('T')
+def derived_data(source: Any, key: str, build: Callable[[], T], *deps: Any) -> T:
+    cache: Dict[str, Tuple[Tuple[Any, ...], Any]] = vars(source).setdefault(
+        '_derived_data', {})
+    cache_key = key + ''.join(f'_{id(dep)}' for dep in deps)
+    if cache_key not in cache:
+        cache[cache_key] = (deps, build())
+    return cache[cache_key][1]
+
+# Fingerprint of the rail network, used to check that data built offline
+# from the map (e.g. search indexes) still matches it
+def network_hash(m: 'Map') -> str:
+    conns = [sorted((rr, sorted(pts)) for rr, pts in p.connections.items())
+        for p in m.points]
+    return sha1(json.dumps(conns).encode()).hexdigest()
+
 Waypoint = Tuple[str, int]         # Railroad name, dot
 RailSegment = Tuple[str, int, int] # Railroad name + 2 dots (in order)
 
@@ -14,6 +14,7 @@ import json
 from pyrailbaron.map.fit import fit_data
 from pyrailbaron.map.svg import MapSvg, transform_dxf, transform_lcc
 from pyrailbaron.map.states import get_border_data
+from pyrailbaron.map.hierarchy import write_hop_index
 
 def lookup_pt(p: Coordinate, pts: List[MapPoint], append: bool = False) -> int:
     for mp in pts:
@@ -210,6 +211,10 @@ if __name__ == '__main__':
         json.dump(map.to_dict(), map_json, indent=2) # type: ignore
     print(f'Wrote map data to {json_path}')
 
+    # The hop distance index only depends on the network, so it ships with
+    # the compiled map
+    write_hop_index(map, ROOT_DIR / 'output/hop_index.json')
+
     svg_path = (ROOT_DIR / 'output/map.svg')
     svg = MapSvg(svg_path)
 
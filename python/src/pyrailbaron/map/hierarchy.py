@@ -0,0 +1,191 @@
+from pyrailbaron.map.datamodel import (
+    Map, RailSegment, make_rail_seg, read_map, derived_data, network_hash)
+from typing import List, Dict, Tuple, Set, Iterable
+from heapq import heappush, heappop
+from pathlib import Path
+import json
+
+# Contraction hierarchy over the rail network for fast point-to-point hop
+# distances. The contraction order only depends on the network topology, so it
+# is computed offline and shipped next to map.json. Arc weights are then
+# "customized" for a given set of blocked rail segments; a handful of blocked
+# segments only touches the arcs above them, so re-customizing is cheap.
+
+DEFAULT_INDEX_PATH = (Path(__file__) / '../../../../../data/hop_index.json').resolve()
+INF = 1 << 30
+
+Arc = Tuple[int, int] # (lower rank pt, higher rank pt)
+
+class HopIndex:
+    def __init__(self, m: Map, order: List[int]):
+        assert len(order) == len(m.points), "Order must cover every point"
+        self.map = m
+        self.order = order
+        self.rank: List[int] = [0] * len(order)
+        for r, pt_i in enumerate(order):
+            self.rank[pt_i] = r
+
+        # Rail segments making up each original edge (one per railroad)
+        self.edge_segs: Dict[Arc, List[RailSegment]] = {}
+        for p in m.points:
+            for rr, conn_pts in p.connections.items():
+                for pt_j in conn_pts:
+                    if pt_j > p.index:
+                        self.edge_segs.setdefault(self.arc(p.index, pt_j), []).append(
+                            make_rail_seg(rr, p.index, pt_j))
+
+        # Contract points in order; the higher neighbors of each point become
+        # pairwise connected by (possibly new) shortcut arcs
+        self.up: List[List[int]] = [[] for _ in order]
+        self.lower: Dict[Arc, List[int]] = {}  # Lower triangles of each arc
+        nbrs: List[Set[int]] = [set(p.pts_connected_to) for p in m.points]
+        for v in order:
+            higher = sorted(nbrs[v], key=lambda u: self.rank[u])
+            self.up[v] = higher
+            for a_i, u in enumerate(higher):
+                nbrs[u].discard(v)
+                self.lower.setdefault((v, u), [])
+                for w in higher[a_i + 1:]:
+                    nbrs[u].add(w); nbrs[w].add(u)
+                    self.lower.setdefault((u, w), []).append(v)
+
+        # Shortcuts are processed bottom up during customization
+        self._arcs_by_rank = sorted(self.lower, key=lambda a: self.rank[a[0]])
+        self.base = HopIndexView(self, self._customize_all(set()))
+
+    def arc(self, pt_i: int, pt_j: int) -> Arc:
+        return (pt_i, pt_j) if self.rank[pt_i] < self.rank[pt_j] else (pt_j, pt_i)
+
+    def _base_weight(self, a: Arc, blocked: Set[RailSegment]) -> int:
+        segs = self.edge_segs.get(a)
+        if not segs or all(rs in blocked for rs in segs):
+            return INF
+        return 1
+
+    def _triangle_weight(self, a: Arc, weights: Dict[Arc, int],
+            blocked: Set[RailSegment]) -> int:
+        u, w = a
+        best = self._base_weight(a, blocked)
+        for v in self.lower[a]:
+            best = min(best, weights[(v, u)] + weights[(v, w)])
+        return best
+
+    def _customize_all(self, blocked: Set[RailSegment]) -> Dict[Arc, int]:
+        weights: Dict[Arc, int] = {}
+        for a in self._arcs_by_rank:
+            weights[a] = self._triangle_weight(a, weights, blocked)
+        return weights
+
+    # Starting from the base weights, only update arcs affected by blocking
+    def customize(self, blocked_segs: Iterable[RailSegment]) -> 'HopIndexView':
+        blocked = set(blocked_segs)
+        if len(blocked) == 0:
+            return self.base
+        weights = self.base.weights.copy()
+        pending: List[Tuple[int, Arc]] = []
+        queued: Set[Arc] = set()
+        def push(a: Arc):
+            if a not in queued:
+                queued.add(a)
+                heappush(pending, (self.rank[a[0]], a))
+        for rr, pt_i, pt_j in blocked:
+            a = self.arc(pt_i, pt_j)
+            if a in self.edge_segs:
+                push(a)
+        while len(pending) > 0:
+            _, a = heappop(pending)
+            queued.discard(a)
+            new_w = self._triangle_weight(a, weights, blocked)
+            if new_w == weights[a]:
+                continue
+            weights[a] = new_w
+            # Arc (v,u) supports the triangles (u,w) for the other higher
+            # neighbors w of v
+            v, u = a
+            for w in self.up[v]:
+                if w != u:
+                    push(self.arc(u, w))
+        return HopIndexView(self, weights)
+
+    def distance(self, pt_i: int, pt_j: int,
+            blocked_segs: Iterable[RailSegment] = []) -> int:
+        return self.customize(blocked_segs).distance(pt_i, pt_j)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {'map_hash': network_hash(self.map), 'order': self.order}
+
+class HopIndexView:
+    def __init__(self, index: HopIndex, weights: Dict[Arc, int]):
+        self.index = index
+        self.weights = weights
+        self._upward: Dict[int, Dict[int, int]] = {}
+
+    # Distances to every point in the upward search space of pt_i
+    def upward(self, pt_i: int) -> Dict[int, int]:
+        if pt_i not in self._upward:
+            up, weights = self.index.up, self.weights
+            dist: Dict[int, int] = {pt_i: 0}
+            queue: List[Tuple[int, int]] = [(0, pt_i)]
+            while len(queue) > 0:
+                d, v = heappop(queue)
+                if d > dist[v]:
+                    continue
+                for u in up[v]:
+                    u_d = d + weights[(v, u)]
+                    if u_d < INF and u_d < dist.get(u, INF):
+                        dist[u] = u_d
+                        heappush(queue, (u_d, u))
+            self._upward[pt_i] = dist
+        return self._upward[pt_i]
+
+    # Returns -1 if pt_j can't be reached from pt_i
+    def distance(self, pt_i: int, pt_j: int) -> int:
+        if pt_i == pt_j:
+            return 0
+        up_i, up_j = self.upward(pt_i), self.upward(pt_j)
+        if len(up_j) < len(up_i):
+            up_i, up_j = up_j, up_i
+        best = INF
+        for v, d in up_i.items():
+            d_j = up_j.get(v)
+            if d_j is not None and d + d_j < best:
+                best = d + d_j
+        return best if best < INF else -1
+
+# Greedy minimum-degree elimination order; keeps the number of shortcuts low
+def compute_order(m: Map) -> List[int]:
+    nbrs: List[Set[int]] = [set(p.pts_connected_to) for p in m.points]
+    remaining: Set[int] = set(range(len(m.points)))
+    order: List[int] = []
+    while len(remaining) > 0:
+        v = min(remaining, key=lambda p: (len(nbrs[p]), p))
+        order.append(v)
+        remaining.remove(v)
+        for u in nbrs[v]:
+            nbrs[u].discard(v)
+            nbrs[u].update(w for w in nbrs[v] if w != u)
+    return order
+
+def build_hop_index(m: Map) -> HopIndex:
+    return HopIndex(m, compute_order(m))
+
+def read_hop_index(m: Map, index_path: Path = DEFAULT_INDEX_PATH) -> HopIndex:
+    if index_path.exists():
+        with index_path.open('r') as index_file:
+            data = json.load(index_file)
+        if data.get('map_hash') == network_hash(m):
+            return HopIndex(m, data['order'])
+        print(f'Hop index {index_path} does not match map, rebuilding')
+    return build_hop_index(m)
+
+def get_hop_index(m: Map) -> HopIndex:
+    return derived_data(m, 'hop_index', lambda: read_hop_index(m))
+
+def write_hop_index(m: Map, index_path: Path = DEFAULT_INDEX_PATH):
+    index = build_hop_index(m)
+    with index_path.open('w') as index_file:
+        json.dump(index.to_dict(), index_file)
+    print(f'Wrote hop index ({len(index.lower)} arcs) to {index_path}')
+
+if __name__ == '__main__':
+    write_hop_index(read_map())
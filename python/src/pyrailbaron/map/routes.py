@@ -0,0 +1,59 @@
+from pyrailbaron.map.datamodel import Map, Waypoint, derived_data
+from pyrailbaron.map.bfs import search_all_paths, DEFAULT_PATHS_FILE
+from typing import List, Dict
+from pathlib import Path
+import csv
+
+# Catalog of likely routes between pairs of cities. Routes are read once from
+# the catalog file written by write_all_paths (and reduced by
+# simplify_rr_paths.py) if it exists; otherwise the routes from a start point
+# are found with the Pareto search the first time they're needed.
+
+MAX_PATHS_PER_PAIR = 20
+
+def reverse_path(start_pt: int, path: List[Waypoint]) -> List[Waypoint]:
+    pts = [start_pt] + [p for _, p in path]
+    return [(rr, pts[i]) for i, (rr, _) in reversed(list(enumerate(path)))]
+
+class RouteStore:
+    def __init__(self, m: Map, catalog_path: Path | None = DEFAULT_PATHS_FILE,
+            max_paths_per_pair: int = MAX_PATHS_PER_PAIR):
+        self.map = m
+        self.max_paths_per_pair = max_paths_per_pair
+        self._routes: Dict[int, Dict[int, List[List[Waypoint]]]] = {}
+        if catalog_path and catalog_path.exists():
+            self._read_catalog(catalog_path)
+
+    def _add_route(self, start_pt: int, end_pt: int, path: List[Waypoint]):
+        pair_routes = self._routes.setdefault(start_pt, {}).setdefault(end_pt, [])
+        if len(pair_routes) < self.max_paths_per_pair:
+            pair_routes.append(path)
+
+    def _read_catalog(self, catalog_path: Path):
+        with catalog_path.open('r') as catalog_file:
+            for row in csv.reader(catalog_file):
+                if len(row) < 4:
+                    continue
+                start_pt, end_pt = int(row[0]), int(row[1])
+                path = [(row[i], int(row[i + 1])) for i in range(2, len(row) - 1, 2)]
+                self._add_route(start_pt, end_pt, path)
+                self._add_route(end_pt, start_pt, reverse_path(start_pt, path))
+
+    def _search(self, start_pt: int):
+        for end_pt, paths in search_all_paths(self.map, start_pt).items():
+            for path in paths:
+                self._add_route(start_pt, end_pt, path)
+
+    def routes_from(self, start_pt: int) -> Dict[int, List[List[Waypoint]]]:
+        if start_pt not in self._routes:
+            self._search(start_pt)
+        return self._routes.setdefault(start_pt, {})
+
+    def paths_from(self, start_pt: int) -> List[List[Waypoint]]:
+        return [p for paths in self.routes_from(start_pt).values() for p in paths]
+
+    def paths_between(self, start_pt: int, end_pt: int) -> List[List[Waypoint]]:
+        return self.routes_from(start_pt).get(end_pt, [])
+
+def get_route_store(m: Map) -> RouteStore:
+    return derived_data(m, 'route_store', lambda: RouteStore(m))
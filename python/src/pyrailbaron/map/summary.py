@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from pyrailbaron.map.datamodel import Map, Waypoint, derived_data
+from typing import Dict, List, Tuple, Iterable
+
+# There are only 28 railroads, so any set of railroads fits in the bits of a
+# small integer. Railroad ids follow the sorted order of railroad names.
+
+def get_rr_ids(m: Map) -> Dict[str, int]:
+    return derived_data(m, 'rr_ids',
+        lambda: dict((rr, i) for i, rr in enumerate(sorted(m.railroads))))
+
+def get_rr_names(m: Map) -> List[str]:
+    return list(sorted(m.railroads))
+
+def rr_mask(m: Map, rrs: Iterable[str]) -> int:
+    ids = get_rr_ids(m)
+    mask = 0
+    for rr in rrs:
+        mask |= 1 << ids[rr]
+    return mask
+
+# Railroad set and run-length summary of a path
+@dataclass(frozen=True)
+class PathSummary:
+    rr_mask: int                    # Bitmask of railroads used
+    runs: Tuple[Tuple[int, int], ...] # (rr id, # of hops) for each run
+
+    @property
+    def n_rrs(self) -> int:
+        return self.rr_mask.bit_count()
+
+def summarize_path(m: Map, path: Iterable[Waypoint]) -> PathSummary:
+    ids = get_rr_ids(m)
+    mask = 0
+    runs: List[Tuple[int, int]] = []
+    for rr, _ in path:
+        rr_id = ids[rr]
+        mask |= 1 << rr_id
+        if len(runs) > 0 and runs[-1][0] == rr_id:
+            runs[-1] = (rr_id, runs[-1][1] + 1)
+        else:
+            runs.append((rr_id, 1))
+    return PathSummary(mask, tuple(runs))
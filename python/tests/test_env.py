@@ -0,0 +1,19 @@
+from pyrailbaron.game.env import RailBaronVecEnv
+import numpy as np
+
+def first_legal(masks: np.ndarray) -> np.ndarray:
+    return masks.argmax(axis=1)
+
+# reset() must abandon the games in progress rather than wait on them
+def test_reset_twice():
+    env = RailBaronVecEnv(2, seed=1)
+    try:
+        for _ in range(2):
+            obs, info = env.reset()
+            assert obs['seat'].shape == (2,)
+            masks = info['action_mask']
+            assert masks.any(axis=1).all()
+            obs, rewards, terminated, truncated, info = env.step(first_legal(masks))
+            assert info['action_mask'].any(axis=1).all()
+    finally:
+        env.close()
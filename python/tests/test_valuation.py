@@ -0,0 +1,42 @@
+from pyrailbaron.game.state import GameState, PlayerState
+from pyrailbaron.game.valuation import RailroadValuation, get_rr_valuation
+from typing import List
+
+def make_state(static: GameState, home_cities: List[str]) -> GameState:
+    s = GameState(map=static.map, route_payoffs=static.route_payoffs,
+        roll_tables=static.roll_tables, config=static.config)
+    for i, city in enumerate(home_cities):
+        s.players.append(PlayerState(i, f'P{i}'))
+        s.set_player_home_city(i, city)
+    s.players[1].rr_owned.append('atsf')
+    return s
+
+# Values cached for one position must not be reused once a player has moved
+def test_value_follows_player_position():
+    static = GameState()
+    at_chicago = make_state(static, ['Chicago', 'Boston'])
+    at_la = make_state(static, ['Los Angeles', 'Boston'])
+
+    valuation = get_rr_valuation(at_chicago)
+    chicago_values = (valuation.value(at_chicago, 0, 'up'),
+        valuation.value(at_chicago, 1, 'up'))
+    la_values = (valuation.value(at_la, 0, 'up'), valuation.value(at_la, 1, 'up'))
+
+    fresh = RailroadValuation(at_la)
+    assert la_values == (fresh.value(at_la, 0, 'up'), fresh.value(at_la, 1, 'up'))
+    assert la_values != chicago_values
+
+# Trip routes are picked under the current owners, so they must be rebuilt
+# when a railroad changes hands
+def test_trips_follow_ownership():
+    static = GameState()
+    s = make_state(static, ['Chicago', 'Boston'])
+    s.players[1].rr_owned.clear()
+    s.set_player_destination(0, 'Los Angeles')
+    valuation = get_rr_valuation(s)
+    before = valuation.likely_trips(s, 0)
+
+    s.players[1].rr_owned += ['atsf', 'crip', 'sp']
+    after = valuation.likely_trips(s, 0)
+    assert after == RailroadValuation(s).likely_trips(s, 0)
+    assert after != before